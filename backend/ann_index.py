@@ -0,0 +1,212 @@
+# ann_index.py
+"""Approximate nearest-neighbour candidate generation for the similarity index.
+
+IVFIndex partitions the embedding store with spherical k-means: every store
+row is assigned to its nearest centroid (its inverted list), and a query only
+visits the rows of the nprobe lists whose centroids are closest to it. The
+visited rows are the shortlist that SimilarityIndex scores exactly, with the
+metadata boosts, so ANN only decides which complaints are looked at.
+
+nprobe is the recall/latency knob: more lists visited means more candidates,
+higher recall and more work (nprobe = number of lists is an exact scan).
+
+Select the index with SIMILARITY_INDEX=ivf (default "exact", a full scan).
+Centroids are never trained on a request: a background job trains them once
+the store holds ANN_MIN_ROWS rows (services.build_ann_index, queued after
+embedding jobs and on startup), or run `python ann_index.py` offline; until
+then queries scan everything. Centroids and row assignments are saved next
+to the store (ivf.npz), under the store's write lock. Rows appended to the
+store later are assigned to the existing centroids incrementally and the
+assignments written back, so the next process start loads them instead of
+assigning the tail again; rebuild offline when the corpus has drifted far
+from what the centroids were trained on.
+"""
+import os
+import sys
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "exact" or a key of ANN_INDEXES
+SIMILARITY_INDEX = os.environ.get("SIMILARITY_INDEX", "exact")
+# Default number of inverted lists visited per query
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", "8"))
+# Below this many stored embeddings a full scan is cheap enough; no centroids are trained
+ANN_MIN_ROWS = 10000
+
+KMEANS_ITERATIONS = 10
+# Training sample size per list
+KMEANS_SAMPLE_PER_LIST = 64
+ASSIGN_BLOCK_ROWS = 65536
+
+
+def default_list_count(rows):
+    """About 4 * sqrt(rows) lists, the usual IVF sizing."""
+    return max(1, int(4 * np.sqrt(rows)))
+
+
+def assign_lists(vectors, centroids):
+    """Index of the most similar centroid for each row, computed in blocks."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS])
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def train_centroids(vectors, lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means centroids (unit rows) of a sample of the non-zero rows."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), lists * KMEANS_SAMPLE_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    sample = sample[np.linalg.norm(sample, axis=1) > 0]
+    lists = min(lists, len(sample))
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_lists(sample, centroids)
+        order = np.argsort(assignments, kind="stable")
+        sizes = np.bincount(assignments, minlength=lists)
+        filled = np.flatnonzero(sizes)
+        sums = np.add.reduceat(sample[order], np.concatenate([[0], np.cumsum(sizes[filled])[:-1]]), axis=0)
+        centroids[filled] = sums
+        # Re-seed empty lists from random sample rows
+        empty = np.flatnonzero(sizes == 0)
+        centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        np.divide(centroids, norms, out=centroids, where=norms > 0)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted lists of store rows over k-means centroids, persisted next to the store."""
+
+    def __init__(self, store):
+        self.store = store
+        self.path = os.path.join(store.directory, "ivf.npz")
+        self.centroids = None
+        # Store row -> list; rows at or past len(assignments) are not assigned yet
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.lists = []
+        # Modification time of the ivf.npz last loaded or saved
+        self._mtime = None
+
+    @property
+    def ready(self):
+        return self.centroids is not None
+
+    @staticmethod
+    def saved(store):
+        """Whether an index has been built for store."""
+        return os.path.exists(os.path.join(store.directory, "ivf.npz"))
+
+    def _changed_on_disk(self):
+        return os.path.exists(self.path) and os.stat(self.path).st_mtime_ns != self._mtime
+
+    def _load(self, rows):
+        """Read ivf.npz, keeping the assignments of the first `rows` store rows."""
+        mtime = os.stat(self.path).st_mtime_ns
+        with np.load(self.path) as data:
+            centroids = data["centroids"]
+            assignments = data["assignments"]
+        self._mtime = mtime
+        if self.store.dimension not in (None, centroids.shape[1]):
+            logger.warning(f"Ignoring {self.path}: trained for dimension {centroids.shape[1]}")
+            return
+        self._set(centroids, assignments[:rows])
+
+    def _set(self, centroids, assignments):
+        self.centroids = centroids
+        self.assignments = assignments
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.cumsum(np.bincount(assignments, minlength=len(centroids)))[:-1]
+        self.lists = np.split(order.astype(np.int64), bounds)
+
+    def _save(self):
+        """Write centroids and assignments; the caller holds the store's write lock."""
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, assignments=self.assignments)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def _assign_tail(self, vectors):
+        """Assign the rows of vectors past the current assignments; False if there are none."""
+        start = len(self.assignments)
+        if start >= len(vectors):
+            return False
+        assignments = assign_lists(vectors[start:], self.centroids)
+        self.assignments = np.concatenate([self.assignments, assignments])
+        for list_id in np.unique(assignments):
+            rows = start + np.flatnonzero(assignments == list_id)
+            self.lists[list_id] = np.concatenate([self.lists[list_id], rows])
+        return True
+
+    def build(self, lists=None):
+        """Train centroids on the whole store, assign every row and save them.
+
+        Takes minutes on a large store: run it offline or from a background
+        job, never on a request. The store's write lock is only held to
+        assign the rows appended meanwhile and save.
+        """
+        self.store.refresh()
+        vectors = self.store.vectors
+        centroids = train_centroids(vectors, lists or default_list_count(len(vectors)))
+        self._set(centroids, assign_lists(vectors, centroids))
+        with self.store.write_lock():
+            self.store.refresh()
+            self._assign_tail(self.store.vectors)
+            self._save()
+        logger.info(f"Built IVF index: {len(self.assignments)} rows in {len(centroids)} lists")
+
+    def refresh(self, vectors=None):
+        """Load a new ivf.npz and assign store rows appended since; never trains.
+
+        vectors (a snapshot of store.vectors) caps the rows assigned, so the
+        lists never name a row the caller has not seen. Assignments of new
+        rows are written back to ivf.npz.
+        """
+        vectors = self.store.vectors if vectors is None else vectors
+        if self._changed_on_disk():
+            self._load(len(vectors))
+        if not self.ready or len(self.assignments) >= len(vectors):
+            return
+        with self.store.write_lock():
+            # Another process may have assigned the rows (or rebuilt the index) meanwhile
+            if self._changed_on_disk():
+                self._load(len(vectors))
+            if self.ready and self._assign_tail(vectors):
+                self._save()
+
+    def search(self, query, nprobe=None):
+        """Store rows in the nprobe lists closest to the (normalized) query vector."""
+        nprobe = min(nprobe or IVF_NPROBE, len(self.centroids))
+        closest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.lists[list_id] for list_id in closest])
+
+
+ANN_INDEXES = {
+    "ivf": IVFIndex,
+}
+
+
+def main(argv):
+    from database import SessionLocal
+    from services import build_ann_index, embedding_store
+
+    logging.basicConfig(level=logging.INFO)
+    lists = int(argv[argv.index("--lists") + 1]) if "--lists" in argv else None
+    embedding_store.refresh()
+    if not len(embedding_store):
+        print("The embedding store is empty; run an embedding job first")
+        return 1
+    db = SessionLocal()
+    try:
+        build_ann_index(db, IVFIndex, lists)
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,157 @@
+# benchmark_similarity.py
+"""Compare the float32 and int8 similarity scans on the current complaints.
+
+Loads the similarity index twice over the same embedding store, once per
+scan mode, and runs top_k for a sample of complaints with both. Reports
+latency, the size of the exactly re-scored shortlist, the bytes each query
+reads, and recall@k against the float32 results, both for the int8 scan
+alone (no re-scoring) and for the re-scored int8 results.
+
+The int8 scan keeps the float32 store memory-mapped for re-scoring, so the
+saving is in what a scan reads (the codes plus the re-scored rows), not in
+what is mapped. Each mode also runs the sample in a fresh process and
+reports how much of each store file ended up resident there, and the
+process RSS (Linux only): the re-scored rows are scattered, so with a warm
+page cache the float32 pages mapped around them can still add up to most
+of the file.
+
+    cd backend
+    python benchmark_similarity.py [--queries 200] [--limit 20]
+"""
+import os
+import sys
+import time
+import multiprocessing
+
+import numpy as np
+
+from database import SessionLocal
+from services import SIMILARITY_SEARCH_ENABLED, embedding_store
+from similarity_index import EMBEDDING_WEIGHT, METADATA_WEIGHT, SimilarityIndex
+
+
+def _option(argv, name, default):
+    return int(argv[argv.index(name) + 1]) if name in argv else default
+
+
+def _recall(found, expected):
+    return len(set(found) & set(expected)) / len(expected) if expected else 1.0
+
+
+def _first_stage(index, pr_id, limit):
+    """top_k ranked on the int8 approximate scores alone."""
+    row = index.row_of[pr_id]
+    query = index.vector(row)
+    scores = EMBEDDING_WEIGHT * index._take(index.quantized.cosines(query), index.store_rows).astype(np.float64)
+    scores = np.clip(scores + METADATA_WEIGHT * index.boosts(row), 0.0, 1.0)
+    positions = np.arange(len(index))
+    return [index.pr_ids[i] for i in index._best(scores, positions, limit, exclude=row)]
+
+
+def _resident_mib(paths):
+    """(MiB of each file resident in this process's mappings, process RSS in MiB), or None off Linux."""
+    if not os.path.exists("/proc/self/smaps"):
+        return None
+    resident = dict.fromkeys(paths, 0)
+    mapped = None
+    with open("/proc/self/smaps") as f:
+        for line in f:
+            fields = line.split(None, 5)
+            if fields and not fields[0].endswith(":"):
+                # Mapping header: address range, permissions, offset, device, inode, path
+                mapped = fields[5].strip() if len(fields) > 5 else None
+            elif fields and fields[0] == "Rss:" and mapped in resident:
+                resident[mapped] += int(fields[1])
+    with open("/proc/self/status") as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    return {path: kb / 1024 for path, kb in resident.items()}, rss / 1024
+
+
+def _measure_resident(scan, sample, limit, paths, results):
+    """Child process body: run the sample with one scan mode and report _resident_mib."""
+    db = SessionLocal()
+    try:
+        index = SimilarityIndex("exact", scan)
+        index.refresh(db, embedding_store)
+    finally:
+        db.close()
+    for pr_id in sample:
+        index.top_k(pr_id, limit)
+    results.put(_resident_mib(paths))
+
+
+def _resident_in_fresh_process(scan, sample, limit, paths):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_measure_resident, args=(scan, list(sample), limit, paths, results))
+    process.start()
+    measured = results.get()
+    process.join()
+    return measured
+
+
+def main(argv):
+    if not SIMILARITY_SEARCH_ENABLED:
+        print("Similarity search is disabled (its dependencies are not installed)")
+        return 1
+    queries = _option(argv, "--queries", 200)
+    limit = _option(argv, "--limit", 20)
+
+    db = SessionLocal()
+    try:
+        exact = SimilarityIndex("exact", "float32")
+        quantized = SimilarityIndex("exact", "int8")
+        exact.refresh(db, embedding_store)
+        quantized.refresh(db, embedding_store)
+    finally:
+        db.close()
+    if len(exact) < 2:
+        print("Not enough complaints to benchmark")
+        return 1
+
+    rng = np.random.default_rng(0)
+    sample = exact.pr_ids[rng.choice(len(exact), min(queries, len(exact)), replace=False)]
+    timings = {"float32": 0.0, "int8": 0.0}
+    first_stage_recall, recall, shortlist = [], [], []
+    for pr_id in sample:
+        start = time.perf_counter()
+        expected = [other for other, _ in exact.top_k(pr_id, limit)]
+        timings["float32"] += time.perf_counter() - start
+        start = time.perf_counter()
+        found = [other for other, _ in quantized.top_k(pr_id, limit)]
+        timings["int8"] += time.perf_counter() - start
+
+        row = quantized.row_of[pr_id]
+        query = quantized.vector(row)
+        shortlist.append(len(quantized.shortlist(query, None, limit, row)))
+        first_stage_recall.append(_recall(_first_stage(quantized, pr_id, limit), expected))
+        recall.append(_recall(found, expected))
+
+    rows, dimension = embedding_store.vectors.shape
+    int8 = quantized.quantized
+    print(f"{len(exact)} complaints, {rows} stored embeddings of dimension {dimension}, "
+          f"{len(sample)} queries, top {limit}")
+    print(f"latency per query: float32 {timings['float32'] / len(sample) * 1000:.2f} ms, "
+          f"int8 {timings['int8'] / len(sample) * 1000:.2f} ms")
+    print(f"re-scored rows:    {np.mean(shortlist):.1f} on average, {max(shortlist)} at most")
+    print(f"read per query:    float32 {rows * dimension * 4 / 2**20:.1f} MiB, int8 "
+          f"{(int8.codes.nbytes + 8 * rows) / 2**20:.1f} MiB + {np.mean(shortlist) * dimension * 4 / 2**10:.1f} KiB "
+          f"of float32 rows re-scored")
+    print(f"recall@{limit}:         int8 scan alone {np.mean(first_stage_recall):.4f}, "
+          f"re-scored {np.mean(recall):.4f}")
+
+    # Files are named by their real path in /proc/self/smaps
+    paths = [os.path.realpath(path) for path in (embedding_store.vectors_path, int8.codes_path, int8.scales_path)]
+    measured = {scan: _resident_in_fresh_process(scan, sample, limit, paths) for scan in ("float32", "int8")}
+    if measured["float32"] is None:
+        print("resident memory:   not measured (needs /proc/self/smaps)")
+        return 0
+    # Mapped pages are counted at the page cache's granularity (large folios can map far more than a row)
+    for scan, (resident, rss) in measured.items():
+        print(f"resident ({scan:>7}): vectors.f32 {resident[paths[0]]:.1f} MiB, "
+              f"vectors.i8 + scales.f32 {resident[paths[1]] + resident[paths[2]]:.1f} MiB, process RSS {rss:.1f} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
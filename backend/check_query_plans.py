@@ -0,0 +1,125 @@
+# check_query_plans.py
+"""Print the query plans of the statistics queries and flag full table scans.
+
+Runs the stats service functions with a set of representative filters,
+captures the SQL they execute and EXPLAINs every statement. Exits with
+status 1 when a filtered query scans the whole complaints table, so index
+regressions are caught in CI or before a deploy:
+
+    cd backend
+    alembic upgrade head
+    python check_query_plans.py
+"""
+import re
+import sys
+
+from sqlalchemy import event
+
+from database import SessionLocal, engine
+from services import (
+    count_complaints,
+    get_country_statistics,
+    get_dashboard,
+    get_monthly_trend,
+    get_product_statistics,
+    get_statistics,
+    get_trend,
+)
+
+STATS_FUNCTIONS = [
+    get_statistics,
+    get_monthly_trend,
+    get_country_statistics,
+    get_product_statistics,
+    get_dashboard,
+    get_trend,
+    count_complaints,
+]
+
+# Representative filter sets; each one must be answerable without a full scan
+SAMPLE_FILTERS = [
+    {"system_component": ["Gantry"]},
+    {"failure_mode": ["FM1-System Down"], "start_date": "2024-01-01"},
+    {"severity": ["Safety", "High"]},
+    {"priority": ["High"], "end_date": "2024-06-30"},
+    {"country": ["China"], "start_date": "2024-01-01", "end_date": "2024-12-31"},
+    {"catalog_item_identifier": ["728231"], "pr_state": ["Open"]},
+    {"pr_state": ["Closed"]},
+    {"level2": ["Noise"], "system_component": ["Gantry"]},
+]
+
+# Plan lines that mean the complaints table is read row by row in full
+FULL_SCAN_PATTERNS = {
+    "sqlite": re.compile(r"\bSCAN (TABLE )?complaints$"),
+    "postgresql": re.compile(r"Seq Scan on complaints\b"),
+}
+
+# Full index scans: the planner walks a whole index, usually to avoid sorting
+# for GROUP BY when the filter is not selective. Reported, but not a failure.
+INDEX_SCAN_PATTERNS = {
+    "sqlite": re.compile(r"\bSCAN (TABLE )?complaints USING (COVERING )?INDEX\b"),
+}
+
+
+def explain(connection, statement, parameters):
+    """Return the plan of statement as a list of text lines."""
+    if engine.dialect.name == "sqlite":
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        return [row[-1] for row in rows]
+    rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).fetchall()
+    return [row[0] for row in rows]
+
+
+def capture_statements(function, filters):
+    """Run a stats function and return the (statement, parameters) it executed."""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    db = SessionLocal()
+    try:
+        function(db, {key: list(value) if isinstance(value, list) else value for key, value in filters.items()})
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return captured
+
+
+def main():
+    full_scan = FULL_SCAN_PATTERNS.get(engine.dialect.name)
+    if full_scan is None:
+        print(f"No full-scan pattern for dialect {engine.dialect.name}; printing plans only")
+
+    index_scan = INDEX_SCAN_PATTERNS.get(engine.dialect.name)
+
+    failures = []
+    index_scans = []
+    for filters in SAMPLE_FILTERS:
+        for function in STATS_FUNCTIONS:
+            for statement, parameters in capture_statements(function, filters):
+                with engine.connect() as connection:
+                    plan = explain(connection, statement, parameters)
+                print(f"--- {function.__name__} {filters}")
+                print("\n".join(f"    {line}" for line in plan))
+                if full_scan and any(full_scan.search(line) for line in plan):
+                    failures.append((function.__name__, filters))
+                elif index_scan and any(index_scan.search(line) for line in plan):
+                    index_scans.append((function.__name__, filters))
+
+    if index_scans:
+        print(f"\n{len(index_scans)} filtered queries walk a full index (filter not selective enough):")
+        for name, filters in index_scans:
+            print(f"    {name} {filters}")
+    if failures:
+        print(f"\n{len(failures)} filtered queries fall back to a full table scan:")
+        for name, filters in failures:
+            print(f"    {name} {filters}")
+        return 1
+    print("\nNo full table scans in filtered statistics queries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
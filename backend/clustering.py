@@ -0,0 +1,63 @@
+# clustering.py
+"""Near-duplicate clustering of the complaint embeddings.
+
+Two complaints are linked when the cosine of their embeddings is at least
+the threshold, and clusters are the connected components of those links.
+All pairs are compared with blocked matrix products: the upper triangle of
+the similarity matrix is computed one BLOCK_ROWS x BLOCK_ROWS tile at a
+time, so memory stays at one tile however large the corpus is. Links found
+in a tile are merged right away into a union-find forest kept in a NumPy
+parent array (roots are always the smallest position of their component).
+"""
+import os
+
+import numpy as np
+
+# Default cosine similarity above which two complaints are near-duplicates
+CLUSTER_THRESHOLD = float(os.environ.get("CLUSTER_THRESHOLD", "0.9"))
+BLOCK_ROWS = 2048
+
+
+def _roots(parent, nodes):
+    roots = parent[nodes]
+    while True:
+        parents = parent[roots]
+        if np.array_equal(parents, roots):
+            return roots
+        roots = parents
+
+
+def union_pairs(parent, left, right):
+    """Merge the components of each (left[i], right[i]) pair; the smaller root wins."""
+    while len(left):
+        left_roots, right_roots = _roots(parent, left), _roots(parent, right)
+        differ = left_roots != right_roots
+        left, right = left[differ], right[differ]
+        left_roots, right_roots = left_roots[differ], right_roots[differ]
+        # Several pairs may hook the same root in one round; the losers retry in the next
+        parent[np.maximum(left_roots, right_roots)] = np.minimum(left_roots, right_roots)
+
+
+def cluster_rows(vectors, rows, threshold=CLUSTER_THRESHOLD, progress=None):
+    """Component root (an index into rows) of each of the given rows of a matrix of normalized vectors.
+
+    Rows are gathered one block at a time, so vectors may be a memory map.
+    progress(done, total) is called after each row block.
+    """
+    count = len(rows)
+    parent = np.arange(count, dtype=np.int64)
+    blocks = range(0, count, BLOCK_ROWS)
+    for done, start in enumerate(blocks, start=1):
+        block = vectors[rows[start:start + BLOCK_ROWS]]
+        for other_start in range(start, count, BLOCK_ROWS):
+            other = vectors[rows[other_start:other_start + BLOCK_ROWS]]
+            similar = (block @ other.T) >= threshold
+            if other_start == start:
+                # Upper triangle only: each pair once, no self pairs
+                similar = np.triu(similar, k=1)
+            left, right = np.nonzero(similar)
+            if len(left):
+                union_pairs(parent, left + start, right + other_start)
+        if progress:
+            progress(done, len(blocks))
+    return _roots(parent, np.arange(count))
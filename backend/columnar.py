@@ -0,0 +1,234 @@
+# columnar.py
+"""Optional in-memory columnar engine for the statistics endpoints.
+
+The categorical Complaint columns are kept dictionary-encoded in NumPy code
+arrays and initiate_date as days since 1970-01-01. Filters become boolean
+masks and group counts come from np.bincount over the codes, so a stats
+request never touches the database once the store is loaded.
+
+Enable with COLUMNAR_ENGINE=1 (it then takes precedence over the cube).
+The store is loaded on first use and refreshed lazily when the data version
+moves: rows with a higher id than seen so far are appended, and rows the
+change log lists as updated since the store's version (changed_since) are
+re-read, whichever worker process wrote them.
+"""
+import os
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Complaint
+from result_cache import changed_since, data_version
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_ENGINE_ENABLED = os.environ.get("COLUMNAR_ENGINE", "0") == "1"
+
+# Dictionary-encoded columns; initiate_month is derived from initiate_date
+CATEGORICAL_COLUMNS = [
+    "system_component",
+    "failure_mode",
+    "severity",
+    "priority",
+    "level2",
+    "event_country",
+    "catalog_item_identifier",
+    "catalog_item_name",
+    "pr_state",
+    "initiate_month",
+]
+
+# Filter parameter -> encoded column
+FILTER_COLUMNS = {
+    "system_component": "system_component",
+    "failure_mode": "failure_mode",
+    "severity": "severity",
+    "priority": "priority",
+    "country": "event_country",
+    "catalog_item_identifier": "catalog_item_identifier",
+    "pr_state": "pr_state",
+    "level2": "level2",
+}
+
+# Day number stored for complaints without an initiate date
+NO_DATE = np.iinfo(np.int32).min
+EPOCH = np.datetime64("1970-01-01", "D")
+
+LOOKUP_CHUNK_SIZE = 500
+
+
+def _day_number(value):
+    return int((np.datetime64(value, "D") - EPOCH).astype(np.int64))
+
+
+class ColumnarStore:
+    """Dictionary-encoded copy of the Complaint columns used by the stats endpoints."""
+
+    def __init__(self):
+        # Guards the arrays: refresh replaces and patches them in place
+        self._lock = threading.RLock()
+        self.version = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.days = np.empty(0, dtype=np.int32)
+        self.codes = {name: np.empty(0, dtype=np.int32) for name in CATEGORICAL_COLUMNS}
+        # Per column: code -> value, and value -> code
+        self.values = {name: [] for name in CATEGORICAL_COLUMNS}
+        self.lookup = {name: {} for name in CATEGORICAL_COLUMNS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _encode(self, name, values):
+        """Codes of values in column name, growing the dictionary with unseen values."""
+        local_codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=False)
+        lookup = self.lookup[name]
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            value = None if pd.isna(value) else value
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(self.values[name])
+                self.values[name].append(value)
+            mapping[i] = code
+        return mapping[local_codes]
+
+    def _read_frame(self, db: Session, condition):
+        columns = [Complaint.id, Complaint.initiate_date] + [
+            getattr(Complaint, name) for name in CATEGORICAL_COLUMNS if name != "initiate_month"
+        ]
+        rows = db.execute(select(*columns).where(condition).order_by(Complaint.id)).all()
+        frame = pd.DataFrame(rows, columns=[column.key for column in columns], dtype=object)
+        dates = pd.to_datetime(frame["initiate_date"], errors="coerce")
+        frame["initiate_month"] = dates.dt.strftime("%Y-%m").astype(object).where(dates.notna(), None)
+        days = (dates - pd.Timestamp("1970-01-01")).dt.days
+        frame["day"] = days.fillna(NO_DATE).astype(np.int32)
+        return frame
+
+    def _encode_frame(self, frame):
+        codes = {name: self._encode(name, frame[name].to_numpy()) for name in CATEGORICAL_COLUMNS}
+        return frame["id"].to_numpy(dtype=np.int64), frame["day"].to_numpy(dtype=np.int32), codes
+
+    def refresh(self, db: Session):
+        """Bring the store up to the current data version; cheap when nothing changed."""
+        version = data_version()
+        if self.version == version:
+            return
+        with self._lock:
+            if self.version == version:
+                return
+            self._refresh(db, None if self.version is None else changed_since(db, self.version))
+            self.version = version
+
+    def _refresh(self, db: Session, changed):
+        """Append new rows and re-read the changed ids (all known rows if changed is None)."""
+        max_id = int(self.ids[-1]) if len(self.ids) else 0
+        if changed is None:
+            changed = self.ids.tolist()
+        new_frame = self._read_frame(db, Complaint.id > max_id)
+        if len(new_frame):
+            ids, days, codes = self._encode_frame(new_frame)
+            self.ids = np.concatenate([self.ids, ids])
+            self.days = np.concatenate([self.days, days])
+            for name in CATEGORICAL_COLUMNS:
+                self.codes[name] = np.concatenate([self.codes[name], codes[name]])
+
+        changed = sorted(id_ for id_ in changed if id_ <= max_id)
+        for start in range(0, len(changed), LOOKUP_CHUNK_SIZE):
+            frame = self._read_frame(db, Complaint.id.in_(changed[start:start + LOOKUP_CHUNK_SIZE]))
+            if not len(frame):
+                continue
+            ids, days, codes = self._encode_frame(frame)
+            rows = np.searchsorted(self.ids, ids)
+            self.days[rows] = days
+            for name in CATEGORICAL_COLUMNS:
+                self.codes[name][rows] = codes[name]
+
+        if len(new_frame) or changed:
+            logger.info(f"Columnar store refreshed: {len(new_frame)} new, {len(changed)} changed, "
+                        f"{len(self.ids)} complaints")
+
+    def mask(self, filters=None, ignore=()):
+        """Boolean row mask for a /complaints style filter dict.
+
+        Filter parameters named in ignore are skipped; unparseable dates are ignored.
+        """
+        mask = np.ones(len(self.ids), dtype=bool)
+        filters = filters or {}
+        for name, column in FILTER_COLUMNS.items():
+            if name in ignore:
+                continue
+            wanted = [value for value in (filters.get(name) or []) if value != ""]
+            if wanted:
+                lookup = self.lookup[column]
+                codes = [lookup[value] for value in wanted if value in lookup]
+                mask &= np.isin(self.codes[column], codes)
+
+        for name, keep in (("start_date", np.greater_equal), ("end_date", np.less_equal)):
+            if filters.get(name):
+                try:
+                    day = _day_number(pd.to_datetime(filters[name]).date())
+                except Exception as e:
+                    print(f"Error parsing {name}: {str(e)}")
+                    continue
+                mask &= (self.days != NO_DATE) & keep(self.days, day)
+        return mask
+
+    def group_counts(self, mask, column, skip_blank=False):
+        """{value: count} of column over the masked rows, ordered like a SQL GROUP BY (NULL first)."""
+        counts = np.bincount(self.codes[column][mask], minlength=len(self.values[column]))
+        result = {}
+        for code in np.flatnonzero(counts):
+            value = self.values[column][code]
+            if skip_blank and not (value and value.strip()):
+                continue
+            result[value] = int(counts[code])
+        return dict(sorted(result.items(), key=lambda item: (item[0] is not None, item[0] or "")))
+
+    def counts(self, filters, columns, ignore=(), skip_blank=False):
+        """{column: {value: count}} for the rows matching filters (see mask)."""
+        with self._lock:
+            mask = self.mask(filters, ignore)
+            return {column: self.group_counts(mask, column, skip_blank) for column in columns}
+
+    def matching_ids(self, filters):
+        """Sorted ids of the complaints matching filters (see mask)."""
+        with self._lock:
+            return self.ids[self.mask(filters)]
+
+    def facet_counts(self, filters=None):
+        """Same result as stats_cube.facet_counts, from one mask per facet."""
+        with self._lock:
+            everything = self.mask()
+            result = {}
+            for name, column in FILTER_COLUMNS.items():
+                present = self.group_counts(everything, column)
+                counts = self.group_counts(self.mask(filters, ignore=(name,)), column)
+                entries = [{"value": value, "count": counts.get(value, 0)} for value in present if value]
+                result[name] = sorted(entries, key=lambda entry: (-entry["count"], entry["value"]))
+
+            # Distinct (identifier, name) code pairs; keep the smallest non-empty name
+            pairs = np.unique(np.stack([self.codes["catalog_item_identifier"],
+                                        self.codes["catalog_item_name"]]), axis=1)
+            names = {}
+            for catalog_code, name_code in pairs.T:
+                identifier = self.values["catalog_item_identifier"][catalog_code]
+                product = self.values["catalog_item_name"][name_code]
+                if identifier and product and (identifier not in names or product < names[identifier]):
+                    names[identifier] = product
+            for entry in result["catalog_item_identifier"]:
+                entry["name"] = names.get(entry["value"])
+            return result
+
+
+_store = ColumnarStore()
+
+
+def get_store(db: Session) -> ColumnarStore:
+    """The process-wide store, refreshed to the current data version."""
+    _store.refresh(db)
+    return _store
+
@@ -1,4 +1,5 @@
 # database.py  
+import os
 from sqlalchemy import create_engine  
 from sqlalchemy.ext.declarative import declarative_base  
 from sqlalchemy.orm import sessionmaker, Session  
@@ -32,4 +33,20 @@ def get_db() -> Generator[Session, None, None]:
     try:  
         yield db  
     finally:  
-        db.close()  
\ No newline at end of file
+        db.close()
+
+def upgrade_database(revision: str = "head") -> None:
+    """
+    使用 Alembic 将数据库结构升级到指定版本（默认最新）
+
+    迁移脚本位于 migrations/versions，命令行等价于 `alembic upgrade head`
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    config = Config(os.path.join(base_dir, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(base_dir, "migrations"))
+    # 保留应用自身的日志配置
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, revision)
@@ -0,0 +1,174 @@
+# embedding_store.py
+"""Append-only on-disk embedding store, read through a memory map.
+
+Layout of the store directory:
+
+    meta.json     {"dimension": d, "dtype": "float32", "model": name}, written once
+    vectors.f32   row-major float32 matrix, one L2-normalized row per append
+    ids.txt       one "PR ID<tab>text key" line per row; line i names row i
+
+A store holds the vectors of one embedding model, so switching models
+means switching directories, never mixing vector spaces. The text key
+identifies the text a vector was computed from (services.embedding_key),
+so callers can tell an embedding that is out of date from a current one.
+
+Appends write the vector rows first and fsync them, then append the ID lines,
+so a row only becomes visible once its vector is durable; a crash mid-append
+leaves at most an unterminated ID line or trailing vector bytes, which the
+next append overwrites. Re-embedding a PR ID (its text changed) appends a
+new row and the latest row wins. Opening the store maps vectors.f32 instead of reading it, so
+startup cost does not grow with the matrix and worker processes share the
+OS page cache. Writers serialize on a file lock. A refresh parses the new
+ID lines first and publishes them together with the remapped vectors under
+the store's thread lock; readers that need row numbers and vectors to
+agree take them in one call (snapshot, get).
+"""
+import os
+import json
+import contextlib
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within the process
+    fcntl = None
+
+DTYPE = np.float32
+
+
+def fsync_write(path, mode, data, offset=None):
+    with open(path, mode) as f:
+        if offset is not None:
+            f.seek(offset)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class EmbeddingStore:
+    """PR ID -> normalized embedding and text key, stored append-only and memory-mapped."""
+
+    def __init__(self, directory, model=None):
+        self.directory = directory
+        self.model = model
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.ids_path = os.path.join(directory, "ids.txt")
+        self.lock_path = os.path.join(directory, ".lock")
+        self._lock = threading.RLock()
+        self.dimension = None
+        self.ids = []
+        self.row_of = {}
+        self.key_of = {}
+        self.vectors = np.empty((0, 0), dtype=DTYPE)
+        self._ids_offset = 0
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def __contains__(self, pr_id):
+        return pr_id in self.row_of
+
+    def refresh(self):
+        """Pick up rows appended since the last refresh (also by other processes)."""
+        with self._lock:
+            if self.dimension is None:
+                if not os.path.exists(self.meta_path):
+                    return
+                with open(self.meta_path) as f:
+                    meta = json.load(f)
+                if self.model and meta.get("model") != self.model:
+                    raise ValueError(f"{self.directory} holds embeddings of {meta.get('model')}, not {self.model}")
+                self.dimension = meta["dimension"]
+
+            if not os.path.exists(self.ids_path):
+                return
+            with open(self.ids_path, "rb") as f:
+                f.seek(self._ids_offset)
+                data = f.read()
+            # Ignore an unterminated last line: its append has not finished
+            complete = data[:data.rfind(b"\n") + 1]
+            if not complete:
+                return
+            lines = [line.partition("\t") for line in complete.decode("utf-8").splitlines()]
+            rows = len(self.ids) + len(lines)
+            # Map the new rows before any lookup can return them
+            self.vectors = np.memmap(self.vectors_path, dtype=DTYPE, mode="r", shape=(rows, self.dimension))
+            for row, (pr_id, _, key) in enumerate(lines, start=len(self.ids)):
+                self.row_of[pr_id] = row
+                self.key_of[pr_id] = key
+            self.ids.extend(pr_id for pr_id, _, _ in lines)
+            self._ids_offset += len(complete)
+
+    def snapshot(self, pr_ids):
+        """(rows of pr_ids, vectors) taken together; -1 for PR IDs without an embedding.
+
+        Every returned row is within the returned vectors, even while another
+        thread appends.
+        """
+        with self._lock:
+            rows = np.array([self.row_of.get(pr_id, -1) for pr_id in pr_ids], dtype=np.int64)
+            return rows, self.vectors
+
+    def has(self, pr_id, key):
+        """Whether the latest embedding of pr_id was computed from the text with this key."""
+        return self.key_of.get(pr_id) == key
+
+    def get(self, pr_id, key=None):
+        """Stored (normalized) embedding of pr_id, or None (also if key is given and differs)."""
+        with self._lock:
+            row = self.row_of.get(pr_id)
+            if row is None or (key is not None and self.key_of[pr_id] != key):
+                return None
+            return self.vectors[row]
+
+    def append(self, pr_ids, vectors, keys):
+        """Append embeddings (normalized on the way in) with their text keys; returns their row numbers."""
+        vectors = np.array(vectors, dtype=DTYPE, ndmin=2)
+        if not len(pr_ids):
+            return []
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+
+        with self.write_lock():
+            return self._append_locked(list(pr_ids), vectors, list(keys))
+
+    @contextlib.contextmanager
+    def write_lock(self):
+        """Hold the store's write lock (across processes); also taken by files derived from the store."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.lock_path, "a") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _append_locked(self, pr_ids, vectors, keys):
+        if not os.path.exists(self.meta_path):
+            tmp_path = self.meta_path + ".tmp"
+            meta = {"dimension": vectors.shape[1], "dtype": "float32", "model": self.model}
+            fsync_write(tmp_path, "w", json.dumps(meta))
+            os.replace(tmp_path, self.meta_path)
+        self.refresh()
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store ({self.dimension})")
+
+        # Drop a torn ID line left by an interrupted append
+        if os.path.exists(self.ids_path) and os.path.getsize(self.ids_path) > self._ids_offset:
+            with open(self.ids_path, "r+b") as f:
+                f.truncate(self._ids_offset)
+
+        first_row = len(self.ids)
+        row_bytes = self.dimension * np.dtype(DTYPE).itemsize
+        fsync_write(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb",
+                     vectors.tobytes(), offset=first_row * row_bytes)
+        lines = "".join(f"{pr_id}\t{key}\n" for pr_id, key in zip(pr_ids, keys))
+        fsync_write(self.ids_path, "ab", lines.encode("utf-8"))
+        self.refresh()
+        return list(range(first_row, first_row + len(pr_ids)))
@@ -0,0 +1,126 @@
+# exports.py
+"""Streaming export of filtered complaints as NDJSON, CSV or XLSX."""
+import io
+import os
+import csv
+import json
+import logging
+import tempfile
+
+from database import SessionLocal
+from ingestion import DATE_COLUMNS, TEXT_COLUMNS
+from models import Complaint
+from services import COMPLAINT_FIELDS, apply_complaint_filters
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the database cursor and written per output chunk
+EXPORT_CHUNK_SIZE = 1000
+# Block size used when streaming a finished XLSX file
+FILE_BLOCK_SIZE = 1024 * 1024
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Complaint field -> export column, so CSV/XLSX exports can be uploaded again
+EXPORT_HEADERS = {field: column for column, field in {**TEXT_COLUMNS, **DATE_COLUMNS}.items()}
+
+
+def _iter_row_chunks(filters, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of row tuples from a server-side cursor, chunk_size rows at a time.
+
+    Uses its own session because the response body is produced after the
+    request's dependencies may already have been cleaned up.
+    """
+    db = SessionLocal()
+    try:
+        query = apply_complaint_filters(db.query(*[getattr(Complaint, name) for name in fields]), filters)
+        query = query.order_by(Complaint.id).execution_options(yield_per=chunk_size)
+        chunk = []
+        for row in query:
+            chunk.append(tuple(row))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        db.close()
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def iter_ndjson(filters, fields):
+    """One JSON object per complaint and line."""
+    for chunk in _iter_row_chunks(filters, fields):
+        lines = [
+            json.dumps(dict(zip(fields, row)), ensure_ascii=False, default=str)
+            for row in chunk
+        ]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def iter_csv(filters, fields):
+    """CSV with export column names as header; UTF-8 with BOM so Excel detects the encoding."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\r\n")
+    writer.writerow([EXPORT_HEADERS.get(field, field) for field in fields])
+    yield buffer.getvalue().encode("utf-8-sig")
+
+    for chunk in _iter_row_chunks(filters, fields):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_cell(value) for value in row] for row in chunk)
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_xlsx(filters, fields):
+    """XLSX built with a write-only workbook, then streamed from a temp file.
+
+    The zip container can only be finalized once all rows are written, so the
+    first bytes are sent after the workbook is saved; memory stays bounded
+    because write-only worksheets spool rows to disk.
+    """
+    from openpyxl import Workbook
+
+    fd, path = tempfile.mkstemp(prefix="complaint_export_", suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Complaints")
+        sheet.append([EXPORT_HEADERS.get(field, field) for field in fields])
+        for chunk in _iter_row_chunks(filters, fields):
+            for row in chunk:
+                sheet.append(list(row))
+        workbook.save(path)
+
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(FILE_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+    finally:
+        os.remove(path)
+
+
+def iter_export(export_format, filters, fields=None):
+    """Byte chunks of the export in the given format (a key of EXPORT_FORMATS)."""
+    fields = list(fields or COMPLAINT_FIELDS)
+    logger.info(f"Exporting complaints as {export_format}: fields={len(fields)}, filters={filters}")
+    if export_format == "ndjson":
+        return iter_ndjson(filters, fields)
+    if export_format == "csv":
+        return iter_csv(filters, fields)
+    if export_format == "xlsx":
+        return iter_xlsx(filters, fields)
+    raise ValueError(f"Unsupported export format: {export_format}")
@@ -0,0 +1,448 @@
+# ingestion.py
+"""Bulk ingestion of complaint exports into the complaints table."""
+import os
+import time
+import datetime
+import shutil
+import logging
+import tempfile
+from contextlib import contextmanager
+
+import pandas as pd
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from models import Complaint
+from time_buckets import bucket_keys
+from result_cache import bump_data_version
+from stats_cube import apply_cube_delta, cells_of, snapshot_cells
+
+logger = logging.getLogger(__name__)
+
+# Export column -> Complaint field for plain text columns
+TEXT_COLUMNS = {
+    "PR ID": "pr_id",
+    "Short Description": "short_description",
+    "Description": "description",
+    "Source Customer Description": "source_customer_description",
+    "Source System": "source_system",
+    "Source Identifier": "source_identifier",
+    "Serial Number": "serial_number",
+    "Final Reportability": "final_reportability",
+    "Comments": "comments",
+    "Event Type": "event_type",
+    "Event Country": "event_country",
+    "Source Notes": "source_notes",
+    "Project": "project",
+    "Investigation Notes": "investigation_notes",
+    "Potential Safety Alert": "potential_safety_alert",
+    "Assigned To": "assigned_to",
+    "PR State": "pr_state",
+    "Product Software Revision": "product_software_revision",
+    "Investigation Summary": "investigation_summary",
+    "Reporting Institution Name": "reporting_institution_name",
+    "Catalog Item Name": "catalog_item_name",
+    "Catalog Item Identifier": "catalog_item_identifier",
+}
+
+# Export column -> Complaint field for date columns
+DATE_COLUMNS = {
+    "Initiate Date": "initiate_date",
+    "Become Aware Date": "become_aware_date",
+    "Philips Notified Date": "philips_notified_date",
+}
+
+REQUIRED_COLUMNS = ["PR ID", "Short Description"]
+
+# Complaint fields filled from the export; these make up the content hash
+SOURCE_FIELDS = list(TEXT_COLUMNS.values()) + list(DATE_COLUMNS.values())
+
+# File extension -> upload format
+UPLOAD_FORMATS = {
+    ".xlsx": "xlsx",
+    ".xls": "xls",
+    ".csv": "csv",
+    ".parquet": "parquet",
+}
+
+# Upload modes: insert only skips existing PR IDs, upsert refreshes changed ones
+MODE_INSERT = "insert"
+MODE_UPSERT = "upsert"
+INGEST_MODES = (MODE_INSERT, MODE_UPSERT)
+
+# Classification fields start out unclassified for every new complaint
+DEFAULT_CLASSIFICATION = {
+    "system_component": "N/A",
+    "failure_mode": "N/A",
+    "severity": "N/A",
+    "priority": "N/A",
+}
+
+# SQLite allows at most 999 bound parameters per statement
+LOOKUP_CHUNK_SIZE = 500
+# Rows per INSERT batch; each batch is committed in its own transaction
+INSERT_CHUNK_SIZE = 5000
+# Rows per DataFrame handed to the insert pipeline in streaming mode
+STREAM_CHUNK_SIZE = int(os.environ.get("INGEST_STREAM_CHUNK_SIZE", "5000"))
+# Uploads at least this large are always ingested in streaming mode
+STREAM_THRESHOLD_BYTES = int(os.environ.get("INGEST_STREAM_THRESHOLD_MB", "20")) * 1024 * 1024
+
+
+class IngestionError(ValueError):
+    """Raised when an uploaded export cannot be parsed or lacks required columns."""
+
+
+@contextmanager
+def timed(timings, phase):
+    """Add the wall time of the enclosed block to timings[phase] (seconds)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+
+
+def missing_required_columns(columns):
+    """Return the required export columns that are not present."""
+    return [col for col in REQUIRED_COLUMNS if col not in columns]
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """Vectorized date parsing; unparseable or empty cells become None."""
+    parsed = pd.to_datetime(values, errors="coerce")
+    # pandas infers a single format from the first value, so re-parse the
+    # non-empty leftovers element-wise to keep mixed-format exports working
+    retry = parsed.isna() & values.astype(str).str.strip().ne("")
+    if retry.any():
+        parsed.loc[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return parsed.dt.date.astype(object).where(parsed.notna(), None)
+
+
+def content_hash(frame: pd.DataFrame) -> pd.Series:
+    """Vectorized per-row hash of the export-sourced Complaint fields."""
+    hashed = frame[SOURCE_FIELDS].copy()
+    for field in DATE_COLUMNS.values():
+        hashed[field] = hashed[field].map(lambda d: d.isoformat() if d is not None else "")
+    return pd.util.hash_pandas_object(hashed, index=False).map("{:016x}".format)
+
+
+def prepare_complaint_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Map raw export columns onto Complaint fields column-wise."""
+    empty = pd.Series("", index=df.index, dtype=object)
+    frame = pd.DataFrame(index=df.index)
+
+    for source, field in TEXT_COLUMNS.items():
+        frame[field] = df[source].astype(str) if source in df.columns else empty
+
+    frame["source_notes"] = frame["source_notes"].str.replace("\r", "\n", regex=False)
+
+    for source, field in DATE_COLUMNS.items():
+        frame[field] = parse_dates(df[source]) if source in df.columns else None
+
+    frame["content_hash"] = content_hash(frame)
+    # Trend bucket keys are derived data, so they are not part of the content hash
+    for field, keys in bucket_keys(frame["initiate_date"]).items():
+        frame[field] = keys
+    return frame
+
+
+def find_existing_complaints(db: Session, pr_ids) -> dict:
+    """Map stored pr_ids to (id, content_hash), using chunked IN lookups."""
+    pr_ids = list(pr_ids)
+    existing = {}
+    for start in range(0, len(pr_ids), LOOKUP_CHUNK_SIZE):
+        chunk = pr_ids[start:start + LOOKUP_CHUNK_SIZE]
+        rows = db.execute(
+            select(Complaint.pr_id, Complaint.id, Complaint.content_hash).where(Complaint.pr_id.in_(chunk))
+        )
+        existing.update((pr_id, (id_, hash_)) for pr_id, id_, hash_ in rows)
+    return existing
+
+
+def _execute_in_chunks(db: Session, write_chunk, records, action, log_changes=False):
+    """Call write_chunk(chunk) for each chunk of records, one transaction per chunk.
+
+    A chunk that fails to commit is rolled back and counted as failed; the
+    remaining chunks are still written. Each chunk bumps the data version in
+    its transaction; log_changes also logs the chunk's ids ("id" of each
+    record) as updated. Returns (written, failed).
+    """
+    written = 0
+    failed = 0
+    for start in range(0, len(records), INSERT_CHUNK_SIZE):
+        chunk = records[start:start + INSERT_CHUNK_SIZE]
+        try:
+            write_chunk(chunk)
+            bump_data_version(db, [record["id"] for record in chunk] if log_changes else ())
+            db.commit()
+            written += len(chunk)
+        except Exception as e:
+            db.rollback()
+            failed += len(chunk)
+            logger.error(f"Failed to {action} {len(chunk)} complaints starting at {chunk[0]['pr_id']}: {str(e)}",
+                         exc_info=True)
+    return written, failed
+
+
+def bulk_insert_complaints(db: Session, records):
+    """Insert complaint dicts in chunks. Returns (inserted, failed).
+
+    The statistics cube is updated in the same transaction as each chunk.
+    """
+    def write_chunk(chunk):
+        db.execute(insert(Complaint), chunk)
+        apply_cube_delta(db, cells_of(chunk))
+
+    return _execute_in_chunks(db, write_chunk, records, "insert")
+
+
+def bulk_update_complaints(db: Session, records):
+    """Update complaints by primary key ("id" in each dict). Returns (updated, failed).
+
+    The cube cells of the updated rows are read before and after each chunk,
+    so the cube follows whatever dimensions the update touched.
+    """
+    def write_chunk(chunk):
+        ids = [record["id"] for record in chunk]
+        before = snapshot_cells(db, ids)
+        db.execute(update(Complaint), chunk)
+        delta = snapshot_cells(db, ids)
+        delta.subtract(before)
+        apply_cube_delta(db, delta)
+
+    return _execute_in_chunks(db, write_chunk, records, "update", log_changes=True)
+
+
+def new_ingest_result():
+    """Empty result dict that the ingest functions accumulate into."""
+    return {
+        "status": "success",
+        "total_rows": 0,
+        "new_complaints": 0,
+        "existing_complaints": 0,
+        "updated_complaints": 0,
+        "unchanged_complaints": 0,
+        "failed_complaints": 0,
+        "parse_rows_per_second": 0.0,
+        "timings": {},
+    }
+
+
+def ingest_frame(db: Session, df: pd.DataFrame, result=None, mode=MODE_INSERT):
+    """Store the complaints of one export frame.
+
+    New PR IDs are always inserted. In insert mode rows whose PR ID already
+    exists are counted as existing and left untouched; in upsert mode their
+    export fields are rewritten when the content hash differs from the stored
+    one. Classification fields are never overwritten by an upload.
+    """
+    if result is None:
+        result = new_ingest_result()
+    timings = result["timings"]
+    result["total_rows"] += len(df)
+
+    with timed(timings, "transform"):
+        frame = prepare_complaint_frame(df)
+        # In upsert mode the last occurrence of a PR ID is its latest state
+        duplicated = frame["pr_id"].duplicated(keep="last" if mode == MODE_UPSERT else "first")
+        frame = frame[~duplicated]
+
+    with timed(timings, "lookup"):
+        existing = find_existing_complaints(db, frame["pr_id"])
+        is_new = ~frame["pr_id"].isin(existing.keys())
+
+    with timed(timings, "insert"):
+        new_rows = frame[is_new].assign(**DEFAULT_CLASSIFICATION)
+        inserted, failed = bulk_insert_complaints(db, new_rows.to_dict("records"))
+
+    result["new_complaints"] += inserted
+    result["failed_complaints"] += failed
+    result["existing_complaints"] += int(duplicated.sum()) + len(existing)
+
+    if mode == MODE_UPSERT and existing:
+        with timed(timings, "update"):
+            stored = frame[~is_new]
+            stored_ids = stored["pr_id"].map(lambda pr_id: existing[pr_id][0])
+            stored_hashes = stored["pr_id"].map(lambda pr_id: existing[pr_id][1])
+            changed = stored[stored["content_hash"] != stored_hashes]
+            records = changed.assign(id=stored_ids[changed.index], updated_at=datetime.datetime.now())
+            updated, failed = bulk_update_complaints(db, records.to_dict("records"))
+
+        result["updated_complaints"] += updated
+        result["unchanged_complaints"] += len(stored) - len(changed)
+        result["failed_complaints"] += failed
+
+    return result
+
+
+def ingest_chunks(db: Session, chunks, result=None, mode=MODE_INSERT):
+    """Run every DataFrame produced by chunks through ingest_frame.
+
+    Parsing happens lazily while iterating, so its time is reported under the
+    "parse" phase. Parse failures and missing required columns are raised as
+    IngestionError. result is updated after every chunk, so another thread
+    can read it to report progress.
+    """
+    if result is None:
+        result = new_ingest_result()
+    timings = result["timings"]
+    chunks = iter(chunks)
+    first = True
+
+    try:
+        while True:
+            try:
+                with timed(timings, "parse"):
+                    df = next(chunks, None)
+            except IngestionError:
+                raise
+            except Exception as e:
+                raise IngestionError(f"File format is incorrect: {str(e)}") from e
+            if df is None:
+                break
+
+            if first:
+                missing_columns = missing_required_columns(df.columns)
+                if missing_columns:
+                    raise IngestionError(f"File missing required columns: {', '.join(missing_columns)}")
+                first = False
+
+            ingest_frame(db, df, result, mode)
+            logger.info(f"Ingested chunk: rows={result['total_rows']}, new={result['new_complaints']}, "
+                        f"updated={result['updated_complaints']}")
+    finally:
+        # Release the underlying workbook/file handle even if ingestion stops early
+        if hasattr(chunks, "close"):
+            chunks.close()
+        if timings.get("parse"):
+            result["parse_rows_per_second"] = round(result["total_rows"] / timings["parse"], 1)
+
+    return result
+
+
+def read_excel_frame(source) -> pd.DataFrame:
+    """Read a whole Excel export as strings, keeping empty cells as ''."""
+    return pd.read_excel(source, header=0, dtype=str, na_filter=False)
+
+
+def read_excel_chunks(source):
+    """Yield a whole Excel export as a single chunk."""
+    yield read_excel_frame(source)
+
+
+def iter_csv_chunks(path, chunk_size=STREAM_CHUNK_SIZE):
+    """Stream a CSV export as string DataFrames with pandas' C parser."""
+    with pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size,
+                     encoding="utf-8-sig") as reader:
+        yield from reader
+
+
+def iter_parquet_chunks(path, chunk_size=STREAM_CHUNK_SIZE):
+    """Stream a Parquet export batch by batch, rendering every column as strings."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise IngestionError("Parquet uploads require the pyarrow package") from e
+
+    parquet_file = pq.ParquetFile(path)
+    try:
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            df = batch.to_pandas()
+            # Typed Parquet columns (dates, numbers) go through the same string
+            # mapping as Excel/CSV exports; nulls become '' like na_filter=False
+            for column in df.columns:
+                if df[column].dtype != object:
+                    df[column] = df[column].astype(str).where(df[column].notna(), "")
+                else:
+                    df[column] = df[column].fillna("").astype(str)
+            yield df
+    finally:
+        parquet_file.close()
+
+
+def upload_format(filename):
+    """Upload format derived from the file extension, or None if unsupported."""
+    return UPLOAD_FORMATS.get(os.path.splitext(filename)[1].lower())
+
+
+def iter_upload_chunks(path, filename, stream=False):
+    """Pick the chunk reader for a spooled upload.
+
+    CSV and Parquet are always read in chunks through their columnar readers.
+    .xlsx files are streamed with the read-only row iterator when stream is
+    set or the file is at least STREAM_THRESHOLD_BYTES; openpyxl cannot read
+    legacy .xls files, so those are always parsed in one go.
+    """
+    file_format = upload_format(filename)
+    if file_format == "csv":
+        return iter_csv_chunks(path)
+    if file_format == "parquet":
+        return iter_parquet_chunks(path)
+
+    stream = stream or os.path.getsize(path) >= STREAM_THRESHOLD_BYTES
+    if stream and file_format == "xlsx":
+        return iter_excel_chunks(path)
+    return read_excel_chunks(path)
+
+
+def spool_upload(fileobj, suffix) -> str:
+    """Copy an uploaded file object to a named temp file in fixed-size blocks.
+
+    The caller owns the returned path and must remove it.
+    """
+    fd, path = tempfile.mkstemp(prefix="complaint_upload_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(fileobj, out, 1024 * 1024)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def _cell_to_str(value) -> str:
+    """Render an openpyxl cell value the way read_excel(dtype=str) does."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def iter_excel_chunks(path, chunk_size=STREAM_CHUNK_SIZE):
+    """Stream an .xlsx export as DataFrames of at most chunk_size rows.
+
+    Uses openpyxl's read-only row iterator, so only the current chunk is held
+    in memory. A header-only sheet yields one empty DataFrame so that the
+    caller can still validate the columns; a sheet without a header row
+    raises IngestionError.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            # An empty sheet has no columns at all, as read_excel_frame would report
+            raise IngestionError(f"File missing required columns: {', '.join(REQUIRED_COLUMNS)}")
+        columns = [_cell_to_str(cell) for cell in header]
+        width = len(columns)
+
+        batch = []
+        yielded = False
+        for row in rows:
+            if all(cell is None for cell in row):
+                continue
+            values = [_cell_to_str(cell) for cell in row[:width]]
+            values.extend([""] * (width - len(values)))
+            batch.append(values)
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch, columns=columns)
+                yielded = True
+                batch = []
+
+        if batch or not yielded:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
@@ -0,0 +1,448 @@
+# jobs.py
+"""Background jobs: ingestion of uploaded complaint exports, embedding precomputation and index updates."""
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from database import SessionLocal
+from ingestion import (
+    MODE_INSERT,
+    IngestionError,
+    ingest_chunks,
+    iter_upload_chunks,
+    new_ingest_result,
+    upload_format
+)
+
+logger = logging.getLogger(__name__)
+
+# SQLite has a single writer, so by default jobs are processed one at a time
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "1"))
+# Number of finished jobs kept around for status queries
+MAX_FINISHED_JOBS = 100
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+# Embedding jobs run one at a time on their own thread (they append to the same store
+# and share the model), so they never wait behind clustering or neighbour rebuilds
+_embedding_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+# Other index maintenance (full-text index updates, clustering, neighbour lists) runs one task at a time
+_index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index")
+_embedding_jobs = OrderedDict()
+_clustering_jobs = OrderedDict()
+_neighbor_jobs = OrderedDict()
+# Whether an ANN index build is waiting on the index thread
+_ann_build_queued = False
+
+
+def _new_job(filename, mode):
+    return {
+        "job_id": uuid.uuid4().hex,
+        "filename": filename,
+        "format": upload_format(filename),
+        "mode": mode,
+        "status": "queued",
+        "error": None,
+        "submitted_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "result": new_ingest_result(),
+    }
+
+
+def _prune_finished_jobs(jobs):
+    finished = [job_id for job_id, job in jobs.items() if job["status"] in ("completed", "failed")]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del jobs[job_id]
+
+
+def _run_ingestion_job(job, path, stream):
+    """Worker body: ingest the spooled file and record the outcome on the job."""
+    job["status"] = "running"
+    job["started_at"] = time.time()
+    db = SessionLocal()
+    try:
+        ingest_chunks(db, iter_upload_chunks(path, job["filename"], stream), job["result"], job["mode"])
+        job["status"] = "completed"
+        if job["result"]["new_complaints"] or job["result"]["updated_complaints"]:
+            _index_executor.submit(_refresh_text_index)
+            _queue_embeddings_after_upload(job)
+    except IngestionError as e:
+        logger.warning(f"Ingestion job {job['job_id']} rejected {job['filename']}: {str(e)}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    except Exception as e:
+        logger.error(f"Ingestion job {job['job_id']} failed: {str(e)}", exc_info=True)
+        job["status"] = "failed"
+        job["error"] = f"Error processing uploaded file: {str(e)}"
+    finally:
+        db.close()
+        job["finished_at"] = time.time()
+        job["result"]["timings"]["total"] = job["finished_at"] - job["started_at"]
+        if os.path.exists(path):
+            os.remove(path)
+        logger.info(f"Ingestion job {job['job_id']} {job['status']}: {job_status(job)}")
+
+
+def submit_ingestion_job(path, filename, stream=False, mode=MODE_INSERT):
+    """Queue a spooled upload for ingestion and return its job id.
+
+    The job takes ownership of path and removes it once finished.
+    """
+    job = _new_job(filename, mode)
+    with _jobs_lock:
+        _prune_finished_jobs(_jobs)
+        _jobs[job["job_id"]] = job
+    _executor.submit(_run_ingestion_job, job, path, stream)
+    logger.info(f"Queued ingestion job {job['job_id']} for {filename}")
+    return job["job_id"]
+
+
+def job_status(job):
+    """Snapshot of a job's progress counters and throughput."""
+    result = job["result"]
+    elapsed = 0.0
+    if job["started_at"]:
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+    rows_parsed = result["total_rows"]
+    return {
+        "job_id": job["job_id"],
+        "filename": job["filename"],
+        "format": job["format"],
+        "mode": job["mode"],
+        "status": job["status"],
+        "error": job["error"],
+        "rows_parsed": rows_parsed,
+        "rows_inserted": result["new_complaints"],
+        "rows_updated": result["updated_complaints"],
+        "rows_unchanged": result["unchanged_complaints"],
+        "rows_skipped": result["existing_complaints"] - result["updated_complaints"],
+        "rows_failed": result["failed_complaints"],
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows_parsed / elapsed, 1) if elapsed > 0 else 0.0,
+        "parse_rows_per_second": result["parse_rows_per_second"],
+        "timings": dict(result["timings"]),
+    }
+
+
+def get_job_status(job_id):
+    """Status of a single job, or None if the id is unknown."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    return job_status(job) if job else None
+
+
+def list_job_statuses():
+    """Status of all known jobs, most recent first."""
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    return [job_status(job) for job in reversed(jobs)]
+
+
+def format_throughput():
+    """Aggregate parse throughput of the completed jobs still in memory, per format."""
+    with _jobs_lock:
+        jobs = [job for job in _jobs.values() if job["status"] == "completed"]
+    totals = {}
+    for job in jobs:
+        entry = totals.setdefault(job["format"], {"jobs": 0, "rows": 0, "parse_seconds": 0.0})
+        entry["jobs"] += 1
+        entry["rows"] += job["result"]["total_rows"]
+        entry["parse_seconds"] += job["result"]["timings"].get("parse", 0.0)
+    for entry in totals.values():
+        seconds = entry["parse_seconds"]
+        entry["parse_seconds"] = round(seconds, 3)
+        entry["rows_per_second"] = round(entry["rows"] / seconds, 1) if seconds > 0 else 0.0
+    return totals
+
+
+def _refresh_text_index():
+    """Index task: build the full-text index, or add the uploaded complaints to it."""
+    from services import refresh_text_index
+
+    db = SessionLocal()
+    try:
+        refresh_text_index(db)
+    except Exception as e:
+        logger.error(f"Updating the full-text index failed: {str(e)}", exc_info=True)
+    finally:
+        db.close()
+
+
+def warm_text_index():
+    """Build the full-text index in the background (on startup), so the first search does not."""
+    _index_executor.submit(_refresh_text_index)
+
+
+def _queue_missing_embeddings():
+    """Index task: queue an embedding job if some complaints have no embedding of their current text."""
+    from services import count_stale_embeddings
+
+    db = SessionLocal()
+    try:
+        stale = count_stale_embeddings(db)
+    except Exception as e:
+        logger.error(f"Checking the embedding store failed: {str(e)}", exc_info=True)
+        return
+    finally:
+        db.close()
+    if stale:
+        logger.info(f"{stale} complaints have no up-to-date embedding")
+        submit_embedding_job(trigger="startup")
+
+
+def warm_embeddings():
+    """On startup, queue the embedding of complaints the store does not cover (e.g. after a model change)."""
+    from services import SIMILARITY_SEARCH_ENABLED
+    if SIMILARITY_SEARCH_ENABLED:
+        _index_executor.submit(_queue_missing_embeddings)
+
+
+def _build_ann_index():
+    """Index task: train the ANN index once the store is large enough for one."""
+    from services import ann_index_needed, build_ann_index
+
+    global _ann_build_queued
+    with _jobs_lock:
+        _ann_build_queued = False
+    db = SessionLocal()
+    try:
+        if ann_index_needed():
+            build_ann_index(db)
+    except Exception as e:
+        logger.error(f"Building the ANN index failed: {str(e)}", exc_info=True)
+    finally:
+        db.close()
+
+
+def queue_ann_build():
+    """Queue training of the ANN index if SIMILARITY_INDEX asks for one (after embedding jobs and on startup).
+
+    Queries scan everything until it is built; no request ever trains it.
+    """
+    from similarity_index import similarity_index
+
+    global _ann_build_queued
+    if similarity_index.ann_class is None:
+        return
+    with _jobs_lock:
+        if _ann_build_queued:
+            return
+        _ann_build_queued = True
+    _index_executor.submit(_build_ann_index)
+
+
+def _queue_embeddings_after_upload(job):
+    from services import SIMILARITY_SEARCH_ENABLED
+    if SIMILARITY_SEARCH_ENABLED:
+        submit_embedding_job(trigger=job["job_id"])
+
+
+def _run_embedding_job(job):
+    """Worker body: embed the complaints that are missing from the embedding store or changed."""
+    from services import precompute_embeddings
+
+    def progress(done, total):
+        job["embedded"] = done
+        job["total"] = total
+
+    job["status"] = "running"
+    job["started_at"] = time.time()
+    db = SessionLocal()
+    try:
+        precompute_embeddings(db, progress)
+        job["status"] = "completed"
+        queue_ann_build()
+        queue_neighbor_update(db, job["job_id"])
+    except Exception as e:
+        logger.error(f"Embedding job {job['job_id']} failed: {str(e)}", exc_info=True)
+        job["status"] = "failed"
+        job["error"] = f"Error computing embeddings: {str(e)}"
+    finally:
+        db.close()
+        job["finished_at"] = time.time()
+        logger.info(f"Embedding job {job['job_id']} {job['status']}: {embedding_job_status(job)}")
+
+
+def submit_embedding_job(trigger="manual"):
+    """Queue embedding of all complaints without an up-to-date embedding and return the job id.
+
+    trigger is the ingestion job that caused it, "startup" or "manual". If a job is still
+    queued it covers the new and changed complaints too, so its id is returned instead.
+    """
+    with _jobs_lock:
+        for job in _embedding_jobs.values():
+            if job["status"] == "queued":
+                return job["job_id"]
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "trigger": trigger,
+            "status": "queued",
+            "error": None,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "total": 0,
+            "embedded": 0,
+        }
+        _prune_finished_jobs(_embedding_jobs)
+        _embedding_jobs[job["job_id"]] = job
+    _embedding_executor.submit(_run_embedding_job, job)
+    logger.info(f"Queued embedding job {job['job_id']} ({trigger})")
+    return job["job_id"]
+
+
+def embedding_job_status(job):
+    """Snapshot of an embedding job's progress and encoding throughput."""
+    elapsed = 0.0
+    if job["started_at"]:
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+    return {
+        "job_id": job["job_id"],
+        "trigger": job["trigger"],
+        "status": job["status"],
+        "error": job["error"],
+        "total": job["total"],
+        "embedded": job["embedded"],
+        "elapsed_seconds": round(elapsed, 3),
+        "texts_per_second": round(job["embedded"] / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def get_embedding_job_status(job_id):
+    """Status of a single embedding job, or None if the id is unknown."""
+    with _jobs_lock:
+        job = _embedding_jobs.get(job_id)
+    return embedding_job_status(job) if job else None
+
+
+def list_embedding_job_statuses():
+    """Status of all known embedding jobs, most recent first."""
+    with _jobs_lock:
+        jobs = list(_embedding_jobs.values())
+    return [embedding_job_status(job) for job in reversed(jobs)]
+
+
+def _run_batch_job(job, kind, work):
+    """Worker body of a clustering or neighbour job: job["result"] = work(db, progress)."""
+    def progress(done, total):
+        job["blocks_done"] = done
+        job["blocks"] = total
+
+    job["status"] = "running"
+    job["started_at"] = time.time()
+    db = SessionLocal()
+    try:
+        job["result"] = work(db, progress)
+        job["status"] = "completed"
+    except Exception as e:
+        logger.error(f"{kind.capitalize()} job {job['job_id']} failed: {str(e)}", exc_info=True)
+        job["status"] = "failed"
+        job["error"] = f"Error in {kind} job: {str(e)}"
+    finally:
+        db.close()
+        job["finished_at"] = time.time()
+        logger.info(f"{kind.capitalize()} job {job['job_id']} {job['status']}: {batch_job_status(job)}")
+
+
+def _submit_batch_job(jobs, kind, work, **parameters):
+    job = {
+        "job_id": uuid.uuid4().hex,
+        **parameters,
+        "status": "queued",
+        "error": None,
+        "submitted_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "blocks": 0,
+        "blocks_done": 0,
+        "result": None,
+    }
+    with _jobs_lock:
+        _prune_finished_jobs(jobs)
+        jobs[job["job_id"]] = job
+    _index_executor.submit(_run_batch_job, job, kind, work)
+    logger.info(f"Queued {kind} job {job['job_id']} {parameters}")
+    return job["job_id"]
+
+
+def batch_job_status(job):
+    """Snapshot of a clustering or neighbour job's block progress and result."""
+    elapsed = 0.0
+    if job["started_at"]:
+        elapsed = (job["finished_at"] or time.time()) - job["started_at"]
+    status = {name: value for name, value in job.items() if name not in ("submitted_at", "started_at", "finished_at")}
+    status["elapsed_seconds"] = round(elapsed, 3)
+    return status
+
+
+def _get_batch_job_status(jobs, job_id):
+    with _jobs_lock:
+        job = jobs.get(job_id)
+    return batch_job_status(job) if job else None
+
+
+def _list_batch_job_statuses(jobs):
+    with _jobs_lock:
+        jobs = list(jobs.values())
+    return [batch_job_status(job) for job in reversed(jobs)]
+
+
+def submit_clustering_job(threshold):
+    """Queue a near-duplicate clustering run (it embeds missing complaints first) and return its id."""
+    from services import cluster_complaints
+    return _submit_batch_job(_clustering_jobs, "clustering",
+                             lambda db, progress: cluster_complaints(db, threshold, progress), threshold=threshold)
+
+
+def get_clustering_job_status(job_id):
+    """Status of a single clustering job, or None if the id is unknown."""
+    return _get_batch_job_status(_clustering_jobs, job_id)
+
+
+def list_clustering_job_statuses():
+    """Status of all known clustering jobs, most recent first."""
+    return _list_batch_job_statuses(_clustering_jobs)
+
+
+def submit_neighbor_job(incremental=False, trigger="manual"):
+    """Queue a (re)build of the precomputed neighbour table and return the job id.
+
+    incremental=True only adds the lists of complaints that have none and updates
+    the lists they affect; embedding jobs and classification changes queue one when
+    the table has been built. If an incremental job is still queued it covers the
+    new changes too, so its id is returned instead.
+    """
+    from services import build_neighbor_table
+    if incremental:
+        with _jobs_lock:
+            for job in _neighbor_jobs.values():
+                if job["status"] == "queued" and job["incremental"]:
+                    return job["job_id"]
+    return _submit_batch_job(_neighbor_jobs, "neighbour",
+                             lambda db, progress: build_neighbor_table(db, progress, incremental),
+                             incremental=incremental, trigger=trigger)
+
+
+def queue_neighbor_update(db, trigger):
+    """Queue an incremental neighbour update if the table has been built (after embedding or classification)."""
+    from neighbors import neighbors_built
+    from services import SIMILARITY_SEARCH_ENABLED
+    if SIMILARITY_SEARCH_ENABLED and neighbors_built(db):
+        submit_neighbor_job(incremental=True, trigger=trigger)
+
+
+def get_neighbor_job_status(job_id):
+    """Status of a single neighbour job, or None if the id is unknown."""
+    return _get_batch_job_status(_neighbor_jobs, job_id)
+
+
+def list_neighbor_job_statuses():
+    """Status of all known neighbour jobs, most recent first."""
+    return _list_batch_job_statuses(_neighbor_jobs)
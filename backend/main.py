@@ -1,24 +1,81 @@
 # main.py  
 from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, BackgroundTasks, Query  
 from fastapi.middleware.cors import CORSMiddleware  
-from fastapi.responses import JSONResponse  
-import pandas as pd  
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session  
-from database import get_db  
+from database import get_db, upgrade_database
 from models import Complaint  
+from stats_cube import complaint_cell, record_cell_change
+from result_cache import bump_data_version, etag_for, result_cache
+from neighbors import drop_neighbors
+from similarity_index import METADATA_BOOSTS
 from services import (
     classify_complaint, 
     get_statistics, 
     get_filter_options,
+    get_filter_facets,
     get_monthly_trend,
+    get_trend,
     get_country_statistics,
     get_product_statistics,
-    find_similar_complaints
+    find_similar_complaints,
+    search_complaints,
+    get_clusters,
+    get_dashboard,
+    LARGE_TEXT_FIELDS,
+    LIST_FIELDS,
+    apply_complaint_filters,
+    count_complaints,
+    get_complaint_fields,
+    list_complaints_page,
+    parse_fields
 )  
-import io  
+from ingestion import INGEST_MODES, MODE_INSERT, spool_upload, upload_format
+from exports import EXPORT_FORMATS, iter_export
+from jobs import (
+    format_throughput,
+    get_clustering_job_status,
+    get_embedding_job_status,
+    get_job_status,
+    get_neighbor_job_status,
+    list_clustering_job_statuses,
+    list_embedding_job_statuses,
+    list_job_statuses,
+    list_neighbor_job_statuses,
+    queue_ann_build,
+    queue_neighbor_update,
+    submit_clustering_job,
+    submit_embedding_job,
+    submit_ingestion_job,
+    submit_neighbor_job,
+    warm_embeddings,
+    warm_text_index
+)
+from clustering import CLUSTER_THRESHOLD
+import os
 import logging  
+import datetime
 from typing import Optional  
 
+# Page size used when only a cursor is given
+DEFAULT_PAGE_SIZE = 100
+
+# Read endpoints answered with an ETag; If-None-Match hits get a 304
+ETAG_PATHS = {
+    "/statistics",
+    "/dashboard",
+    "/filter-options",
+    "/filter-options/facets",
+    "/monthly-trend",
+    "/trend",
+    "/country-statistics",
+    "/product-statistics",
+    "/complaints",
+    "/search",
+    "/clusters",
+}
+
 # Configure logging  
 logging.basicConfig(level=logging.INFO)  
 logger = logging.getLogger(__name__)  
@@ -27,6 +84,42 @@ logger = logging.getLogger(__name__)
 # Base.metadata.create_all(bind=engine)  
 app = FastAPI(title="CT Complaint Classification System")  
 
+@app.on_event("startup")
+def upgrade_schema():
+    """Bring the database schema up to the latest Alembic revision"""
+    if os.environ.get("AUTO_MIGRATE", "1") == "1":
+        upgrade_database()
+
+@app.on_event("startup")
+def warm_indexes():
+    """Start building the full-text index, embedding complaints the store lacks and training
+    a missing ANN index, once the schema is up to date"""
+    warm_text_index()
+    warm_embeddings()
+    queue_ann_build()
+
+@app.middleware("http")
+async def conditional_get(request, call_next):
+    """ETag / If-None-Match for the read endpoints in ETAG_PATHS
+
+    The ETag only depends on the data version and the query, so unchanged
+    data is answered with 304 before any query runs.
+    """
+    if request.method != "GET" or request.url.path not in ETAG_PATHS:
+        return await call_next(request)
+
+    etag = etag_for(request.url.path, request.query_params.multi_items())
+    # Browsers revalidate no-cache responses with If-None-Match on every poll
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
 app.add_middleware(  
     CORSMiddleware,  
     allow_origins=["http://localhost:3000"],  # Allowed frontend sources  
@@ -37,142 +130,57 @@ app.add_middleware(
 )  
 
 @app.post("/upload")  
-async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db)):  
-    """Upload complaint Excel file and process it"""  
-    logger.info(f"Received file upload request: filename={file.filename}")  
+async def upload_file(
+    file: UploadFile = File(...),
+    stream: bool = Query(False),
+    mode: str = Query(MODE_INSERT)
+):  
+    """Upload complaint export (Excel, CSV or Parquet) and queue it for background ingestion
+
+    The upload is spooled to a temp file and processed by the ingestion worker pool;
+    poll /upload/jobs/{job_id} for progress. With stream=true (or for files above
+    STREAM_THRESHOLD_BYTES) .xlsx files are read in fixed-size row chunks. mode=upsert
+    also rewrites existing complaints whose exported fields changed since the last upload.
+    """  
+    logger.info(f"Received file upload request: filename={file.filename}, stream={stream}, mode={mode}")  
+    
+    if mode not in INGEST_MODES:
+        raise HTTPException(status_code=400, detail=f"Unsupported upload mode: {mode}")
     
     # Check file format  
-    if not file.filename.endswith(('.xlsx', '.xls')):  
+    if upload_format(file.filename) is None:  
         logger.warning(f"Unsupported file format: {file.filename}")  
-        raise HTTPException(status_code=400, detail="Only Excel files are accepted (.xlsx, .xls)")  
+        raise HTTPException(status_code=400, detail="Only Excel, CSV and Parquet files are accepted (.xlsx, .xls, .csv, .parquet)")  
     
     try:  
-        # Read file contents  
-        contents = await file.read()  
-        logger.info(f"Successfully read file contents, size: {len(contents)} bytes")  
-        
-        # Parse Excel file  
-        try:  
-            datecols =[] # ['Initiate Date', 'Become Aware Date', 'Philips Notified Date']
-            df = pd.read_excel(io.BytesIO(contents), header=0, dtype=str, parse_dates=datecols, na_filter=False)  
-            # Check if column names are correct  
-           
-            logger.info(f"Successfully parsed Excel file, rows: {len(df)}")  
-        except Exception as e:  
-            logger.error(f"Failed to parse Excel file: {str(e)}", exc_info=True)  
-            raise HTTPException(status_code=400, detail=f"Excel file format is incorrect: {str(e)}")  
-        
-        # Check if required columns exist  
-        required_columns = ["PR ID", "Short Description"]  
-        missing_columns = [col for col in required_columns if col not in df.columns]  
-        if missing_columns:  
-            logger.warning(f"Excel missing required columns: {missing_columns}, {df.columns}")  
-            raise HTTPException(status_code=400, detail=f"Excel file missing required columns: {', '.join(missing_columns)}")  
-        
-        # Count new and existing complaints  
-        new_complaints = 0  
-        existing_complaints = 0  
-        
-        # Process each row  
-        for _, row in df.iterrows():  
-            try:  
-                pr_id = str(row['PR ID'])  
-                
-                # Check if complaint already exists  
-                existing = db.query(Complaint).filter(Complaint.pr_id == pr_id).first()  
-                
-                if existing:  
-                    existing_complaints += 1  
-                    continue  
-                
-                # Create new complaint record  
-                short_desc = str(row.get('Short Description', ''))  
-                swo_notes = str(row.get('Source Notes', ''))  
-                swo_notes = swo_notes.replace('\r', '\n')  
-                initdate = row.get('Initiate Date', '')
-                init_date=pd.to_datetime(initdate, errors='coerce').date()
-                # print(f'initdate={initdate}  init_date={init_date}')
-                try: 
-                    ba_date=pd.to_datetime(row.get('Become Aware Date', ''),errors='coerce').date()
-                    pn_date=pd.to_datetime(row.get('Philips Notified Date', ''),errors='coerce').date()
-                except:
-                    ba_date = init_date  
-                    pn_date = init_date
-                complaint = Complaint(  
-                    pr_id=pr_id,  
-                    short_description=short_desc,  
-                    description=str(row.get('Description', '')),  
-                    source_customer_description=str(row.get('Source Customer Description', '')),  
-                    source_system=str(row.get('Source System', '')),  
-                    source_identifier=str(row.get('Source Identifier', '')),  
-                    serial_number=str(row.get('Serial Number', '')),  
-                    final_reportability=str(row.get('Final Reportability', '')),  
-                    comments=str(row.get('Comments', '')),  
-                    event_type=str(row.get('Event Type', '')),  
-                    event_country=str(row.get('Event Country', '')),  
-                    source_notes=swo_notes,  
-                    project=str(row.get('Project', '')),  
-                    investigation_notes=str(row.get('Investigation Notes', '')),  
-                    potential_safety_alert=str(row.get('Potential Safety Alert', '')),   
-                    assigned_to=str(row.get('Assigned To', '')),  
-                    pr_state=str(row.get('PR State', '')),  
-                    initiate_date=init_date,  
-                    become_aware_date=ba_date,  
-                    philips_notified_date=pn_date,  
-                    product_software_revision=str(row.get('Product Software Revision', '')),  
-                    investigation_summary=str(row.get('Investigation Summary', '')),  
-                    reporting_institution_name=str(row.get('Reporting Institution Name', '')),  
-
-                    catalog_item_name=str(row.get('Catalog Item Name', '')),  
-                    catalog_item_identifier=str(row.get('Catalog Item Identifier', ''))  
-                )  
-                
-                complaint.system_component = "N/A"  
-                complaint.failure_mode = "N/A"  
-                complaint.severity = "N/A"  
-                complaint.priority = "N/A"  
-                
-                db.add(complaint)  
-                try:
-                    db.commit()
-                except Exception as e:
-                    db.rollback()
-                    logger.error(f"Failed to commit new complaint: {pr_id}{str(e)}", exc_info=True)
-                    break
-                new_complaints += 1  
-            except Exception as e:  
-                logger.error(f"Failed to process row data: ID={pr_id} {str(e)}", exc_info=True)  
-                # Continue processing other rows  
-                break  
-        
-        # Commit transaction  
-        # try:  
-        #     db.commit()  
-        #     logger.info(f"Database commit successful: new={new_complaints}, existing={existing_complaints}")  
-        # except Exception as e:  
-        #     db.rollback()  
-        #     logger.error(f"Database commit failed: {str(e)}", exc_info=True)  
-        #     raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")  
-        
-        return {  
-            "status": "success",  
-            "new_complaints": new_complaints,  
-            "existing_complaints": existing_complaints  
-        }  
-    
-    except HTTPException:  
-        # Re-raise HTTP exceptions  
-        raise  
+        suffix = os.path.splitext(file.filename)[1].lower()
+        spooled_path = await run_in_threadpool(spool_upload, file.file, suffix)
+        logger.info(f"Spooled upload to {spooled_path}, size: {os.path.getsize(spooled_path)} bytes")
     except Exception as e:  
-        # Rollback transaction  
-        # try:  
-        #     db.rollback()  
-        # except:  
-        #     pass  
-        
         logger.error(f"Upload processing failed: {str(e)}", exc_info=True)  
         raise HTTPException(status_code=500, detail=f"Error processing uploaded file: {str(e)}")  
 
+    job_id = submit_ingestion_job(spooled_path, file.filename, stream, mode)
+    return {"status": "queued", "job_id": job_id}
+
+@app.get("/upload/jobs")
+def list_upload_jobs():
+    """List recent ingestion jobs"""
+    return list_job_statuses()
+
+@app.get("/upload/throughput")
+def upload_throughput():
+    """Parse throughput (rows/s) of finished ingestion jobs, per file format"""
+    return format_throughput()
+
+@app.get("/upload/jobs/{job_id}")
+def upload_job_status(job_id: str):
+    """Get progress and result counts of an ingestion job"""
+    status = get_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return status
+
 @app.get("/statistics")  
 async def get_stats(
     system_component: Optional[list[str]] = Query(None),  
@@ -207,6 +215,46 @@ async def get_stats(
     }
     return get_statistics(db, filters)
 
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters of the statistics result cache, for sizing RESULT_CACHE_SIZE"""
+    return result_cache.stats()
+
+@app.get("/dashboard")
+async def dashboard(
+    system_component: Optional[list[str]] = Query(None),  
+    failure_mode: Optional[list[str]] = Query(None),  
+    severity: Optional[list[str]] = Query(None),  
+    priority: Optional[list[str]] = Query(None),  
+    country: Optional[list[str]] = Query(None),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    catalog_item_identifier: Optional[list[str]] = Query(None),
+    pr_state: Optional[list[str]] = Query(None),  
+    level2: Optional[list[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Statistics, monthly trend, country and product statistics in one response"""
+    logger.info(f"Dashboard filter params: sys_comp={system_component}, failure={failure_mode}, severity={severity}, "
+                f"priority={priority}, country={country}, catalog={catalog_item_identifier}, "
+                f"pr_state={pr_state}, level2={level2}, dates={start_date}-{end_date}")
+
+    filters = {
+        "system_component": system_component,
+        "failure_mode": failure_mode,
+        "severity": severity,
+        "priority": priority,
+        "country": country,
+        "start_date": start_date,
+        "end_date": end_date,
+        "catalog_item_identifier": catalog_item_identifier,
+        "pr_state": pr_state,
+        "level2": level2
+    }
+    result = get_dashboard(db, filters)
+    logger.info(f"Dashboard timings: {result['timings']}")
+    return result
+
 @app.get("/complaints")  
 async def list_complaints(  
     system_component: Optional[list[str]] = Query(None),  
@@ -219,99 +267,154 @@ async def list_complaints(
     catalog_item_identifier: Optional[list[str]] = Query(None),
     pr_state: Optional[list[str]] = Query(None),  
     level2: Optional[list[str]] = Query(None),  
+    cluster_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, gt=0, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[list[str]] = Query(None),
     db: Session = Depends(get_db)  
 ):  
+    """List complaints matching the filters
+
+    With limit (and the next_cursor of the previous page as cursor) the result is keyset-paginated
+    by id and returned as {"items", "next_cursor", "limit"}; fields selects the returned columns
+    (default: everything except the large text columns). Without limit/cursor all matching
+    complaints are returned as a plain list, as before.
+    """
     # Debug log to see incoming filter parameters
     logger.info(f"Filter params received: sys_comp={system_component}, failure={failure_mode}, severity={severity}, "
                 f"priority={priority}, country={country}, catalog={catalog_item_identifier}, "
-                f"pr_state={pr_state}, level2={level2}, dates={start_date}-{end_date}")
-    
-    query = db.query(Complaint)  
-    
-    # Handle multiple filter values
-    if system_component:
-        if "" in system_component:  # Empty string means no filter
-            system_component.remove("")
-        if system_component:  # Check if there are still values after removing empty strings
-            query = query.filter(Complaint.system_component.in_(system_component))
-            logger.info(f"Filtering by system_component: {system_component}")
+                f"pr_state={pr_state}, level2={level2}, dates={start_date}-{end_date}, "
+                f"cluster_id={cluster_id}, limit={limit}, cursor={cursor}, fields={fields}")
     
-    if failure_mode:
-        if "" in failure_mode:
-            failure_mode.remove("")
-        if failure_mode:
-            query = query.filter(Complaint.failure_mode.in_(failure_mode))
-            logger.info(f"Filtering by failure_mode: {failure_mode}")
-    
-    if severity:
-        if "" in severity:
-            severity.remove("")
-        if severity:
-            query = query.filter(Complaint.severity.in_(severity))
-            logger.info(f"Filtering by severity: {severity}")
-    
-    if priority:
-        if "" in priority:
-            priority.remove("")
-        if priority:
-            query = query.filter(Complaint.priority.in_(priority))
-            logger.info(f"Filtering by priority: {priority}")
-    
-    if country:
-        if "" in country:
-            country.remove("")
-        if country:
-            query = query.filter(Complaint.event_country.in_(country))
-            logger.info(f"Filtering by country: {country}")
-    
-    if catalog_item_identifier:
-        if "" in catalog_item_identifier:
-            catalog_item_identifier.remove("")
-        if catalog_item_identifier:
-            query = query.filter(Complaint.catalog_item_identifier.in_(catalog_item_identifier))
-            logger.info(f"Filtering by catalog_item_identifier: {catalog_item_identifier}")
-    
-    if pr_state:
-        if "" in pr_state:
-            pr_state.remove("")
-        if pr_state:
-            query = query.filter(Complaint.pr_state.in_(pr_state))
-            logger.info(f"Filtering by pr_state: {pr_state}")
-    
-    if level2:
-        if "" in level2:
-            level2.remove("")
-        if level2:
-            query = query.filter(Complaint.level2.in_(level2))
-            logger.info(f"Filtering by level2: {level2}")
-
-    # Date range filter
-    if start_date:
-        try:
-            start = pd.to_datetime(start_date).date()
-            query = query.filter(Complaint.initiate_date >= start)
-            logger.info(f"Filtering by start_date: {start_date}")
-        except Exception as e:
-            logger.error(f"Error parsing start_date: {str(e)}")
-            
-    if end_date:
-        try:
-            end = pd.to_datetime(end_date).date()
-            query = query.filter(Complaint.initiate_date <= end)
-            logger.info(f"Filtering by end_date: {end_date}")
-        except Exception as e:
-            logger.error(f"Error parsing end_date: {str(e)}")
-    
-    result = query.all()
+    filters = {
+        "system_component": system_component,
+        "failure_mode": failure_mode,
+        "severity": severity,
+        "priority": priority,
+        "country": country,
+        "start_date": start_date,
+        "end_date": end_date,
+        "catalog_item_identifier": catalog_item_identifier,
+        "pr_state": pr_state,
+        "level2": level2,
+        "cluster_id": cluster_id
+    }
+
+    try:
+        if limit or cursor:
+            page = list_complaints_page(
+                db, filters, parse_fields(fields, default=LIST_FIELDS), limit or DEFAULT_PAGE_SIZE, cursor
+            )
+            logger.info(f"Query returned {len(page['items'])} results, next_cursor={page['next_cursor']}")
+            return page
+        if fields:
+            selected = parse_fields(fields)
+            result = [dict(row._mapping) for row in apply_complaint_filters(
+                db.query(*[getattr(Complaint, name) for name in selected]), filters
+            ).all()]
+            logger.info(f"Query returned {len(result)} results")
+            return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = apply_complaint_filters(db.query(Complaint), filters).all()
     logger.info(f"Query returned {len(result)} results")
     return result
 
+@app.get("/complaints/count")
+async def complaints_count(
+    system_component: Optional[list[str]] = Query(None),  
+    failure_mode: Optional[list[str]] = Query(None),  
+    severity: Optional[list[str]] = Query(None),  
+    priority: Optional[list[str]] = Query(None),  
+    country: Optional[list[str]] = Query(None),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    catalog_item_identifier: Optional[list[str]] = Query(None),
+    pr_state: Optional[list[str]] = Query(None),  
+    level2: Optional[list[str]] = Query(None),  
+    cluster_id: Optional[int] = None,
+    db: Session = Depends(get_db)  
+):
+    """Count complaints matching the /complaints filters"""
+    filters = {
+        "system_component": system_component,
+        "failure_mode": failure_mode,
+        "severity": severity,
+        "priority": priority,
+        "country": country,
+        "start_date": start_date,
+        "end_date": end_date,
+        "catalog_item_identifier": catalog_item_identifier,
+        "pr_state": pr_state,
+        "level2": level2,
+        "cluster_id": cluster_id
+    }
+    return {"total": count_complaints(db, filters)}
+
+@app.get("/complaints/export")
+def export_complaints(
+    format: str = Query("csv"),
+    system_component: Optional[list[str]] = Query(None),  
+    failure_mode: Optional[list[str]] = Query(None),  
+    severity: Optional[list[str]] = Query(None),  
+    priority: Optional[list[str]] = Query(None),  
+    country: Optional[list[str]] = Query(None),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    catalog_item_identifier: Optional[list[str]] = Query(None),
+    pr_state: Optional[list[str]] = Query(None),  
+    level2: Optional[list[str]] = Query(None),  
+    cluster_id: Optional[int] = None,
+    fields: Optional[list[str]] = Query(None)
+):
+    """Stream the complaints matching the /complaints filters as NDJSON, CSV or XLSX"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {format}")
+    try:
+        selected = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    filters = {
+        "system_component": system_component,
+        "failure_mode": failure_mode,
+        "severity": severity,
+        "priority": priority,
+        "country": country,
+        "start_date": start_date,
+        "end_date": end_date,
+        "catalog_item_identifier": catalog_item_identifier,
+        "pr_state": pr_state,
+        "level2": level2,
+        "cluster_id": cluster_id
+    }
+    filename = f"complaints_{datetime.date.today().isoformat()}.{format}"
+    return StreamingResponse(
+        iter_export(format, filters, selected),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/complaints/{pr_id}")
+async def get_complaint(pr_id: str, fields: Optional[list[str]] = Query(None), db: Session = Depends(get_db)):
+    """Fetch selected columns of one complaint, by default its large text columns"""
+    try:
+        selected = parse_fields(fields, default=LARGE_TEXT_FIELDS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    complaint = get_complaint_fields(db, pr_id, selected)
+    if not complaint:
+        raise HTTPException(status_code=404, detail="Complaint record not found")
+    return complaint
+
 @app.patch("/complaints/{pr_id}")  
 async def update_complaint(pr_id: str, data: dict, db: Session = Depends(get_db)):  
     """Update complaint classification"""  
     complaint = db.query(Complaint).filter(Complaint.pr_id == pr_id).first()  
     if not complaint:  
         raise HTTPException(status_code=404, detail="Complaint record not found")  
+    old_cell = complaint_cell(complaint)
     
     # Update classification fields  
     if "system_component" in data:  
@@ -326,8 +429,18 @@ async def update_complaint(pr_id: str, data: dict, db: Session = Depends(get_db)
         complaint.level2 = data["level2"]
     if "rational" in data:
         complaint.rational = data["rational"]
+    record_cell_change(db, old_cell, complaint)
+    complaint_id = complaint.id
+    similarity_changed = bool(METADATA_BOOSTS.keys() & data.keys())
+    if similarity_changed:
+        # Its similarity scores changed; lookups go live until the neighbour update below
+        drop_neighbors(db, [complaint_id])
     
+    bump_data_version(db, [complaint_id])
     db.commit()  
+    if similarity_changed:
+        # Other complaints' lists may gain or lose it too
+        queue_neighbor_update(db, f"update {pr_id}")
     return {"status": "success", "message": "Classification updated"}
 
 @app.post("/complaints/{pr_id}/classify")  
@@ -351,6 +464,7 @@ async def classify_single_complaint(
     success = classify_complaint(complaint, db, model_name)  
     
     if success:  
+        queue_neighbor_update(db, f"classify {pr_id}")
         return {  
             "status": "success",  
             "message": "Classification completed",  
@@ -388,6 +502,7 @@ def start_auto_classification(
         for complaint in unclassified_complaints:  
             classify_complaint(complaint, db, model_name=model_name)  
         logger.info("Auto classification completed.")  
+        queue_neighbor_update(db, "auto-classification")
     
     background_tasks.add_task(classify_in_background)  
     return {"status": "classification started"}
@@ -403,6 +518,35 @@ def fetch_filter_options(db: Session = Depends(get_db)):
     filter_options = get_filter_options(db)  
     return filter_options
 
+@app.get("/filter-options/facets")
+def fetch_filter_facets(
+    system_component: Optional[list[str]] = Query(None),  
+    failure_mode: Optional[list[str]] = Query(None),  
+    severity: Optional[list[str]] = Query(None),  
+    priority: Optional[list[str]] = Query(None),  
+    country: Optional[list[str]] = Query(None),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    catalog_item_identifier: Optional[list[str]] = Query(None),
+    pr_state: Optional[list[str]] = Query(None),  
+    level2: Optional[list[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Every filter option with its complaint count under the other active filters"""
+    filters = {
+        "system_component": system_component,
+        "failure_mode": failure_mode,
+        "severity": severity,
+        "priority": priority,
+        "country": country,
+        "start_date": start_date,
+        "end_date": end_date,
+        "catalog_item_identifier": catalog_item_identifier,
+        "pr_state": pr_state,
+        "level2": level2
+    }
+    return get_filter_facets(db, filters)
+
 @app.get("/monthly-trend")  
 async def monthly_trend(
     system_component: Optional[list[str]] = Query(None),  
@@ -438,6 +582,40 @@ async def monthly_trend(
     }
     return get_monthly_trend(db, filters)
 
+@app.get("/trend")
+async def trend(
+    granularity: str = Query("month"),
+    split_by: Optional[str] = None,
+    system_component: Optional[list[str]] = Query(None),  
+    failure_mode: Optional[list[str]] = Query(None),  
+    severity: Optional[list[str]] = Query(None),  
+    priority: Optional[list[str]] = Query(None),  
+    country: Optional[list[str]] = Query(None),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    catalog_item_identifier: Optional[list[str]] = Query(None),
+    pr_state: Optional[list[str]] = Query(None),  
+    level2: Optional[list[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Complaint trend per day/week/month/quarter/year, optionally split by one filter dimension"""
+    filters = {
+        "system_component": system_component,
+        "failure_mode": failure_mode,
+        "severity": severity,
+        "priority": priority,
+        "country": country,
+        "start_date": start_date,
+        "end_date": end_date,
+        "catalog_item_identifier": catalog_item_identifier,
+        "pr_state": pr_state,
+        "level2": level2
+    }
+    try:
+        return get_trend(db, filters, granularity, split_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/country-statistics")  
 async def country_statistics(
     system_component: Optional[list[str]] = Query(None),  
@@ -505,10 +683,42 @@ async def product_statistics(
     return get_product_statistics(db, filters)
 
 @app.get("/similar-complaints/{pr_id}")
-async def get_similar_complaints(pr_id: str, limit: int = Query(5, gt=0, le=20), db: Session = Depends(get_db)):
-    """Find complaints similar to the one with the given PR ID"""
+async def get_similar_complaints(
+    pr_id: str,
+    limit: int = Query(5, gt=0, le=20),
+    nprobe: Optional[int] = Query(None, gt=0),
+    system_component: Optional[list[str]] = Query(None),
+    failure_mode: Optional[list[str]] = Query(None),
+    severity: Optional[list[str]] = Query(None),
+    priority: Optional[list[str]] = Query(None),
+    country: Optional[list[str]] = Query(None),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    catalog_item_identifier: Optional[list[str]] = Query(None),
+    pr_state: Optional[list[str]] = Query(None),
+    level2: Optional[list[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Find complaints similar to the one with the given PR ID
+
+    The /complaints filters restrict which complaints are considered (the given one
+    does not have to match them).
+    """
     logger.info(f"Finding complaints similar to PR ID: {pr_id}, limit: {limit}")
     
+    filters = {
+        "system_component": system_component,
+        "failure_mode": failure_mode,
+        "severity": severity,
+        "priority": priority,
+        "country": country,
+        "start_date": start_date,
+        "end_date": end_date,
+        "catalog_item_identifier": catalog_item_identifier,
+        "pr_state": pr_state,
+        "level2": level2
+    }
+    
     # Check if complaint exists
     complaint = db.query(Complaint).filter(Complaint.pr_id == pr_id).first()
     if not complaint:
@@ -522,7 +732,7 @@ async def get_similar_complaints(pr_id: str, limit: int = Query(5, gt=0, le=20),
             return {"error": "Similar complaints feature is currently disabled", "reason": "missing_dependencies"}
         
         # Find similar complaints
-        similar = find_similar_complaints(pr_id, db, limit=limit)
+        similar = find_similar_complaints(pr_id, db, limit=limit, nprobe=nprobe, filters=filters)
         logger.info(f"Found {len(similar)} similar complaints for PR ID: {pr_id}")
         return similar
         
@@ -530,6 +740,127 @@ async def get_similar_complaints(pr_id: str, limit: int = Query(5, gt=0, le=20),
         logger.error(f"Error in similarity search: {str(e)}")
         return {"error": "Failed to perform similarity search", "reason": str(e)}
 
+@app.get("/search")
+async def search(
+    q: str,
+    limit: int = Query(20, gt=0, le=100),
+    semantic: bool = Query(False),
+    system_component: Optional[list[str]] = Query(None),
+    failure_mode: Optional[list[str]] = Query(None),
+    severity: Optional[list[str]] = Query(None),
+    priority: Optional[list[str]] = Query(None),
+    country: Optional[list[str]] = Query(None),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    catalog_item_identifier: Optional[list[str]] = Query(None),
+    pr_state: Optional[list[str]] = Query(None),
+    level2: Optional[list[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Full-text search over the complaint descriptions and notes
+
+    Results are BM25-ranked; semantic=true fuses the ranking with embedding similarity
+    to the query. The /complaints filters restrict the results.
+    """
+    logger.info(f"Searching complaints: q={q!r}, limit={limit}, semantic={semantic}")
+    filters = {
+        "system_component": system_component,
+        "failure_mode": failure_mode,
+        "severity": severity,
+        "priority": priority,
+        "country": country,
+        "start_date": start_date,
+        "end_date": end_date,
+        "catalog_item_identifier": catalog_item_identifier,
+        "pr_state": pr_state,
+        "level2": level2
+    }
+    try:
+        return search_complaints(db, q, limit, filters, semantic)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/embeddings/jobs")
+def start_embedding_job():
+    """Queue embedding of all complaints that have no stored embedding yet, or whose text changed
+
+    Uploads that add or update complaints queue this automatically; poll /embeddings/jobs/{job_id}
+    for progress and texts/second.
+    """
+    from services import SIMILARITY_SEARCH_ENABLED
+    if not SIMILARITY_SEARCH_ENABLED:
+        raise HTTPException(status_code=503, detail="Similar complaints feature is currently disabled")
+    return {"status": "queued", "job_id": submit_embedding_job()}
+
+@app.get("/embeddings/jobs")
+def list_embedding_jobs():
+    """List recent embedding jobs"""
+    return list_embedding_job_statuses()
+
+@app.get("/embeddings/jobs/{job_id}")
+def embedding_job(job_id: str):
+    """Get progress and throughput of an embedding job"""
+    status = get_embedding_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Embedding job not found")
+    return status
+
+@app.post("/neighbors/jobs")
+def start_neighbor_job(incremental: bool = Query(False)):
+    """Queue a build of the precomputed similar-complaint table
+
+    Once built, /similar-complaints without filters reads the table, and embedding jobs
+    update it incrementally after uploads. incremental=true only fills in missing lists.
+    """
+    from services import SIMILARITY_SEARCH_ENABLED
+    if not SIMILARITY_SEARCH_ENABLED:
+        raise HTTPException(status_code=503, detail="Similar complaints feature is currently disabled")
+    return {"status": "queued", "job_id": submit_neighbor_job(incremental)}
+
+@app.get("/neighbors/jobs")
+def list_neighbor_jobs():
+    """List recent neighbour table jobs"""
+    return list_neighbor_job_statuses()
+
+@app.get("/neighbors/jobs/{job_id}")
+def neighbor_job(job_id: str):
+    """Get progress and result of a neighbour table job"""
+    status = get_neighbor_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Neighbour job not found")
+    return status
+
+@app.post("/clusters/jobs")
+def start_clustering_job(threshold: float = Query(CLUSTER_THRESHOLD, gt=0, le=1)):
+    """Queue near-duplicate clustering of all complaints
+
+    Complaints whose embeddings have a cosine similarity of at least threshold end up in
+    the same cluster; poll /clusters/jobs/{job_id} for progress. Filter /complaints by
+    cluster_id to list a cluster's members.
+    """
+    from services import SIMILARITY_SEARCH_ENABLED
+    if not SIMILARITY_SEARCH_ENABLED:
+        raise HTTPException(status_code=503, detail="Similar complaints feature is currently disabled")
+    return {"status": "queued", "job_id": submit_clustering_job(threshold)}
+
+@app.get("/clusters/jobs")
+def list_clustering_jobs():
+    """List recent clustering jobs"""
+    return list_clustering_job_statuses()
+
+@app.get("/clusters/jobs/{job_id}")
+def clustering_job(job_id: str):
+    """Get progress and result of a clustering job"""
+    status = get_clustering_job_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Clustering job not found")
+    return status
+
+@app.get("/clusters")
+def list_clusters(min_size: int = Query(2, ge=2), limit: int = Query(100, gt=0, le=1000), db: Session = Depends(get_db)):
+    """Largest near-duplicate clusters with their size and first complaint"""
+    return get_clusters(db, min_size, limit)
+
 @app.get("/available-models")
 async def list_available_models():
     """获取Ollama服务器上可用的模型列表"""
@@ -0,0 +1,73 @@
+"""initial complaints schema
+
+Creates the complaints table. Databases created before migrations were
+introduced already have it; for those only the content_hash column added
+for upsert uploads is filled in, so `alembic upgrade head` works on both.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table("complaints"):
+        columns = {column["name"] for column in inspector.get_columns("complaints")}
+        if "content_hash" not in columns:
+            with op.batch_alter_table("complaints") as batch_op:
+                batch_op.add_column(sa.Column("content_hash", sa.String(16)))
+        return
+
+    op.create_table(
+        "complaints",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("pr_id", sa.String()),
+        sa.Column("assigned_to", sa.Text()),
+        sa.Column("event_country", sa.Text()),
+        sa.Column("initiate_date", sa.Date()),
+        sa.Column("philips_notified_date", sa.Date()),
+        sa.Column("become_aware_date", sa.Date()),
+        sa.Column("catalog_item_identifier", sa.String()),
+        sa.Column("catalog_item_name", sa.String()),
+        sa.Column("product_software_revision", sa.String()),
+        sa.Column("serial_number", sa.String()),
+        sa.Column("short_description", sa.Text()),
+        sa.Column("potential_safety_alert", sa.String()),
+        sa.Column("final_reportability", sa.String()),
+        sa.Column("investigation_notes", sa.Text()),
+        sa.Column("comments", sa.Text()),
+        sa.Column("reporting_decision_notes", sa.Text()),
+        sa.Column("investigation_summary", sa.Text()),
+        sa.Column("source_system", sa.String()),
+        sa.Column("source_identifier", sa.String()),
+        sa.Column("reporting_institution_name", sa.String()),
+        sa.Column("pr_state", sa.String()),
+        sa.Column("event_type", sa.String()),
+        sa.Column("project", sa.String()),
+        sa.Column("description", sa.Text()),
+        sa.Column("source_notes", sa.Text()),
+        sa.Column("source_customer_description", sa.Text()),
+        sa.Column("system_component", sa.String()),
+        sa.Column("failure_mode", sa.String()),
+        sa.Column("severity", sa.String()),
+        sa.Column("priority", sa.String()),
+        sa.Column("level2", sa.String()),
+        sa.Column("rational", sa.Text()),
+        sa.Column("content_hash", sa.String(16)),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index("ix_complaints_pr_id", "complaints", ["pr_id"], unique=True)
+
+
+def downgrade():
+    op.drop_index("ix_complaints_pr_id", table_name="complaints")
+    op.drop_table("complaints")
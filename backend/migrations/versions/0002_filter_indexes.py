@@ -0,0 +1,43 @@
+"""indexes for dashboard and list filters
+
+Every filter column gets a composite index with initiate_date, so an
+equality/IN filter plus a date range is answered by one index range scan.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+FILTER_INDEX_COLUMNS = [
+    "system_component",
+    "failure_mode",
+    "severity",
+    "priority",
+    "event_country",
+    "catalog_item_identifier",
+    "pr_state",
+    "level2",
+]
+
+
+def upgrade():
+    op.create_index("ix_complaints_initiate_date", "complaints", ["initiate_date"])
+    for column in FILTER_INDEX_COLUMNS:
+        op.create_index(f"ix_complaints_{column}_initiate_date", "complaints", [column, "initiate_date"])
+    op.create_index("ix_complaints_system_component_level2", "complaints", ["system_component", "level2"])
+    # Give the SQLite planner row statistics so it picks the selective index
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("ANALYZE complaints")
+
+
+def downgrade():
+    op.drop_index("ix_complaints_system_component_level2", table_name="complaints")
+    for column in reversed(FILTER_INDEX_COLUMNS):
+        op.drop_index(f"ix_complaints_{column}_initiate_date", table_name="complaints")
+    op.drop_index("ix_complaints_initiate_date", table_name="complaints")
@@ -0,0 +1,63 @@
+"""pre-aggregated statistics cube
+
+One row per combination of classification dimensions, country, product,
+PR state and initiate month with its complaint count. The cube is filled
+from the existing complaints here; afterwards the write paths keep it up
+to date (see stats_cube.py).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+import json
+from collections import Counter
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+CUBE_DIMENSIONS = [
+    "system_component",
+    "failure_mode",
+    "severity",
+    "priority",
+    "level2",
+    "event_country",
+    "catalog_item_identifier",
+    "catalog_item_name",
+    "pr_state",
+]
+
+
+def upgrade():
+    cube = op.create_table(
+        "complaint_stats_cube",
+        sa.Column("cell_key", sa.String(), primary_key=True),
+        *[sa.Column(name, sa.String()) for name in CUBE_DIMENSIONS],
+        sa.Column("initiate_month", sa.String(7)),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+
+    # Count in Python so the month key is the same on every database
+    complaints = sa.table("complaints", *[sa.column(name) for name in CUBE_DIMENSIONS],
+                          sa.column("initiate_date", sa.Date()))
+    cells = Counter()
+    for row in op.get_bind().execute(sa.select(complaints)):
+        month = row[-1].strftime("%Y-%m") if row[-1] else None
+        cells[tuple(row[:-1]) + (month,)] += 1
+
+    rows = [
+        dict(zip(CUBE_DIMENSIONS + ["initiate_month"], cell),
+             cell_key=json.dumps(list(cell), ensure_ascii=False), count=count)
+        for cell, count in cells.items()
+    ]
+    if rows:
+        op.bulk_insert(cube, rows)
+
+
+def downgrade():
+    op.drop_table("complaint_stats_cube")
@@ -0,0 +1,74 @@
+"""precomputed time bucket columns for trend queries
+
+Adds the ISO week, month, quarter and year keys of initiate_date as indexed
+columns (see time_buckets.py), so trends group by a plain column on every
+database instead of SQLite's strftime. Existing rows are backfilled.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+BUCKET_COLUMNS = {
+    "initiate_week": 8,
+    "initiate_month": 7,
+    "initiate_quarter": 7,
+    "initiate_year": 4,
+}
+
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def _keys(value):
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value[:10])
+    iso_year, iso_week, _ = value.isocalendar()
+    return {
+        "initiate_week": f"{iso_year}-W{iso_week:02d}",
+        "initiate_month": f"{value.year}-{value.month:02d}",
+        "initiate_quarter": f"{value.year}-Q{(value.month - 1) // 3 + 1}",
+        "initiate_year": str(value.year),
+    }
+
+
+def upgrade():
+    with op.batch_alter_table("complaints") as batch_op:
+        for column, length in BUCKET_COLUMNS.items():
+            batch_op.add_column(sa.Column(column, sa.String(length)))
+
+    bind = op.get_bind()
+    complaints = sa.table("complaints", sa.column("id", sa.Integer()), sa.column("initiate_date", sa.Date()),
+                          *[sa.column(column) for column in BUCKET_COLUMNS])
+    rows = bind.execute(
+        sa.select(complaints.c.id, complaints.c.initiate_date).where(complaints.c.initiate_date.isnot(None))
+    ).all()
+    statement = (
+        complaints.update()
+        .where(complaints.c.id == sa.bindparam("row_id"))
+        .values({column: sa.bindparam(column) for column in BUCKET_COLUMNS})
+    )
+    for start in range(0, len(rows), BACKFILL_CHUNK_SIZE):
+        bind.execute(statement, [
+            dict(_keys(initiate_date), row_id=row_id)
+            for row_id, initiate_date in rows[start:start + BACKFILL_CHUNK_SIZE]
+        ])
+
+    for column in BUCKET_COLUMNS:
+        op.create_index(f"ix_complaints_{column}", "complaints", [column])
+
+
+def downgrade():
+    for column in reversed(list(BUCKET_COLUMNS)):
+        op.drop_index(f"ix_complaints_{column}", table_name="complaints")
+    with op.batch_alter_table("complaints") as batch_op:
+        for column in reversed(list(BUCKET_COLUMNS)):
+            batch_op.drop_column(column)
@@ -0,0 +1,29 @@
+"""near-duplicate cluster id
+
+Adds complaints.cluster_id, written by the clustering job (clustering.py):
+the smallest complaint id of the complaint's near-duplicate cluster, NULL
+for complaints without near-duplicates.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("complaints") as batch_op:
+        batch_op.add_column(sa.Column("cluster_id", sa.Integer()))
+    op.create_index("ix_complaints_cluster_id", "complaints", ["cluster_id"])
+
+
+def downgrade():
+    op.drop_index("ix_complaints_cluster_id", table_name="complaints")
+    with op.batch_alter_table("complaints") as batch_op:
+        batch_op.drop_column("cluster_id")
@@ -0,0 +1,36 @@
+"""precomputed similar-complaint neighbours
+
+complaint_neighbors holds the top-k most similar complaints of each
+complaint (same score as /similar-complaints), built and updated by the
+neighbour jobs (neighbors.py), so the endpoint is a primary-key lookup.
+The table starts empty; until it is built the endpoint scores live.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "complaint_neighbors",
+        sa.Column("complaint_id", sa.Integer(), primary_key=True),
+        sa.Column("rank", sa.Integer(), primary_key=True),
+        sa.Column("neighbor_id", sa.Integer(), nullable=False),
+        sa.Column("score", sa.Float(), nullable=False),
+    )
+    op.create_index("ix_complaint_neighbors_rank", "complaint_neighbors", ["rank"])
+    op.create_index("ix_complaint_neighbors_neighbor_id", "complaint_neighbors", ["neighbor_id"])
+
+
+def downgrade():
+    op.drop_index("ix_complaint_neighbors_neighbor_id", table_name="complaint_neighbors")
+    op.drop_index("ix_complaint_neighbors_rank", table_name="complaint_neighbors")
+    op.drop_table("complaint_neighbors")
@@ -0,0 +1,41 @@
+"""shared data version and complaint change log
+
+data_version holds the version every write bumps in its own transaction, so
+all worker processes see the same version for their result caches, ETags and
+in-memory indexes. complaint_changes logs the complaints each version
+updated, so those indexes re-read only them.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    data_version = op.create_table(
+        "data_version",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("pruned_through", sa.Integer(), nullable=False),
+    )
+    op.bulk_insert(data_version, [{"id": 1, "version": 0, "pruned_through": 0}])
+    op.create_table(
+        "complaint_changes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("complaint_id", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_complaint_changes_version", "complaint_changes", ["version"])
+
+
+def downgrade():
+    op.drop_index("ix_complaint_changes_version", table_name="complaint_changes")
+    op.drop_table("complaint_changes")
+    op.drop_table("data_version")
@@ -1,12 +1,35 @@
 # models.py  
-from sqlalchemy import Column, Integer, String, Date, Text, DateTime, Boolean, create_engine  
+from sqlalchemy import Column, Integer, String, Date, Text, DateTime, Boolean, Float, Index, create_engine  
 from sqlalchemy.ext.declarative import declarative_base  
 from sqlalchemy.sql import func  
 
 Base = declarative_base()  
 
+# initiate_date 的预计算时间桶列（见 time_buckets.py），趋势查询按这些列分组
+BUCKET_INDEX_COLUMNS = ["initiate_week", "initiate_month", "initiate_quarter", "initiate_year"]
+
+# 筛选列 -> 与 initiate_date 组成的复合索引（等值/IN 条件在前，日期范围在后）
+FILTER_INDEX_COLUMNS = [
+    "system_component",
+    "failure_mode",
+    "severity",
+    "priority",
+    "event_country",
+    "catalog_item_identifier",
+    "pr_state",
+    "level2",
+]
+
 class Complaint(Base):  
     __tablename__ = 'complaints'  
+    __table_args__ = (
+        Index("ix_complaints_initiate_date", "initiate_date"),
+        *[Index(f"ix_complaints_{column}_initiate_date", column, "initiate_date") for column in FILTER_INDEX_COLUMNS],
+        # 仪表盘常用的一级/二级分类组合
+        Index("ix_complaints_system_component_level2", "system_component", "level2"),
+        *[Index(f"ix_complaints_{column}", column) for column in BUCKET_INDEX_COLUMNS],
+        Index("ix_complaints_cluster_id", "cluster_id"),
+    )
     
     id = Column(Integer, primary_key=True)  
     pr_id = Column(String, unique=True, index=True)  # 确保PR ID唯一  
@@ -43,5 +66,61 @@ class Complaint(Base):
     priority = Column(String)          # High, Med, Low  
     level2 = Column(String)           # 分类级别2  
     rational = Column(Text)           # 分类原因  
+    content_hash = Column(String(16))  # 导入字段的哈希，用于检测重新上传时的变更  
+    initiate_week = Column(String(8))      # ISO周，如 2024-W05  
+    initiate_month = Column(String(7))     # 2024-01  
+    initiate_quarter = Column(String(7))   # 2024-Q1  
+    initiate_year = Column(String(4))      # 2024  
+    cluster_id = Column(Integer)           # 近似重复簇：簇内最小投诉id，未成簇为空  
     created_at = Column(DateTime, server_default=func.now())  
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())  
\ No newline at end of file
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())  
+
+class ComplaintStatsCell(Base):  
+    """预聚合统计立方体：每个分类维度组合 + 发起月份一行，记录投诉数量"""  
+    __tablename__ = 'complaint_stats_cube'  
+
+    cell_key = Column(String, primary_key=True)  # 各维度值的JSON数组，NULL也参与区分  
+    system_component = Column(String)  
+    failure_mode = Column(String)  
+    severity = Column(String)  
+    priority = Column(String)  
+    level2 = Column(String)  
+    event_country = Column(String)  
+    catalog_item_identifier = Column(String)  
+    catalog_item_name = Column(String)  
+    pr_state = Column(String)  
+    initiate_month = Column(String(7))  # YYYY-MM  
+    count = Column(Integer, nullable=False, default=0)  
+
+class ComplaintNeighbor(Base):  
+    """预计算的相似投诉：每条投诉的前K个近邻及其（含元数据加权的）相似度"""  
+    __tablename__ = 'complaint_neighbors'  
+    __table_args__ = (
+        # 增量更新时按名次/近邻反查受影响的投诉
+        Index("ix_complaint_neighbors_rank", "rank"),
+        Index("ix_complaint_neighbors_neighbor_id", "neighbor_id"),
+    )
+
+    complaint_id = Column(Integer, primary_key=True)  # complaints.id  
+    rank = Column(Integer, primary_key=True)          # 0 = 最相似  
+    neighbor_id = Column(Integer, nullable=False)     # complaints.id  
+    score = Column(Float, nullable=False)    
+
+class DataVersion(Base):  
+    """全局数据版本（单行，id=1）：每次写入在同一事务中加一，各worker进程据此判断缓存和内存索引是否过期"""  
+    __tablename__ = 'data_version'
+
+    id = Column(Integer, primary_key=True)  
+    version = Column(Integer, nullable=False, default=0)  
+    pruned_through = Column(Integer, nullable=False, default=0)  # 变更日志中已删除的最高版本  
+
+class ComplaintChange(Base):  
+    """变更日志：每个数据版本更新过的投诉id，内存索引刷新时只重读这些投诉"""  
+    __tablename__ = 'complaint_changes'
+    __table_args__ = (
+        Index("ix_complaint_changes_version", "version"),
+    )
+
+    id = Column(Integer, primary_key=True)  
+    version = Column(Integer, nullable=False)  
+    complaint_id = Column(Integer, nullable=False)  
@@ -0,0 +1,178 @@
+# neighbors.py
+"""Persisted top-k similar complaints (the complaint_neighbors table).
+
+/similar-complaints without filters is answered from this table with one
+primary-key range read. Scores and order are those of the live search
+(SimilarityIndex.top_k): rounded score descending, then id. (Block matrix
+products may differ from the live scan in the last float32 bit, which can
+swap two neighbours whose scores straddle a rounding boundary.)
+
+rebuild_neighbors() scores every complaint against all others in blocks of
+rows (BLOCK_ELEMENTS scores at a time). update_neighbors() is incremental:
+complaints without rows (newly embedded, or whose lists were dropped by
+drop_neighbors() after a metadata change) get their lists computed, and
+so do the complaints they may now displace a neighbour of: those listing
+one of them, and those whose current k-th score they reach. Scores are
+symmetric, so the second set comes from the same block of scores.
+Complaints the embedding job has not reached yet get no list (they are
+scored live) until an update after their embedding.
+"""
+import logging
+
+import numpy as np
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from models import Complaint, ComplaintNeighbor
+from similarity_index import RANK_DECIMALS
+
+logger = logging.getLogger(__name__)
+
+# Neighbours stored per complaint (the /similar-complaints limit maximum)
+NEIGHBOR_K = 20
+# Scores computed per block (rows x complaints)
+BLOCK_ELEMENTS = 1 << 24
+LOOKUP_CHUNK_SIZE = 500
+INSERT_CHUNK_SIZE = 5000
+
+
+def rank_rows(scores, rows, k):
+    """Top k of each score row, skipping the row's own position.
+
+    Returns (row index, rank, column, score) arrays, ordered by row and rank.
+    """
+    ranked = np.round(scores, RANK_DECIMALS)
+    ranked[np.arange(len(rows)), rows] = -np.inf
+    k = min(k, scores.shape[1] - 1)
+    if k <= 0:
+        return (np.empty(0, dtype=np.int64),) * 3 + (np.empty(0),)
+    kth = -np.partition(-ranked, k - 1, axis=1)[:, k - 1]
+    # Everything at least as good as the k-th, so ties at the cut keep id order
+    row, column = np.nonzero(ranked >= kth[:, None])
+    order = np.lexsort((column, -ranked[row, column], row))
+    row, column = row[order], column[order]
+    rank = np.arange(len(row)) - np.searchsorted(row, row)
+    keep = rank < k
+    row, rank, column = row[keep], rank[keep], column[keep]
+    return row, rank, column, scores[row, column]
+
+
+def _block_size(index):
+    return max(1, BLOCK_ELEMENTS // max(1, len(index)))
+
+
+def _write_lists(db: Session, index, positions):
+    """Replace the neighbour lists of the complaints at positions (not committed)."""
+    ids = index.ids
+    row, rank, column, score = rank_rows(index.block_scores(positions), positions, NEIGHBOR_K)
+    db.execute(delete(ComplaintNeighbor).where(ComplaintNeighbor.complaint_id.in_(ids[positions].tolist())))
+    records = [
+        {"complaint_id": complaint_id, "rank": rank_, "neighbor_id": neighbor_id, "score": score_}
+        for complaint_id, rank_, neighbor_id, score_ in zip(
+            ids[positions[row]].tolist(), rank.tolist(), ids[column].tolist(), score.tolist()
+        )
+    ]
+    for start in range(0, len(records), INSERT_CHUNK_SIZE):
+        db.execute(insert(ComplaintNeighbor), records[start:start + INSERT_CHUNK_SIZE])
+
+
+def _write_in_blocks(db: Session, index, positions, progress=None):
+    block = _block_size(index)
+    blocks = range(0, len(positions), block)
+    for done, start in enumerate(blocks, start=1):
+        _write_lists(db, index, positions[start:start + block])
+        db.commit()
+        if progress:
+            progress(done, len(blocks))
+
+
+def rebuild_neighbors(db: Session, index, progress=None):
+    """Recompute the neighbour list of every embedded complaint. Returns the number of lists written."""
+    db.execute(delete(ComplaintNeighbor))
+    db.commit()
+    positions = np.flatnonzero(index.store_rows >= 0)
+    _write_in_blocks(db, index, positions, progress)
+    logger.info(f"Rebuilt neighbour lists of {len(positions)} complaints")
+    return len(positions)
+
+
+def neighbors_built(db: Session):
+    return db.execute(select(ComplaintNeighbor.complaint_id).limit(1)).first() is not None
+
+
+def update_neighbors(db: Session, index, progress=None):
+    """Compute the lists of complaints that have none and of the complaints they affect.
+
+    Does nothing until the table has been built. Returns the number of lists written.
+    """
+    if not neighbors_built(db):
+        return 0
+    listed = select(ComplaintNeighbor.complaint_id).where(ComplaintNeighbor.rank == 0)
+    new_ids = np.array(db.execute(
+        select(Complaint.id).where(Complaint.id.notin_(listed)).order_by(Complaint.id)
+    ).scalars().all(), dtype=np.int64)
+    new = index.positions(new_ids)
+    new = new[index.store_rows[new] >= 0]
+    if not len(new):
+        return 0
+
+    affected = np.zeros(len(index), dtype=bool)
+    # Lists that contain one of them (their stored score may be out of date)
+    for start in range(0, len(new_ids), LOOKUP_CHUNK_SIZE):
+        chunk = new_ids[start:start + LOOKUP_CHUNK_SIZE].tolist()
+        listing = db.execute(
+            select(ComplaintNeighbor.complaint_id).where(ComplaintNeighbor.neighbor_id.in_(chunk))
+        ).scalars().all()
+        affected[index.positions(np.unique(np.array(listing, dtype=np.int64)))] = True
+
+    # Lists whose k-th score one of them reaches (or that are not full)
+    kth = np.full(len(index), -np.inf)
+    rows = db.execute(
+        select(ComplaintNeighbor.complaint_id, ComplaintNeighbor.score)
+        .where(ComplaintNeighbor.rank == min(NEIGHBOR_K, len(index) - 1) - 1)
+        .order_by(ComplaintNeighbor.complaint_id)
+    ).all()
+    if rows:
+        kth_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        known = np.isin(kth_ids, index.ids)
+        kth[index.positions(kth_ids[known])] = np.round([row[1] for row in rows], RANK_DECIMALS)[known]
+    best = np.full(len(index), -np.inf)
+    block = _block_size(index)
+    for start in range(0, len(new), block):
+        positions = new[start:start + block]
+        scores = np.round(index.block_scores(positions), RANK_DECIMALS)
+        scores[np.arange(len(positions)), positions] = -np.inf
+        np.maximum(best, scores.max(axis=0), out=best)
+    affected |= best >= kth
+    affected[new] = True
+    affected &= index.store_rows >= 0
+
+    positions = np.flatnonzero(affected)
+    _write_in_blocks(db, index, positions, progress)
+    logger.info(f"Updated neighbour lists: {len(new)} new complaints, {len(positions)} lists written")
+    return len(positions)
+
+
+def drop_neighbors(db: Session, complaint_ids):
+    """Drop the lists of complaints whose scores changed (e.g. reclassified); not committed.
+
+    Their lookups fall back to the live search until update_neighbors() runs,
+    which also refreshes the lists of other complaints that contain them.
+    """
+    complaint_ids = list(complaint_ids)
+    for start in range(0, len(complaint_ids), LOOKUP_CHUNK_SIZE):
+        chunk = complaint_ids[start:start + LOOKUP_CHUNK_SIZE]
+        db.execute(delete(ComplaintNeighbor).where(ComplaintNeighbor.complaint_id.in_(chunk)))
+
+
+def lookup_neighbors(db: Session, pr_id, limit):
+    """[(neighbour complaint, score)] from the table, or None if the complaint has no list."""
+    complaint_id = select(Complaint.id).where(Complaint.pr_id == pr_id).scalar_subquery()
+    rows = db.execute(
+        select(Complaint, ComplaintNeighbor.score)
+        .join(ComplaintNeighbor, ComplaintNeighbor.neighbor_id == Complaint.id)
+        .where(ComplaintNeighbor.complaint_id == complaint_id)
+        .order_by(ComplaintNeighbor.rank)
+        .limit(limit)
+    ).all()
+    return [(row[0], row[1]) for row in rows] if rows else None
@@ -0,0 +1,114 @@
+# quantization.py
+"""int8 copy of the embedding store for the first stage of similarity scans.
+
+Each store row x is kept as int8 codes c with one float32 scale s per row
+(s = max|x| / 127, c = round(x / s)), a quarter of the float32 bytes, plus
+the quantization error e = ||x - s * c||. For a normalized query q the
+cosine q.x lies within e of the approximate s * (q.c) (Cauchy-Schwarz), so
+a scan over the codes brackets every exact score. Only the rows whose
+upper bound reaches the k-th best lower bound can be in the top k; those
+are re-scored exactly from the float32 store, so the results are identical
+to a float32 scan while the full pass reads a quarter of the bytes.
+
+Select it with SIMILARITY_SCAN=int8 (default "float32"). The codes are
+written next to the store (vectors.i8, scales.f32) under the store's write
+lock, so worker processes share them through the page cache; rows appended
+to the store are quantized on the next refresh. Measure the effect on a
+real store with `python benchmark_similarity.py`.
+"""
+import os
+import logging
+
+import numpy as np
+
+from embedding_store import fsync_write
+
+logger = logging.getLogger(__name__)
+
+# "float32" or a key of QUANTIZED_SCANS
+SIMILARITY_SCAN = os.environ.get("SIMILARITY_SCAN", "float32")
+# Rows quantized per write, and rows converted back to float32 per matrix-vector product
+QUANTIZE_BLOCK_ROWS = 65536
+SCAN_BLOCK_ROWS = 512
+
+
+def quantize_int8(vectors):
+    """(int8 codes, per-row scales, per-row L2 quantization errors) of a float32 matrix."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    errors = np.linalg.norm(vectors - codes * scales[:, None], axis=1)
+    return codes, scales.astype(np.float32), errors.astype(np.float32)
+
+
+class Int8Vectors:
+    """int8 codes, scales and error bounds of every store row, persisted next to the store."""
+
+    def __init__(self, store):
+        self.store = store
+        self.codes_path = os.path.join(store.directory, "vectors.i8")
+        self.scales_path = os.path.join(store.directory, "scales.f32")
+        self.codes = np.empty((0, 0), dtype=np.int8)
+        self.scales = np.empty(0, dtype=np.float32)
+        self.errors = np.empty(0, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _rows_on_disk(self):
+        # A row counts once both its codes and its scale are written
+        if not os.path.exists(self.codes_path) or not os.path.exists(self.scales_path):
+            return 0
+        return min(os.path.getsize(self.codes_path) // self.store.dimension,
+                   os.path.getsize(self.scales_path) // 8)
+
+    def refresh(self, vectors=None):
+        """Quantize the store rows appended since the last refresh (by any process) and map the files.
+
+        vectors (a snapshot of store.vectors) caps the rows mapped, so they
+        match the caller's store rows.
+        """
+        vectors = self.store.vectors if vectors is None else vectors
+        rows = len(vectors)
+        if len(self) >= rows:
+            return
+        if self._rows_on_disk() < rows:
+            with self.store.write_lock():
+                done = self._rows_on_disk()
+                for start in range(done, rows, QUANTIZE_BLOCK_ROWS):
+                    codes, scales, errors = quantize_int8(vectors[start:start + QUANTIZE_BLOCK_ROWS])
+                    # Writes at the row offset overwrite whatever an interrupted quantization left behind
+                    fsync_write(self.codes_path, "r+b" if os.path.exists(self.codes_path) else "wb",
+                                codes.tobytes(), offset=start * self.store.dimension)
+                    fsync_write(self.scales_path, "r+b" if os.path.exists(self.scales_path) else "wb",
+                                np.column_stack([scales, errors]).tobytes(), offset=start * 8)
+                if rows > done:
+                    logger.info(f"Quantized {rows - done} embeddings to int8")
+        self.codes = np.memmap(self.codes_path, dtype=np.int8, mode="r", shape=(rows, self.store.dimension))
+        bounds = np.memmap(self.scales_path, dtype=np.float32, mode="r", shape=(rows, 2))
+        self.scales, self.errors = bounds[:, 0], bounds[:, 1]
+
+    def cosines(self, query, rows=None):
+        """Approximate cosines of a normalized query to all store rows (or the given ones).
+
+        Each is within errors[row] of the exact cosine. The codes are widened to
+        float32 one small block at a time, so the conversion stays in cache.
+        """
+        codes = self.codes if rows is None else self.codes[rows]
+        scales = self.scales if rows is None else self.scales[rows]
+        query = np.asarray(query, dtype=np.float32)
+        result = np.empty(len(codes), dtype=np.float32)
+        block = np.empty((SCAN_BLOCK_ROWS, codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+            chunk = codes[start:start + SCAN_BLOCK_ROWS]
+            widened = block[:len(chunk)]
+            np.copyto(widened, chunk, casting="unsafe")
+            np.matmul(widened, query, out=result[start:start + len(chunk)])
+        result *= scales
+        return result
+
+
+QUANTIZED_SCANS = {
+    "int8": Int8Vectors,
+}
@@ -0,0 +1,181 @@
+# result_cache.py
+"""LRU cache for aggregate query results, invalidated by a shared data version.
+
+Every write path (uploads, PATCH, classification, cube rebuild) calls
+bump_data_version() in its own transaction, before committing. Cached
+results remember the version they were computed at and are recomputed once
+it has moved on (or the date has changed), so no entry has to be tracked
+down and evicted on write. The same version and date feed the ETags of the
+read endpoints (etag_for).
+
+The version is kept in the data_version table, so a write made through one
+worker process invalidates the caches and in-memory indexes of all of them.
+Writes that update complaints also log their ids (complaint_changes), so the
+in-memory indexes re-read only those (changed_since).
+"""
+import os
+import json
+import hashlib
+import datetime
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from database import engine
+from models import ComplaintChange, DataVersion
+
+# Maximum number of cached results; 0 disables the cache
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "256"))
+# Versions kept in the change log; an index further behind reloads everything
+CHANGE_LOG_VERSIONS = int(os.environ.get("CHANGE_LOG_VERSIONS", "1000"))
+LOG_CHUNK_SIZE = 5000
+
+
+def data_version():
+    """Current committed data version; changes whenever complaints are written (in any process)."""
+    with engine.connect() as connection:
+        return connection.execute(select(DataVersion.version).where(DataVersion.id == 1)).scalar() or 0
+
+
+def bump_data_version(db: Session, changed_ids=()):
+    """Move the data version on inside db's transaction and log the updated complaint ids.
+
+    Call it with the write, before committing, so the data, the version and
+    the log become visible together. Inserted complaints need not be listed:
+    readers pick up ids above the largest they have seen. Returns the new version.
+    """
+    if not db.execute(update(DataVersion).where(DataVersion.id == 1)
+                      .values(version=DataVersion.version + 1)).rowcount:
+        db.execute(insert(DataVersion).values(id=1, version=1, pruned_through=0))
+    version = db.execute(select(DataVersion.version).where(DataVersion.id == 1)).scalar()
+
+    ids = sorted(set(changed_ids))
+    for start in range(0, len(ids), LOG_CHUNK_SIZE):
+        db.execute(insert(ComplaintChange),
+                   [{"version": version, "complaint_id": id_} for id_ in ids[start:start + LOG_CHUNK_SIZE]])
+    pruned = version - CHANGE_LOG_VERSIONS
+    if pruned > 0:
+        db.execute(delete(ComplaintChange).where(ComplaintChange.version <= pruned))
+        db.execute(update(DataVersion).where(DataVersion.id == 1).values(pruned_through=pruned))
+    return version
+
+
+def changed_since(db: Session, version):
+    """Ids of the complaints updated after data version `version`.
+
+    None when the log no longer reaches back that far (or version is None):
+    the caller must then reload everything.
+    """
+    pruned = db.execute(select(DataVersion.pruned_through).where(DataVersion.id == 1)).scalar() or 0
+    if version is None or version < pruned:
+        return None
+    return set(db.execute(select(ComplaintChange.complaint_id).where(ComplaintChange.version > version)).scalars())
+
+
+def normalize_filters(filters):
+    """Hashable, order-independent form of a /complaints style filter dict.
+
+    Empty values and "" list entries (meaning "no filter") are dropped and
+    list values are sorted, so equivalent filter sets share one cache key.
+    """
+    normalized = []
+    for name, value in (filters or {}).items():
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted({item for item in value if item != ""}))
+        elif isinstance(value, str):
+            value = value.strip()
+        if value:
+            normalized.append((name, value))
+    return tuple(sorted(normalized))
+
+
+def etag_for(path, query_items):
+    """Weak ETag of a GET response: data version plus the normalized query.
+
+    query_items are (name, value) pairs; empty values are dropped and names
+    sorted (keeping the order of repeated values). Today's date is included
+    because the trends are padded up to the current bucket (see ResultCache).
+    """
+    items = sorted(((name, value) for name, value in query_items if value != ""), key=lambda item: item[0])
+    raw = json.dumps([data_version(), datetime.date.today().isoformat(), path, items],
+                     ensure_ascii=False)
+    return f'W/"{hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]}"'
+
+
+class ResultCache:
+    """Thread-safe LRU map of (function, normalized filters) -> ((version, date), result)."""
+
+    def __init__(self, maxsize=RESULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        if self.maxsize <= 0:
+            return compute()
+
+        # Read the version before computing, so a write that lands while we
+        # compute leaves the entry stale rather than hiding the new data. The
+        # date is part of it, as of the ETag: trends are padded up to today
+        version = (data_version(), datetime.date.today())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            if entry is not None:
+                self.stale += 1
+
+        result = compute()
+
+        with self._lock:
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "data_version": data_version(),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache()
+
+
+def cached_result(function):
+    """Cache function(db[, filters, *options]) per normalized filter set, options and data version.
+
+    Options must be hashable. Callers share the returned object, so they must not modify it.
+    """
+    @wraps(function)
+    def wrapper(db, *args, **kwargs):
+        key = (function.__name__, normalize_filters(args[0] if args else kwargs.get("filters")),
+               args[1:], tuple(sorted((name, value) for name, value in kwargs.items() if name != "filters")))
+        return result_cache.get_or_compute(key, lambda: function(db, *args, **kwargs))
+
+    return wrapper
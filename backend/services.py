@@ -2,20 +2,40 @@
 import requests
 import json
 import os
-from sqlalchemy import func, extract
+from sqlalchemy import func, extract, select, update
 from sqlalchemy.orm import Session
 from models import Complaint
+from result_cache import bump_data_version, cached_result, normalize_filters
+from similarity_index import similarity_index
+from ann_index import ANN_MIN_ROWS
+from embedding_store import EmbeddingStore
+from text_search import TEXT_COLUMNS, text_index
+from clustering import CLUSTER_THRESHOLD, cluster_rows
+from neighbors import drop_neighbors, lookup_neighbors, rebuild_neighbors, update_neighbors
+from columnar import COLUMNAR_ENGINE_ENABLED, get_store
+from stats_cube import (
+    CUBE_COLUMNS,
+    STATS_CUBE_ENABLED,
+    complaint_cell,
+    cube_cells,
+    get_facet_counts,
+    record_cell_change,
+    rollup
+)
 import traceback
 import datetime
+import pandas as pd
+import base64
+import hashlib
+import re
+import time
+from time_buckets import BUCKET_COLUMNS, GRANULARITIES, bucket_key, bucket_range, bucket_start, fill_gaps
 
 # 尝试导入相似投诉功能所需的库，如果失败则禁用该功能
 try:
     import numpy as np
-    from scipy.spatial.distance import cosine
     from sentence_transformers import SentenceTransformer
-    import pickle
     import threading
-    import time
     SIMILARITY_SEARCH_ENABLED = True
 except ImportError as e:
     print(f"警告: 相似投诉功能依赖项导入失败 ({str(e)})，该功能将被禁用")
@@ -24,9 +44,22 @@ except ImportError as e:
 # 全局变量
 _embedding_model = None
 _model_lock = threading.Lock() if SIMILARITY_SEARCH_ENABLED else None
-_complaint_embeddings = {}
-_embeddings_lock = threading.Lock() if SIMILARITY_SEARCH_ENABLED else None
+# Serializes precompute_embeddings (embedding, clustering and neighbour jobs), so no text is encoded twice
+_embedding_lock = threading.Lock() if SIMILARITY_SEARCH_ENABLED else None
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# 旧版pickle缓存：不再读取（其向量没有模型和文本记录），启动时提示删除
 EMBEDDINGS_CACHE_PATH = os.path.join(os.path.dirname(__file__), "complaint_embeddings.pkl")
+# One store per model (in a subdirectory named after it), so vector spaces never mix
+EMBEDDING_STORE_DIR = os.environ.get("EMBEDDING_STORE_DIR", os.path.join(os.path.dirname(__file__), "embedding_store"))
+embedding_store = EmbeddingStore(
+    os.path.join(EMBEDDING_STORE_DIR, re.sub(r"[^\w.-]+", "_", EMBEDDING_MODEL)), EMBEDDING_MODEL
+)
+# Texts per model.encode batch, and complaints read and appended to the store per chunk
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "128"))
+EMBEDDING_CHUNK_SIZE = 2048
+# Hybrid search: hits taken from each ranking before fusing, and the reciprocal rank fusion constant
+SEARCH_FUSION_CANDIDATES = 100
+SEARCH_RRF_K = 60
 
 def get_embedding_model():
     """Lazily load the embedding model to save memory when not needed."""
@@ -37,42 +70,33 @@ def get_embedding_model():
     
     with _model_lock:
         if _embedding_model is None:
-            # Get model name from environment variable or use default
-            model_name = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
-            print(f"Loading embedding model: {model_name}")
-            _embedding_model = SentenceTransformer(model_name)
+            print(f"Loading embedding model: {EMBEDDING_MODEL}")
+            _embedding_model = SentenceTransformer(EMBEDDING_MODEL)
     
     return _embedding_model
 
 def load_embeddings_cache():
-    """Load previously computed embeddings from disk if available."""
-    if not SIMILARITY_SEARCH_ENABLED:
-        return
-    
-    global _complaint_embeddings
-    
-    with _embeddings_lock:
-        try:
-            if os.path.exists(EMBEDDINGS_CACHE_PATH):
-                with open(EMBEDDINGS_CACHE_PATH, 'rb') as f:
-                    _complaint_embeddings = pickle.load(f)
-                print(f"Loaded {len(_complaint_embeddings)} embeddings from cache")
-        except Exception as e:
-            print(f"Error loading embeddings cache: {str(e)}")
-            _complaint_embeddings = {}
+    """Open the embedding store of EMBEDDING_MODEL.
 
-def save_embeddings_cache():
-    """Save computed embeddings to disk for future use."""
+    Embeddings kept by older versions (the pickle cache, and the store directly
+    in EMBEDDING_STORE_DIR) record neither their model nor their text, so they
+    are not imported: the embedding job queued on startup (see
+    jobs.warm_embeddings) encodes every complaint again into the model's
+    subdirectory, and the old files can be deleted.
+    """
     if not SIMILARITY_SEARCH_ENABLED:
         return
     
-    with _embeddings_lock:
-        try:
-            with open(EMBEDDINGS_CACHE_PATH, 'wb') as f:
-                pickle.dump(_complaint_embeddings, f)
-            print(f"Saved {len(_complaint_embeddings)} embeddings to cache")
-        except Exception as e:
-            print(f"Error saving embeddings cache: {str(e)}")
+    try:
+        embedding_store.refresh()
+        if os.path.exists(EMBEDDINGS_CACHE_PATH):
+            print(f"Ignoring legacy embeddings in {EMBEDDINGS_CACHE_PATH} (unknown model and texts); it can be deleted")
+        if os.path.exists(os.path.join(EMBEDDING_STORE_DIR, "vectors.f32")):
+            print(f"Ignoring the legacy store in {EMBEDDING_STORE_DIR} (unknown model and texts); "
+                  f"its meta.json, ids.txt and vectors.f32 can be deleted")
+        print(f"Loaded {len(embedding_store)} embeddings from {embedding_store.directory}")
+    except Exception as e:
+        print(f"Error loading embedding store: {str(e)}")
 
 def get_complaint_text(complaint):
     """Combine relevant complaint text fields for embedding."""
@@ -93,121 +117,288 @@ def get_complaint_text(complaint):
     
     return " ".join(text_parts)
 
-def get_complaint_embedding(complaint):
-    """Get or compute embedding for a complaint."""
+def embedding_key(text):
+    """Key of the text an embedding is computed from; a changed text means a stale embedding."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+def encode_texts(texts, batch_size=EMBEDDING_BATCH_SIZE):
+    """Embeddings of texts as array rows, encoded in batches (zero rows for empty texts)."""
+    model = get_embedding_model()
+    dimension = embedding_store.dimension or model.get_sentence_embedding_dimension()
+    vectors = np.zeros((len(texts), dimension), dtype=np.float32)
+    rows = [i for i, text in enumerate(texts) if text.strip()]
+    if rows:
+        vectors[rows] = model.encode([texts[i] for i in rows], batch_size=batch_size)
+    return vectors
+
+def _stale_texts(rows):
+    """(PR ID, text, key) of the text rows whose stored embedding is missing or stale."""
+    stale = []
+    for row in rows:
+        text = get_complaint_text(row)
+        key = embedding_key(text)
+        if not embedding_store.has(row.pr_id, key):
+            stale.append((row.pr_id, text, key))
+    return stale
+
+def _text_rows(db: Session):
+    return db.execute(
+        select(Complaint.pr_id, *TEXT_COLUMNS).order_by(Complaint.id).execution_options(yield_per=EMBEDDING_CHUNK_SIZE)
+    )
+
+def count_stale_embeddings(db: Session):
+    """Number of complaints without an embedding of their current text in the store."""
     if not SIMILARITY_SEARCH_ENABLED:
-        raise RuntimeError("相似投诉功能已禁用，无法计算嵌入")
-    
-    pr_id = complaint.pr_id
-    
-    with _embeddings_lock:
-        if pr_id in _complaint_embeddings:
-            return _complaint_embeddings[pr_id]
-    
-    # Need to compute the embedding
-    text = get_complaint_text(complaint)
-    if not text.strip():
-        # Return zero vector if no text
-        embedding = np.zeros(384)  # Default size for all-MiniLM-L6-v2
-    else:
-        model = get_embedding_model()
-        embedding = model.encode(text)
-    
-    # Cache the embedding
-    with _embeddings_lock:
-        _complaint_embeddings[pr_id] = embedding
-    
-    # Save to disk occasionally (not on every update to avoid performance issues)
-    if len(_complaint_embeddings) % 10 == 0:
-        threading.Thread(target=save_embeddings_cache).start()
-    
-    return embedding
+        return 0
+    embedding_store.refresh()
+    return len(_stale_texts(_text_rows(db)))
+
+def _embed_stale(rows, progress=None):
+    """Embed the text rows (PR ID plus text columns) whose stored embedding is missing or stale.
+
+    progress(done, total) is called after each chunk. Returns (number
+    embedded, PR IDs whose outdated embedding was replaced).
+    """
+    stale = _stale_texts(rows)
+    replaced = [pr_id for pr_id, _, _ in stale if pr_id in embedding_store]
+    if progress:
+        progress(0, len(stale))
+    for start in range(0, len(stale), EMBEDDING_CHUNK_SIZE):
+        chunk = stale[start:start + EMBEDDING_CHUNK_SIZE]
+        # One append (and fsync) per chunk rather than per complaint
+        embedding_store.append([pr_id for pr_id, _, _ in chunk], encode_texts([text for _, text, _ in chunk]),
+                               [key for _, _, key in chunk])
+        if progress:
+            progress(start + len(chunk), len(stale))
+    return len(stale), replaced
 
-def calculate_similarity_score(target_complaint, other_complaint):
-    """Calculate similarity score between two complaints."""
+def precompute_embeddings(db: Session, progress=None):
+    """Embed every complaint whose embedding is missing or stale, then load the similarity index.
+
+    Run in the background after uploads; this is the only place embeddings
+    are computed, so /similar-complaints and /search requests only score. An
+    embedding is stale when the complaint's text no longer hashes to the key
+    it was computed from; re-embedded complaints lose their neighbour lists
+    (see neighbors.py). Returns the number of complaints embedded.
+    """
     if not SIMILARITY_SEARCH_ENABLED:
-        raise RuntimeError("相似投诉功能已禁用，无法计算相似度")
-    
-    # Get embeddings
-    target_embedding = get_complaint_embedding(target_complaint)
-    other_embedding = get_complaint_embedding(other_complaint)
-    
-    # Calculate cosine similarity (1 - cosine distance)
-    embedding_similarity = 1 - cosine(target_embedding, other_embedding)
-    
-    # Metadata matching boosts
-    metadata_score = 0.0
-    
-    # System component match
-    if (target_complaint.system_component and other_complaint.system_component and 
-        target_complaint.system_component == other_complaint.system_component):
-        metadata_score += 0.15
-    
-    # Failure mode match
-    if (target_complaint.failure_mode and other_complaint.failure_mode and 
-        target_complaint.failure_mode == other_complaint.failure_mode):
-        metadata_score += 0.10
-    
-    # Level2 match
-    if (target_complaint.level2 and other_complaint.level2 and 
-        target_complaint.level2 == other_complaint.level2):
-        metadata_score += 0.05
-    
-    # Final score is weighted combination
-    final_score = (embedding_similarity * 0.7) + (metadata_score * 0.3)
+        raise RuntimeError("相似投诉功能已禁用，无法计算嵌入")
     
-    # Normalize to 0-1 range
-    return min(max(final_score, 0.0), 1.0)
+    with _embedding_lock:
+        embedding_store.refresh()
+        embedded, replaced = _embed_stale(_text_rows(db), progress)
+        if embedded:
+            # The indexes must pick up the new rows, and the neighbour lists built from replaced ones are wrong
+            complaint_ids = []
+            for start in range(0, len(replaced), 500):
+                chunk = replaced[start:start + 500]
+                complaint_ids += [row[0] for row in db.query(Complaint.id).filter(Complaint.pr_id.in_(chunk))]
+            drop_neighbors(db, complaint_ids)
+            bump_data_version(db, complaint_ids)
+            db.commit()
+            if replaced:
+                print(f"Re-embedded {len(replaced)} complaints whose text changed")
+    similarity_index.refresh(db, embedding_store)
+    return embedded
 
-def find_similar_complaints(pr_id, db: Session, limit=5):
-    """Find complaints similar to the given PR ID."""
+def find_similar_complaints(pr_id, db: Session, limit=5, nprobe=None, filters=None):
+    """Find complaints similar to the given PR ID.
+
+    filters (as for /complaints) restrict the candidates (matching_complaint_ids),
+    so only matching complaints are scored.
+    nprobe overrides IVF_NPROBE when an ANN index is in use (more is slower but finds more).
+    """
     if not SIMILARITY_SEARCH_ENABLED:
         raise RuntimeError("相似投诉功能已禁用，无法查找相似投诉")
     
-    # Get the target complaint
-    target_complaint = db.query(Complaint).filter(Complaint.pr_id == pr_id).first()
-    if not target_complaint:
-        return []
-    
-    # Get all other complaints 
-    all_complaints = db.query(Complaint).filter(Complaint.pr_id != pr_id).all()
+    if nprobe is None and not normalize_filters(filters):
+        # Unfiltered requests are answered from the precomputed neighbour table once it is built
+        stored = lookup_neighbors(db, pr_id, limit)
+        if stored is not None:
+            return [similar_complaint_result(complaint, score) for complaint, score in stored if score >= 0.5]
     
-    # Calculate similarity scores
-    similarities = []
-    for complaint in all_complaints:
-        score = calculate_similarity_score(target_complaint, complaint)
-        similarities.append((complaint, score))
+    ids = matching_complaint_ids(db, filters)
     
-    # Sort by similarity score (descending)
-    similarities.sort(key=lambda x: x[1], reverse=True)
+    # Score against the embedding matrix in one pass
+    similarity_index.refresh(db, embedding_store)
+    top_similar = [
+        (other_pr_id, score) for other_pr_id, score in similarity_index.top_k(pr_id, limit, nprobe, ids)
+        # Filter out results with very low similarity
+        if score >= 0.5  # 50% similarity threshold
+    ]
     
-    # Take top N results
-    top_similar = similarities[:limit]
+    complaints = {
+        complaint.pr_id: complaint
+        for complaint in db.query(Complaint).filter(Complaint.pr_id.in_([item[0] for item in top_similar]))
+    }
     
     # Convert to result format
-    result = []
-    for complaint, score in top_similar:
-        # Filter out results with very low similarity
-        if score < 0.5:  # 50% similarity threshold
-            continue
-            
-        result.append({
-            "pr_id": complaint.pr_id,
-            "short_description": complaint.short_description,
-            "similarity": score,
-            "system_component": complaint.system_component,
-            "failure_mode": complaint.failure_mode,
-            "level2": complaint.level2,
-            "severity": complaint.severity,
-            "priority": complaint.priority
-        })
+    return [similar_complaint_result(complaints[other_pr_id], score) for other_pr_id, score in top_similar]
+
+def similar_complaint_result(complaint, score):
+    return {
+        "pr_id": complaint.pr_id,
+        "short_description": complaint.short_description,
+        "similarity": score,
+        "system_component": complaint.system_component,
+        "failure_mode": complaint.failure_mode,
+        "level2": complaint.level2,
+        "severity": complaint.severity,
+        "priority": complaint.priority
+    }
+
+def ann_index_needed():
+    """Whether SIMILARITY_INDEX asks for an ANN index the store is large enough for but that is not built yet."""
+    ann_class = similarity_index.ann_class
+    if not SIMILARITY_SEARCH_ENABLED or ann_class is None:
+        return False
+    embedding_store.refresh()
+    return len(embedding_store.ids) >= ANN_MIN_ROWS and not ann_class.saved(embedding_store)
+
+def build_ann_index(db: Session, ann_class=None, lists=None):
+    """Train the ANN index (of SIMILARITY_INDEX by default) on the embedding store.
+
+    Runs in a background job or offline, never on a request. The data version
+    is bumped, so every process loads the new lists on its next refresh.
+    """
+    ann_class = ann_class or similarity_index.ann_class
+    ann_class(embedding_store).build(lists)
+    bump_data_version(db)
+    db.commit()
+
+def build_neighbor_table(db: Session, progress=None, incremental=False):
+    """Fill the precomputed neighbour table used by /similar-complaints.
+
+    incremental=True only computes the lists of complaints that have none and
+    of the complaints they affect (see neighbors.update_neighbors).
+    """
+    if not SIMILARITY_SEARCH_ENABLED:
+        raise RuntimeError("相似投诉功能已禁用，无法计算近邻")
     
-    return result
+    precompute_embeddings(db)
+    if incremental:
+        return {"lists_written": update_neighbors(db, similarity_index, progress)}
+    return {"lists_written": rebuild_neighbors(db, similarity_index, progress)}
+
+def cluster_complaints(db: Session, threshold=CLUSTER_THRESHOLD, progress=None):
+    """Group near-duplicate complaints and store their cluster ids.
+
+    Complaints whose embeddings have a cosine of at least threshold are linked;
+    each connected group gets the smallest complaint id in it as cluster_id,
+    complaints without near-duplicates get NULL. progress(done, total) follows
+    the blocked all-pairs comparison.
+    """
+    if not SIMILARITY_SEARCH_ENABLED:
+        raise RuntimeError("相似投诉功能已禁用，无法聚类")
+    
+    precompute_embeddings(db)
+    ids, store_rows, vectors = similarity_index.snapshot()
+    # Complaints appended since the embedding pass have no vector to compare yet
+    embedded = store_rows >= 0
+    ids, store_rows = ids[embedded], store_rows[embedded]
+    roots = cluster_rows(vectors, store_rows, threshold, progress)
+    clustered = np.flatnonzero(np.bincount(roots, minlength=len(roots))[roots] > 1)
+    
+    db.query(Complaint).filter(Complaint.cluster_id.isnot(None)).update({Complaint.cluster_id: None})
+    for start in range(0, len(clustered), 1000):
+        chunk = clustered[start:start + 1000]
+        db.execute(update(Complaint), [
+            {"id": int(ids[position]), "cluster_id": int(ids[roots[position]])} for position in chunk
+        ])
+    # cluster_id is not held by any in-memory index, so no ids are logged
+    bump_data_version(db)
+    db.commit()
+    
+    clusters = len(np.unique(roots[clustered]))
+    print(f"Clustered {len(clustered)} of {len(ids)} complaints into {clusters} clusters (threshold {threshold})")
+    return {"complaints": len(ids), "clustered_complaints": len(clustered), "clusters": clusters}
+
+def get_clusters(db: Session, min_size=2, limit=100):
+    """Largest near-duplicate clusters: [{cluster_id, size, pr_id, short_description}] of their first complaint."""
+    size = func.count(Complaint.id).label("size")
+    clusters = (
+        db.query(Complaint.cluster_id, size)
+        .filter(Complaint.cluster_id.isnot(None))
+        .group_by(Complaint.cluster_id)
+        .having(size >= min_size)
+        .order_by(size.desc(), Complaint.cluster_id)
+        .limit(limit)
+        .all()
+    )
+    first = {
+        complaint.id: complaint
+        for complaint in db.query(Complaint).filter(Complaint.id.in_([cluster_id for cluster_id, _ in clusters]))
+    }
+    return [
+        {
+            "cluster_id": cluster_id,
+            "size": count,
+            "pr_id": first[cluster_id].pr_id if cluster_id in first else None,
+            "short_description": first[cluster_id].short_description if cluster_id in first else None
+        }
+        for cluster_id, count in clusters
+    ]
+
+def refresh_text_index(db: Session):
+    """Bring the full-text index up to date (incremental; run after uploads)."""
+    text_index.refresh(db, get_complaint_text)
+
+def search_complaints(db: Session, query, limit=20, filters=None, semantic=False):
+    """Full-text search of the complaint texts, BM25-ranked.
+
+    With semantic=True (and similarity search available) the BM25 ranking is
+    fused with the embedding ranking of the query by reciprocal rank fusion.
+    filters (as for /complaints) restrict the results.
+    """
+    if not query or not query.strip():
+        raise ValueError("Search query must not be empty")
+    
+    ids = matching_complaint_ids(db, filters)
+    refresh_text_index(db)
+    
+    if semantic and SIMILARITY_SEARCH_ENABLED:
+        candidates = max(limit, SEARCH_FUSION_CANDIDATES)
+        rankings = [text_index.search(query, candidates, ids)]
+        similarity_index.refresh(db, embedding_store)
+        vector = np.asarray(get_embedding_model().encode([query], batch_size=1)[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            rankings.append(similarity_index.nearest(vector / norm, candidates, ids=ids))
+        fused = {}
+        for ranking in rankings:
+            for rank, (complaint_id, _) in enumerate(ranking):
+                fused[complaint_id] = fused.get(complaint_id, 0.0) + 1.0 / (SEARCH_RRF_K + rank + 1)
+        hits = sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    else:
+        if semantic:
+            print("Semantic search requested but similarity search is disabled; using BM25 only")
+        hits = text_index.search(query, limit, ids)
+    
+    complaints = {
+        complaint.id: complaint
+        for complaint in db.query(Complaint).filter(Complaint.id.in_([complaint_id for complaint_id, _ in hits]))
+    }
+    return [
+        {
+            "pr_id": complaints[complaint_id].pr_id,
+            "short_description": complaints[complaint_id].short_description,
+            "score": score,
+            "system_component": complaints[complaint_id].system_component,
+            "failure_mode": complaints[complaint_id].failure_mode,
+            "level2": complaints[complaint_id].level2,
+            "severity": complaints[complaint_id].severity,
+            "priority": complaints[complaint_id].priority,
+            "pr_state": complaints[complaint_id].pr_state,
+            "initiate_date": complaints[complaint_id].initiate_date
+        }
+        for complaint_id, score in hits if complaint_id in complaints
+    ]
 
 # Initialize embeddings cache when module is loaded
 if SIMILARITY_SEARCH_ENABLED:
     load_embeddings_cache()
 
+@cached_result
 def get_filter_options(db: Session):
     """Fetch unique filter options dynamically from the database."""
     try:
@@ -251,6 +442,17 @@ def get_filter_options(db: Session):
         traceback.print_exc()
         return {}
 
+@cached_result
+def get_filter_facets(db: Session, filters=None):
+    """Filter options with counts; each facet's counts apply all *other* active filters.
+
+    Answered from one pass over the statistics cube (or the columnar store /
+    one GROUP BY scan, depending on the configured engine).
+    """
+    if COLUMNAR_ENGINE_ENABLED:
+        return get_store(db).facet_counts(filters)
+    return get_facet_counts(db, filters, use_cube=STATS_CUBE_ENABLED)
+
 def get_prompt_for_classification(complaint):  
     """生成用于分类的提示词"""  
     
@@ -430,6 +632,7 @@ def classify_complaint(complaint, db: Session, model_name=None):
     print(f"Using LLM model: {llm_model_name}")
     
     prompt = get_prompt_for_classification(complaint)
+    old_cell = complaint_cell(complaint)
     
     try:
         # 调用LLM API
@@ -509,6 +712,10 @@ def classify_complaint(complaint, db: Session, model_name=None):
                         print("multiple classification")
                     complaint.rational = rational    
                     complaint.updated_at = func.now()  
+                    record_cell_change(db, old_cell, complaint)
+                    complaint_id = complaint.id
+                    drop_neighbors(db, [complaint_id])
+                    bump_data_version(db, [complaint_id])
                     
                     db.commit()  
                     return True  
@@ -523,93 +730,142 @@ def classify_complaint(complaint, db: Session, model_name=None):
     
     return False
 
+# 筛选参数名 -> Complaint 列
+FILTER_COLUMNS = {
+    "system_component": Complaint.system_component,
+    "failure_mode": Complaint.failure_mode,
+    "severity": Complaint.severity,
+    "priority": Complaint.priority,
+    "country": Complaint.event_country,
+    "catalog_item_identifier": Complaint.catalog_item_identifier,
+    "pr_state": Complaint.pr_state,
+    "level2": Complaint.level2,
+}
+
+# 大文本列：列表视图默认不返回，按需逐条获取
+LARGE_TEXT_FIELDS = [
+    "description",
+    "source_customer_description",
+    "source_notes",
+    "investigation_notes",
+    "investigation_summary",
+    "reporting_decision_notes",
+    "comments",
+    "rational",
+]
+COMPLAINT_FIELDS = [column.name for column in Complaint.__table__.columns]
+LIST_FIELDS = [field for field in COMPLAINT_FIELDS if field not in LARGE_TEXT_FIELDS]
+
+def apply_complaint_filters(query, filters=None):
+    """Apply the /complaints style filter parameters to a Complaint query.
+
+    Empty strings in a multi-value filter mean "no filter"; unparseable dates are ignored.
+    """
+    if not filters:
+        return query
+
+    for name, column in FILTER_COLUMNS.items():
+        values = [value for value in (filters.get(name) or []) if value != ""]
+        if values:
+            query = query.filter(column.in_(values))
+
+    if filters.get("start_date"):
+        try:
+            start = pd.to_datetime(filters["start_date"]).date()
+            query = query.filter(Complaint.initiate_date >= start)
+        except Exception as e:
+            print(f"Error parsing start_date: {str(e)}")
+
+    if filters.get("end_date"):
+        try:
+            end = pd.to_datetime(filters["end_date"]).date()
+            query = query.filter(Complaint.initiate_date <= end)
+        except Exception as e:
+            print(f"Error parsing end_date: {str(e)}")
+
+    if filters.get("cluster_id") is not None:
+        query = query.filter(Complaint.cluster_id == filters["cluster_id"])
+
+    return query
+
+def matching_complaint_ids(db: Session, filters):
+    """Sorted ids of the complaints matching /complaints style filters, or None without filters.
+
+    Matched on the columnar store's code arrays when COLUMNAR_ENGINE is on,
+    otherwise with an id-only query, so the store is never loaded just for this.
+    """
+    if not normalize_filters(filters):
+        return None
+    if COLUMNAR_ENGINE_ENABLED:
+        return get_store(db).matching_ids(filters)
+    query = apply_complaint_filters(db.query(Complaint), filters).with_entities(Complaint.id).order_by(Complaint.id)
+    return np.array([row[0] for row in query], dtype=np.int64)
+
+def parse_fields(fields, default=None):
+    """Parse a fields= projection (repeated and/or comma-separated) into column names.
+
+    Raises ValueError for unknown column names.
+    """
+    if not fields:
+        return list(default or COMPLAINT_FIELDS)
+    names = [name.strip() for item in fields for name in item.split(",") if name.strip()]
+    unknown = [name for name in names if name not in COMPLAINT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(names))
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode an opaque page cursor; raises ValueError if it is malformed."""
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode()))["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def list_complaints_page(db: Session, filters=None, fields=None, limit=100, cursor=None):
+    """Keyset-paginated, projected complaint listing ordered by primary key.
+
+    Only the requested columns are selected (id and pr_id are always included);
+    next_cursor is None on the last page.
+    """
+    columns = list(dict.fromkeys(["id", "pr_id"] + list(fields or LIST_FIELDS)))
+    query = apply_complaint_filters(
+        db.query(*[getattr(Complaint, name) for name in columns]), filters
+    )
+    if cursor:
+        query = query.filter(Complaint.id > decode_cursor(cursor))
+
+    # Fetch one extra row to know whether another page follows
+    rows = query.order_by(Complaint.id).limit(limit + 1).all()
+    items = [dict(row._mapping) for row in rows[:limit]]
+    next_cursor = encode_cursor(items[-1]["id"]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor, "limit": limit}
+
+def count_complaints(db: Session, filters=None):
+    """Count complaints matching the filters without loading any rows."""
+    query = apply_complaint_filters(db.query(func.count(Complaint.id)), filters)
+    return query.scalar()
+
+def get_complaint_fields(db: Session, pr_id, fields=None):
+    """Selected columns of a single complaint (by default its large text columns), or None."""
+    columns = list(dict.fromkeys(["pr_id"] + list(fields or LARGE_TEXT_FIELDS)))
+    row = db.query(*[getattr(Complaint, name) for name in columns]).filter(Complaint.pr_id == pr_id).first()
+    return dict(row._mapping) if row else None
+
+@cached_result
 def get_statistics(db: Session, filters=None):  
     """获取分类统计信息"""
-    # Start with the base query
-    query = db.query(Complaint)
-    
-    # Apply filters if provided
-    if filters:
-        # Handle system_component filter
-        if filters.get("system_component"):
-            system_component = filters["system_component"]
-            if "" in system_component:
-                system_component.remove("")
-            if system_component:
-                query = query.filter(Complaint.system_component.in_(system_component))
-        
-        # Handle failure_mode filter
-        if filters.get("failure_mode"):
-            failure_mode = filters["failure_mode"]
-            if "" in failure_mode:
-                failure_mode.remove("")
-            if failure_mode:
-                query = query.filter(Complaint.failure_mode.in_(failure_mode))
-        
-        # Handle severity filter
-        if filters.get("severity"):
-            severity = filters["severity"]
-            if "" in severity:
-                severity.remove("")
-            if severity:
-                query = query.filter(Complaint.severity.in_(severity))
-        
-        # Handle priority filter
-        if filters.get("priority"):
-            priority = filters["priority"]
-            if "" in priority:
-                priority.remove("")
-            if priority:
-                query = query.filter(Complaint.priority.in_(priority))
-        
-        # Handle country filter
-        if filters.get("country"):
-            country = filters["country"]
-            if "" in country:
-                country.remove("")
-            if country:
-                query = query.filter(Complaint.event_country.in_(country))
-        
-        # Handle catalog_item_identifier filter
-        if filters.get("catalog_item_identifier"):
-            catalog = filters["catalog_item_identifier"]
-            if "" in catalog:
-                catalog.remove("")
-            if catalog:
-                query = query.filter(Complaint.catalog_item_identifier.in_(catalog))
-        
-        # Handle pr_state filter
-        if filters.get("pr_state"):
-            pr_state = filters["pr_state"]
-            if "" in pr_state:
-                pr_state.remove("")
-            if pr_state:
-                query = query.filter(Complaint.pr_state.in_(pr_state))
-        
-        # Handle level2 filter
-        if filters.get("level2"):
-            level2 = filters["level2"]
-            if "" in level2:
-                level2.remove("")
-            if level2:
-                query = query.filter(Complaint.level2.in_(level2))
-        
-        # Date range filter
-        if filters.get("start_date"):
-            try:
-                import pandas as pd
-                start = pd.to_datetime(filters["start_date"]).date()
-                query = query.filter(Complaint.initiate_date >= start)
-            except Exception as e:
-                print(f"Error parsing start_date: {str(e)}")
-                
-        if filters.get("end_date"):
-            try:
-                import pandas as pd
-                end = pd.to_datetime(filters["end_date"]).date()
-                query = query.filter(Complaint.initiate_date <= end)
-            except Exception as e:
-                print(f"Error parsing end_date: {str(e)}")
+    if COLUMNAR_ENGINE_ENABLED:
+        counts = get_store(db).counts(filters, [column.key for column in STATISTICS_DIMENSIONS.values()])
+        return {name: counts[column.key] for name, column in STATISTICS_DIMENSIONS.items()}
+
+    if STATS_CUBE_ENABLED:
+        cells = cube_cells(db, filters)
+        return {name: rollup(cells, column.key) for name, column in STATISTICS_DIMENSIONS.items()}
+
+    query = apply_complaint_filters(db.query(Complaint), filters)
     
     # Get filtered complaints and calculate statistics
     filtered_complaints = query
@@ -653,224 +909,135 @@ def get_statistics(db: Session, filters=None):
         "level2": dict(level2_stats)
     }
 
-def get_monthly_trend(db: Session, filters=None):
-    """Get monthly trend data for complaints"""
-    # Start with the base query
-    query = db.query(Complaint)
-    
-    # Apply filters if provided (same as in get_statistics)
-    if filters:
-        # Handle system_component filter
-        if filters.get("system_component"):
-            system_component = filters["system_component"]
-            if "" in system_component:
-                system_component.remove("")
-            if system_component:
-                query = query.filter(Complaint.system_component.in_(system_component))
-        
-        # Handle failure_mode filter
-        if filters.get("failure_mode"):
-            failure_mode = filters["failure_mode"]
-            if "" in failure_mode:
-                failure_mode.remove("")
-            if failure_mode:
-                query = query.filter(Complaint.failure_mode.in_(failure_mode))
-        
-        # Handle severity filter
-        if filters.get("severity"):
-            severity = filters["severity"]
-            if "" in severity:
-                severity.remove("")
-            if severity:
-                query = query.filter(Complaint.severity.in_(severity))
-        
-        # Handle priority filter
-        if filters.get("priority"):
-            priority = filters["priority"]
-            if "" in priority:
-                priority.remove("")
-            if priority:
-                query = query.filter(Complaint.priority.in_(priority))
-        
-        # Handle country filter
-        if filters.get("country"):
-            country = filters["country"]
-            if "" in country:
-                country.remove("")
-            if country:
-                query = query.filter(Complaint.event_country.in_(country))
-        
-        # Handle catalog_item_identifier filter
-        if filters.get("catalog_item_identifier"):
-            catalog = filters["catalog_item_identifier"]
-            if "" in catalog:
-                catalog.remove("")
-            if catalog:
-                query = query.filter(Complaint.catalog_item_identifier.in_(catalog))
-        
-        # Handle pr_state filter
-        if filters.get("pr_state"):
-            pr_state = filters["pr_state"]
-            if "" in pr_state:
-                pr_state.remove("")
-            if pr_state:
-                query = query.filter(Complaint.pr_state.in_(pr_state))
-        
-        # Handle level2 filter
-        if filters.get("level2"):
-            level2 = filters["level2"]
-            if "" in level2:
-                level2.remove("")
-            if level2:
-                query = query.filter(Complaint.level2.in_(level2))
-        
-        # Date range filter
-        if filters.get("start_date"):
-            try:
-                import pandas as pd
-                start = pd.to_datetime(filters["start_date"]).date()
-                query = query.filter(Complaint.initiate_date >= start)
-            except Exception as e:
-                print(f"Error parsing start_date: {str(e)}")
-                
-        if filters.get("end_date"):
-            try:
-                import pandas as pd
-                end = pd.to_datetime(filters["end_date"]).date()
-                query = query.filter(Complaint.initiate_date <= end)
-            except Exception as e:
-                print(f"Error parsing end_date: {str(e)}")
-    
-    # Get monthly data (format as YYYY-MM)
-    monthly_data = query.with_entities(
-        func.strftime('%Y-%m', Complaint.initiate_date).label('month'),
-        func.count(Complaint.id).label('count')
-    ).group_by(func.strftime('%Y-%m', Complaint.initiate_date)).order_by('month').all()
-    
-    # Convert to list of dictionaries
-    result = [{'month': item[0], 'count': item[1]} for item in monthly_data if item[0] is not None]
-    
+def fill_missing_months(result):
+    """Pad a sorted [{'month': 'YYYY-MM', 'count': n}] list with zero-count months up to the current month."""
     # Ensure we have at least the last 12 months represented
     if not result:
         # If no data, return empty list
         return []
     
-    # Fill in missing months with zero counts
-    today = datetime.date.today()
-    full_result = []
-    
-    # Get the earliest month in our data
     try:
-        earliest_month = min([datetime.datetime.strptime(item['month'], '%Y-%m') for item in result])
-        
-        # Ensure we have at least the past 12 months
-        twelve_months_ago = datetime.datetime(today.year - 1, today.month, 1)
-        earliest_month = min(earliest_month, twelve_months_ago)
-        
-        # Generate all months from earliest to current
-        current_month = earliest_month
-        end_month = datetime.datetime(today.year, today.month, 1)
-        
-        while current_month <= end_month:
-            month_str = current_month.strftime('%Y-%m')
-            existing = next((item for item in result if item['month'] == month_str), None)
-            
-            if existing:
-                full_result.append(existing)
-            else:
-                full_result.append({'month': month_str, 'count': 0})
-            
-            # Move to next month
-            if current_month.month == 12:
-                current_month = datetime.datetime(current_month.year + 1, 1, 1)
-            else:
-                current_month = datetime.datetime(current_month.year, current_month.month + 1, 1)
+        today = datetime.date.today()
+        twelve_months_ago = bucket_key(datetime.date(today.year - 1, today.month, 1), "month")
+        earliest_month = min(min(item['month'] for item in result), twelve_months_ago)
+        counts = {item['month']: item['count'] for item in result}
+        return [
+            {'month': month, 'count': count}
+            for month, count in fill_gaps(counts, earliest_month, bucket_key(today, "month"), "month")
+        ]
     except Exception as e:
         print(f"Error filling missing months: {str(e)}")
         traceback.print_exc()
         return result  # Return original result if error
-        
-    return full_result
 
+@cached_result
+def get_monthly_trend(db: Session, filters=None):
+    """Get monthly trend data for complaints"""
+    monthly = None
+    if COLUMNAR_ENGINE_ENABLED:
+        monthly = get_store(db).counts(filters, ["initiate_month"])["initiate_month"]
+    elif STATS_CUBE_ENABLED:
+        monthly = rollup(cube_cells(db, filters), "initiate_month")
+    if monthly is not None:
+        return fill_missing_months(
+            [{'month': key, 'count': count} for key, count in monthly.items() if key is not None]
+        )
+
+    query = apply_complaint_filters(db.query(Complaint), filters)
+    
+    # Get monthly data (precomputed YYYY-MM bucket)
+    monthly_data = query.with_entities(
+        Complaint.initiate_month.label('month'),
+        func.count(Complaint.id).label('count')
+    ).group_by(Complaint.initiate_month).order_by('month').all()
+    
+    # Convert to list of dictionaries
+    result = [{'month': item[0], 'count': item[1]} for item in monthly_data if item[0] is not None]
+    
+    return fill_missing_months(result)
+
+def _trend_range_bound(filters, name, granularity):
+    """Bucket key of the start_date/end_date filter, or None if absent or unparseable."""
+    if not filters or not filters.get(name):
+        return None
+    try:
+        return bucket_key(pd.to_datetime(filters[name]).date(), granularity)
+    except Exception as e:
+        print(f"Error parsing {name}: {str(e)}")
+        return None
+
+@cached_result
+def get_trend(db: Session, filters=None, granularity="month", split_by=None):
+    """Complaint counts per day/week/month/quarter/year bucket, optionally split by one filter dimension.
+
+    Buckets are grouped on the precomputed bucket columns (portable across
+    databases); month/quarter/year come from the statistics cube when enabled.
+    Every bucket from the start_date (or first complaint) to the end_date (or
+    today) is returned, missing ones with 0. Raises ValueError for an unknown
+    granularity or split dimension.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    if split_by and split_by not in FILTER_COLUMNS:
+        raise ValueError(f"Unknown split dimension: {split_by}")
+    split_column = FILTER_COLUMNS[split_by] if split_by else None
+
+    counts = {}
+    if STATS_CUBE_ENABLED and granularity in ("month", "quarter", "year"):
+        month_index = CUBE_COLUMNS.index("initiate_month")
+        split_index = CUBE_COLUMNS.index(split_column.key) if split_by else None
+        for cell, count in cube_cells(db, filters).items():
+            if cell[month_index] is None:
+                continue
+            bucket = bucket_key(bucket_start(cell[month_index], "month"), granularity)
+            key = (bucket, cell[split_index] if split_by else None)
+            counts[key] = counts.get(key, 0) + count
+    else:
+        bucket_column = Complaint.initiate_date if granularity == "day" else getattr(Complaint, BUCKET_COLUMNS[granularity])
+        group_columns = [bucket_column] + ([split_column] if split_by else [])
+        query = apply_complaint_filters(db.query(*group_columns, func.count(Complaint.id)), filters)
+        for row in query.filter(bucket_column.isnot(None)).group_by(*group_columns):
+            bucket = row[0].isoformat() if granularity == "day" else row[0]
+            key = (bucket, row[1] if split_by else None)
+            counts[key] = counts.get(key, 0) + row[-1]
+
+    first = _trend_range_bound(filters, "start_date", granularity)
+    last = _trend_range_bound(filters, "end_date", granularity)
+    if counts:
+        first = first or min(bucket for bucket, _ in counts)
+        last = last or max(max(bucket for bucket, _ in counts), bucket_key(datetime.date.today(), granularity))
+    buckets = bucket_range(first, last, granularity) if first and last and first <= last else []
+
+    totals = {}
+    for (bucket, _), count in counts.items():
+        totals[bucket] = totals.get(bucket, 0) + count
+    result = {
+        "granularity": granularity,
+        "split_by": split_by,
+        "buckets": buckets,
+        "counts": [totals.get(bucket, 0) for bucket in buckets],
+    }
+    if split_by:
+        series = {}
+        for (bucket, value), count in counts.items():
+            series.setdefault(value, {})[bucket] = count
+        result["series"] = sorted(
+            [{"value": value, "counts": [per_bucket.get(bucket, 0) for bucket in buckets]}
+             for value, per_bucket in series.items()],
+            key=lambda entry: -sum(entry["counts"])
+        )
+    return result
+
+@cached_result
 def get_country_statistics(db: Session, filters=None):
     """Get complaint statistics by country"""
-    # Start with the base query
-    query = db.query(Complaint)
-    
-    # Apply filters (same as in get_statistics)
-    if filters:
-        # Handle system_component filter
-        if filters.get("system_component"):
-            system_component = filters["system_component"]
-            if "" in system_component:
-                system_component.remove("")
-            if system_component:
-                query = query.filter(Complaint.system_component.in_(system_component))
-        
-        # Handle failure_mode filter
-        if filters.get("failure_mode"):
-            failure_mode = filters["failure_mode"]
-            if "" in failure_mode:
-                failure_mode.remove("")
-            if failure_mode:
-                query = query.filter(Complaint.failure_mode.in_(failure_mode))
-        
-        # Handle severity filter
-        if filters.get("severity"):
-            severity = filters["severity"]
-            if "" in severity:
-                severity.remove("")
-            if severity:
-                query = query.filter(Complaint.severity.in_(severity))
-        
-        # Handle priority filter
-        if filters.get("priority"):
-            priority = filters["priority"]
-            if "" in priority:
-                priority.remove("")
-            if priority:
-                query = query.filter(Complaint.priority.in_(priority))
-        
-        # Handle catalog_item_identifier filter
-        if filters.get("catalog_item_identifier"):
-            catalog = filters["catalog_item_identifier"]
-            if "" in catalog:
-                catalog.remove("")
-            if catalog:
-                query = query.filter(Complaint.catalog_item_identifier.in_(catalog))
-        
-        # Handle pr_state filter
-        if filters.get("pr_state"):
-            pr_state = filters["pr_state"]
-            if "" in pr_state:
-                pr_state.remove("")
-            if pr_state:
-                query = query.filter(Complaint.pr_state.in_(pr_state))
-        
-        # Handle level2 filter
-        if filters.get("level2"):
-            level2 = filters["level2"]
-            if "" in level2:
-                level2.remove("")
-            if level2:
-                query = query.filter(Complaint.level2.in_(level2))
-        
-        # Date range filter
-        if filters.get("start_date"):
-            try:
-                import pandas as pd
-                start = pd.to_datetime(filters["start_date"]).date()
-                query = query.filter(Complaint.initiate_date >= start)
-            except Exception as e:
-                print(f"Error parsing start_date: {str(e)}")
-                
-        if filters.get("end_date"):
-            try:
-                import pandas as pd
-                end = pd.to_datetime(filters["end_date"]).date()
-                query = query.filter(Complaint.initiate_date <= end)
-            except Exception as e:
-                print(f"Error parsing end_date: {str(e)}")
+    if COLUMNAR_ENGINE_ENABLED:
+        return get_store(db).counts(filters, ["event_country"], skip_blank=True)["event_country"]
+
+    if STATS_CUBE_ENABLED:
+        return rollup(cube_cells(db, filters), "event_country", skip_blank=True)
+
+    query = apply_complaint_filters(db.query(Complaint), filters)
     
     # Count complaints by country
     country_stats = query.with_entities(
@@ -886,85 +1053,16 @@ def get_country_statistics(db: Session, filters=None):
     
     return result
 
+@cached_result
 def get_product_statistics(db: Session, filters=None):
     """Get complaint statistics by product"""
-    # Start with the base query
-    query = db.query(Complaint)
-    
-    # Apply filters (same as in get_statistics)
-    if filters:
-        # Handle system_component filter
-        if filters.get("system_component"):
-            system_component = filters["system_component"]
-            if "" in system_component:
-                system_component.remove("")
-            if system_component:
-                query = query.filter(Complaint.system_component.in_(system_component))
-        
-        # Handle failure_mode filter
-        if filters.get("failure_mode"):
-            failure_mode = filters["failure_mode"]
-            if "" in failure_mode:
-                failure_mode.remove("")
-            if failure_mode:
-                query = query.filter(Complaint.failure_mode.in_(failure_mode))
-        
-        # Handle severity filter
-        if filters.get("severity"):
-            severity = filters["severity"]
-            if "" in severity:
-                severity.remove("")
-            if severity:
-                query = query.filter(Complaint.severity.in_(severity))
-        
-        # Handle priority filter
-        if filters.get("priority"):
-            priority = filters["priority"]
-            if "" in priority:
-                priority.remove("")
-            if priority:
-                query = query.filter(Complaint.priority.in_(priority))
-        
-        # Handle country filter
-        if filters.get("country"):
-            country = filters["country"]
-            if "" in country:
-                country.remove("")
-            if country:
-                query = query.filter(Complaint.event_country.in_(country))
-        
-        # Handle pr_state filter
-        if filters.get("pr_state"):
-            pr_state = filters["pr_state"]
-            if "" in pr_state:
-                pr_state.remove("")
-            if pr_state:
-                query = query.filter(Complaint.pr_state.in_(pr_state))
-        
-        # Handle level2 filter
-        if filters.get("level2"):
-            level2 = filters["level2"]
-            if "" in level2:
-                level2.remove("")
-            if level2:
-                query = query.filter(Complaint.level2.in_(level2))
-        
-        # Date range filter
-        if filters.get("start_date"):
-            try:
-                import pandas as pd
-                start = pd.to_datetime(filters["start_date"]).date()
-                query = query.filter(Complaint.initiate_date >= start)
-            except Exception as e:
-                print(f"Error parsing start_date: {str(e)}")
-                
-        if filters.get("end_date"):
-            try:
-                import pandas as pd
-                end = pd.to_datetime(filters["end_date"]).date()
-                query = query.filter(Complaint.initiate_date <= end)
-            except Exception as e:
-                print(f"Error parsing end_date: {str(e)}")
+    if COLUMNAR_ENGINE_ENABLED:
+        return get_store(db).counts(filters, ["catalog_item_name"], skip_blank=True)["catalog_item_name"]
+
+    if STATS_CUBE_ENABLED:
+        return rollup(cube_cells(db, filters), "catalog_item_name", skip_blank=True)
+
+    query = apply_complaint_filters(db.query(Complaint), filters)
     
     # Count complaints by product
     product_stats = query.with_entities(
@@ -980,6 +1078,149 @@ def get_product_statistics(db: Session, filters=None):
     
     return result
 
+# /dashboard 各统计分区使用的维度列
+STATISTICS_DIMENSIONS = {
+    "system_component": Complaint.system_component,
+    "failure_mode": Complaint.failure_mode,
+    "severity": Complaint.severity,
+    "priority": Complaint.priority,
+    "is_open": Complaint.pr_state,
+    "level2": Complaint.level2,
+}
+
+def _columnar_dashboard(db: Session, filters, started):
+    """get_dashboard answered by the in-memory columnar store."""
+    timings = {}
+    section_start = time.perf_counter()
+    store = get_store(db)
+    timings["refresh"] = time.perf_counter() - section_start
+
+    section_start = time.perf_counter()
+    columns = [column.key for column in STATISTICS_DIMENSIONS.values()]
+    counts = store.counts(filters, columns + ["initiate_month"])
+    statistics = {name: counts[column.key] for name, column in STATISTICS_DIMENSIONS.items()}
+    timings["statistics"] = time.perf_counter() - section_start
+
+    section_start = time.perf_counter()
+    monthly_trend = fill_missing_months(
+        [{'month': key, 'count': count} for key, count in counts["initiate_month"].items() if key is not None]
+    )
+    timings["monthly_trend"] = time.perf_counter() - section_start
+
+    section_start = time.perf_counter()
+    country_statistics = store.counts(filters, ["event_country"], ignore=("country",),
+                                      skip_blank=True)["event_country"]
+    timings["country_statistics"] = time.perf_counter() - section_start
+
+    section_start = time.perf_counter()
+    product_statistics = store.counts(filters, ["catalog_item_name"], ignore=("catalog_item_identifier",),
+                                      skip_blank=True)["catalog_item_name"]
+    timings["product_statistics"] = time.perf_counter() - section_start
+
+    timings["total"] = time.perf_counter() - started
+    return {
+        "statistics": statistics,
+        "monthly_trend": monthly_trend,
+        "country_statistics": country_statistics,
+        "product_statistics": product_statistics,
+        "timings": timings,
+    }
+
+@cached_result
+def get_dashboard(db: Session, filters=None):
+    """All dashboard aggregates from a single GROUP BY scan.
+
+    Returns the payloads of /statistics, /monthly-trend, /country-statistics and
+    /product-statistics for the same filters, plus per-section timings in seconds.
+    As with the individual endpoints, country statistics ignore the country filter
+    and product statistics ignore the catalog_item_identifier filter, so those two
+    filters are applied to the grouped rows instead of in SQL.
+    """
+    started = time.perf_counter()
+    timings = {}
+    if COLUMNAR_ENGINE_ENABLED:
+        return _columnar_dashboard(db, filters, started)
+
+    filters = dict(filters or {})
+    countries = {value for value in (filters.pop("country", None) or []) if value != ""}
+    catalogs = {value for value in (filters.pop("catalog_item_identifier", None) or []) if value != ""}
+
+    month = Complaint.initiate_month
+    group_columns = list(STATISTICS_DIMENSIONS.values()) + [
+        Complaint.event_country,
+        Complaint.catalog_item_identifier,
+        Complaint.catalog_item_name,
+        month,
+    ]
+
+    section_start = time.perf_counter()
+    if STATS_CUBE_ENABLED:
+        # Cube cells already carry every grouped column; reorder them like the SQL rows
+        indexes = [CUBE_COLUMNS.index(column.key) for column in group_columns]
+        rows = [
+            tuple(cell[i] for i in indexes) + (count,)
+            for cell, count in cube_cells(db, filters).items()
+        ]
+    else:
+        query = apply_complaint_filters(
+            db.query(*group_columns, func.count(Complaint.id)), filters
+        ).group_by(*group_columns)
+        rows = query.all()
+    timings["scan"] = time.perf_counter() - section_start
+
+    n_dims = len(STATISTICS_DIMENSIONS)
+    country_idx, catalog_idx, product_idx, month_idx, count_idx = range(n_dims, n_dims + 5)
+
+    def in_countries(row):
+        return not countries or row[country_idx] in countries
+
+    def in_catalogs(row):
+        return not catalogs or row[catalog_idx] in catalogs
+
+    section_start = time.perf_counter()
+    statistics = {name: {} for name in STATISTICS_DIMENSIONS}
+    monthly = {}
+    for row in rows:
+        if not (in_countries(row) and in_catalogs(row)):
+            continue
+        count = row[count_idx]
+        for i, name in enumerate(STATISTICS_DIMENSIONS):
+            statistics[name][row[i]] = statistics[name].get(row[i], 0) + count
+        if row[month_idx] is not None:
+            monthly[row[month_idx]] = monthly.get(row[month_idx], 0) + count
+    timings["statistics"] = time.perf_counter() - section_start
+
+    section_start = time.perf_counter()
+    monthly_trend = fill_missing_months(
+        [{'month': key, 'count': monthly[key]} for key in sorted(monthly)]
+    )
+    timings["monthly_trend"] = time.perf_counter() - section_start
+
+    section_start = time.perf_counter()
+    country_statistics = {}
+    for row in rows:
+        country = row[country_idx]
+        if in_catalogs(row) and country and country.strip():  # Skip empty countries
+            country_statistics[country] = country_statistics.get(country, 0) + row[count_idx]
+    timings["country_statistics"] = time.perf_counter() - section_start
+
+    section_start = time.perf_counter()
+    product_statistics = {}
+    for row in rows:
+        product = row[product_idx]
+        if in_countries(row) and product and product.strip():  # Skip empty products
+            product_statistics[product] = product_statistics.get(product, 0) + row[count_idx]
+    timings["product_statistics"] = time.perf_counter() - section_start
+
+    timings["total"] = time.perf_counter() - started
+    return {
+        "statistics": statistics,
+        "monthly_trend": monthly_trend,
+        "country_statistics": country_statistics,
+        "product_statistics": product_statistics,
+        "timings": timings,
+    }
+
 def get_available_models():
     """获取Ollama服务器上可用的模型列表"""
     llm_server_base_url = os.environ.get("LLM_SERVER_URL", "http://130.147.129.148:11434")
@@ -0,0 +1,338 @@
+# similarity_index.py
+"""Vectorized similar-complaint scoring over one embedding matrix.
+
+The L2-normalized embeddings live in the memory-mapped EmbeddingStore; the
+index keeps, per complaint in id order, its PR ID, its row in the store and
+dictionary codes of the metadata used for the score boosts. A query is one
+matrix-vector product, three vectorized boosts and a partial sort for the
+top k, and scores
+
+
+    score = clip(0.7 * cosine + 0.3 * boosts, 0, 1)
+    boosts = 0.15 * same system_component + 0.10 * same failure_mode + 0.05 * same level2
+
+(an empty value never matches; complaints without text have a zero vector
+and therefore cosine 0). The index never encodes: complaints the embedding
+job has not reached yet have no store row and also score cosine 0 until
+the job appends their vectors and bumps the data version.
+
+The index is refreshed incrementally when the data version moves, like
+columnar.py: complaints with a higher id than seen so far are appended,
+complaints the change log lists (changed_since) get their metadata codes
+re-read, and store rows appended since the last refresh move the complaints
+they name to their new (latest) row.
+
+A query can be restricted to a set of complaint ids (e.g. the ones matching
+the /complaints filters); only those rows are gathered and scored.
+
+With SIMILARITY_INDEX=ivf the scan is limited to the shortlist an ANN index
+(ann_index.py) returns for the query vector; the shortlist is still scored
+and ranked exactly as above. With SIMILARITY_SCAN=int8 the scan reads the
+int8 codes (quantization.py) instead of the float32 store, and only the
+candidates whose score bounds can reach the top k are scored exactly, so
+results stay the same.
+"""
+import logging
+import threading
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ann_index import ANN_INDEXES, ANN_MIN_ROWS, SIMILARITY_INDEX
+from models import Complaint
+from quantization import QUANTIZED_SCANS, SIMILARITY_SCAN
+from result_cache import changed_since, data_version
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_WEIGHT = 0.7
+METADATA_WEIGHT = 0.3
+# Metadata column -> boost when both complaints share a non-empty value
+METADATA_BOOSTS = {
+    "system_component": 0.15,
+    "failure_mode": 0.10,
+    "level2": 0.05,
+}
+# float32 dot products are exact to about 1e-7
+RANK_DECIMALS = 6
+LOOKUP_CHUNK_SIZE = 500
+
+
+class SimilarityIndex:
+    """Embedding matrix plus metadata codes of every complaint, in id order."""
+
+    def __init__(self, ann_kind=SIMILARITY_INDEX, scan=SIMILARITY_SCAN):
+        self._lock = threading.Lock()
+        # ANN index class ("exact" scans everything) and quantized copy of the store for the
+        # first scan stage ("float32": none); their instances are made on the first refresh
+        self.ann_class = ANN_INDEXES.get(ann_kind)
+        self.quantized_class = QUANTIZED_SCANS.get(scan)
+        self._reset(None)
+
+    def _reset(self, store):
+        self.version = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self.pr_ids = np.empty(0, dtype=object)
+        self.store = store
+        # Complaint position -> row in store.vectors (-1: not embedded yet), and back (-1: superseded row)
+        self.store_rows = np.empty(0, dtype=np.int64)
+        self.position_of = np.empty(0, dtype=np.int64)
+        self.ann = None
+        self.quantized = None
+        # Metadata codes; 0 means empty, so it never produces a boost
+        self.codes = {name: np.empty(0, dtype=np.int32) for name in METADATA_BOOSTS}
+        self.lookup = {name: {} for name in METADATA_BOOSTS}
+        self.row_of = {}
+        # Store rows already applied to store_rows
+        self.store_rows_seen = 0
+
+    def __len__(self):
+        return len(self.pr_ids)
+
+    def refresh(self, db: Session, store):
+        """Bring the index up to the current data version and the rows already in store (an EmbeddingStore)."""
+        version = data_version()
+        if self.version == version:
+            return
+        with self._lock:
+            if self.version == version:
+                return
+            if store is not self.store:
+                self._reset(store)
+            self._refresh(db, None if self.version is None else changed_since(db, self.version))
+            self.version = version
+
+    def _encode(self, name, values):
+        """Codes of values in column name, growing the dictionary with unseen values."""
+        lookup = self.lookup[name]
+        return np.array([lookup.setdefault(value, len(lookup) + 1) if value else 0 for value in values],
+                        dtype=np.int32)
+
+    def _read(self, db: Session, condition):
+        columns = [Complaint.id, Complaint.pr_id] + [getattr(Complaint, name) for name in METADATA_BOOSTS]
+        return db.execute(select(*columns).where(condition).order_by(Complaint.id)).all()
+
+    def _refresh(self, db: Session, changed):
+        """Append new complaints, re-read the changed ids (all known ones if changed is None), follow new store rows."""
+        store = self.store
+        max_id = int(self.ids[-1]) if len(self.ids) else 0
+        if changed is None:
+            changed = self.ids.tolist()
+        # Everything is read before any array changes, so a failed read leaves the index as it was
+        rows = self._read(db, Complaint.id > max_id)
+        new_pr_ids = np.array([row[1] for row in rows], dtype=object)
+        changed = sorted(id_ for id_ in changed if id_ <= max_id)
+        changed_rows = []
+        for start in range(0, len(changed), LOOKUP_CHUNK_SIZE):
+            changed_rows += self._read(db, Complaint.id.in_(changed[start:start + LOOKUP_CHUNK_SIZE]))
+
+        # One snapshot of the store bounds the rows of everything derived from it
+        store.refresh()
+        new_rows, vectors = store.snapshot(new_pr_ids)
+        # A new array, so snapshot() callers keep a consistent copy
+        store_rows = np.concatenate([self.store_rows, new_rows])
+        # Rows appended since the last refresh supersede the complaints' earlier rows
+        moved = 0
+        for store_row in range(self.store_rows_seen, len(vectors) if self.row_of else 0):
+            position = self.row_of.get(store.ids[store_row])
+            if position is not None:
+                store_rows[position] = store_row
+                moved += 1
+        if self.ann_class is not None:
+            if self.ann is None:
+                self.ann = self.ann_class(store)
+            self.ann.refresh(vectors)
+        if self.quantized_class is not None:
+            if self.quantized is None:
+                self.quantized = self.quantized_class(store)
+            self.quantized.refresh(vectors)
+
+        positions = self.positions(np.array([row[0] for row in changed_rows], dtype=np.int64))
+        for i, name in enumerate(METADATA_BOOSTS, start=2):
+            self.codes[name][positions] = self._encode(name, [row[i] for row in changed_rows])
+            self.codes[name] = np.concatenate([self.codes[name], self._encode(name, [row[i] for row in rows])])
+        for position, pr_id in enumerate(new_pr_ids, start=len(self.pr_ids)):
+            self.row_of[pr_id] = position
+        self.ids = np.concatenate([self.ids, np.array([row[0] for row in rows], dtype=np.int64)])
+        self.pr_ids = np.concatenate([self.pr_ids, new_pr_ids])
+        self.store_rows = store_rows
+        self.position_of = np.full(len(vectors), -1, dtype=np.int64)
+        embedded = store_rows >= 0
+        self.position_of[store_rows[embedded]] = np.flatnonzero(embedded)
+        self.store_rows_seen = len(vectors)
+        if len(rows) or changed or moved:
+            logger.info(f"Similarity index refreshed: {len(rows)} new, {len(changed)} changed, "
+                        f"{moved} re-embedded, {len(self)} complaints")
+
+    @staticmethod
+    def _take(values, store_rows, axis=0):
+        """values at store_rows along axis, zero where the store row is -1 (not embedded)."""
+        embedded = store_rows >= 0
+        if embedded.all():
+            return np.take(values, store_rows, axis=axis)
+        shape = list(values.shape)
+        shape[axis] = len(store_rows)
+        taken = np.zeros(shape, dtype=values.dtype)
+        index = [slice(None)] * values.ndim
+        index[axis] = embedded
+        taken[tuple(index)] = np.take(values, store_rows[embedded], axis=axis)
+        return taken
+
+    def vector(self, row):
+        """Stored embedding of complaint `row` (zero if it is not embedded yet)."""
+        return self._take(self.store.vectors, self.store_rows[row:row + 1])[0]
+
+    def cosines(self, query, rows=None):
+        """Cosine of a normalized query vector to all complaints (or the given row indexes)."""
+        vectors = self.store.vectors
+        if rows is None:
+            # Scanning the whole mapped matrix beats gathering most of it first
+            return self._take(vectors @ query, self.store_rows)
+        return self._take(vectors, self.store_rows[rows]) @ query
+
+    def boosts(self, row, rows=None):
+        """Metadata boosts of complaint `row` against all complaints (or the given row indexes)."""
+        boosts = np.zeros(len(self) if rows is None else len(rows), dtype=np.float64)
+        for name, boost in METADATA_BOOSTS.items():
+            target = self.codes[name][row]
+            if target:
+                codes = self.codes[name] if rows is None else self.codes[name][rows]
+                boosts += boost * (codes == target)
+        return boosts
+
+    def scores(self, row, rows=None):
+        """Similarity of complaint `row` to all complaints (or the given row indexes)."""
+        query = self.vector(row)
+        scores = EMBEDDING_WEIGHT * self.cosines(query, rows).astype(np.float64)
+        scores += METADATA_WEIGHT * self.boosts(row, rows)
+        return np.clip(scores, 0.0, 1.0)
+
+    def block_scores(self, rows):
+        """Similarity matrix of the complaints at the given positions (rows) to all complaints.
+
+        Same scores as scores(), one row per position; ranks the same way
+        under rank_rows (neighbors.py).
+        """
+        with self._lock:
+            vectors = self.store.vectors
+            cosine = self._take(self._take(vectors, self.store_rows[rows]) @ vectors.T, self.store_rows, axis=1)
+            scores = EMBEDDING_WEIGHT * cosine.astype(np.float64)
+            boosts = np.zeros(scores.shape, dtype=np.float64)
+            for name, boost in METADATA_BOOSTS.items():
+                targets = self.codes[name][rows][:, None]
+                boosts += boost * ((self.codes[name][None, :] == targets) & (targets != 0))
+            scores += METADATA_WEIGHT * boosts
+            return np.clip(scores, 0.0, 1.0, out=scores)
+
+    def snapshot(self):
+        """(ids, store rows, store vectors) of the current complaints, in id order."""
+        with self._lock:
+            return self.ids, self.store_rows, self.store.vectors
+
+    def positions(self, ids):
+        """Sorted positions of the complaints with the given (sorted) ids; unknown ids are skipped."""
+        positions = np.searchsorted(self.ids, ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == ids[found]
+        return positions[found]
+
+    def candidates(self, query, nprobe=None, ids=None):
+        """Sorted complaint positions to score for a query vector, or None for all of them.
+
+        ids restricts the candidates to those complaints; large restricted
+        sets still go through the ANN index.
+        """
+        allowed = None if ids is None else self.positions(ids)
+        if self.ann is None or not self.ann.ready:
+            return allowed
+        if allowed is not None and len(allowed) < ANN_MIN_ROWS:
+            return allowed
+        # A complaint without text matches on metadata only; no list is closer than another
+        if not query.any():
+            return allowed
+        positions = self.position_of[self.ann.search(query, nprobe)]
+        positions = np.sort(positions[positions >= 0])
+        return positions if allowed is None else np.intersect1d(positions, allowed, assume_unique=True)
+
+    def shortlist(self, query, rows, limit, row=None):
+        """The candidates (positions, or None for all) that can make the limit best, from the quantized scan.
+
+        Scores the int8 codes and keeps the rows whose upper score bound reaches
+        the limit-th best lower bound, so exact scoring of the result ranks the
+        same as exact scoring of all candidates. row (a complaint position) adds
+        its metadata boosts and is itself excluded, as in top_k; without it the
+        bounds are on the cosine, as in nearest. Unchanged without a quantized scan.
+        """
+        positions = np.arange(len(self)) if rows is None else rows
+        if self.quantized is None or len(positions) <= limit + 1:
+            return rows
+        store_rows = self.store_rows[positions]
+        if rows is None:
+            approx = self._take(self.quantized.cosines(query), store_rows).astype(np.float64)
+        else:
+            embedded = store_rows >= 0
+            approx = np.zeros(len(store_rows), dtype=np.float64)
+            approx[embedded] = self.quantized.cosines(query, store_rows[embedded])
+        errors = self._take(self.quantized.errors, store_rows)
+        if row is None:
+            lower, upper = approx - errors, approx + errors
+        else:
+            approx = EMBEDDING_WEIGHT * approx + METADATA_WEIGHT * self.boosts(row, rows)
+            # Clipping is monotone, so clipped bounds bracket the clipped score
+            lower = np.clip(approx - EMBEDDING_WEIGHT * errors, 0.0, 1.0)
+            upper = np.clip(approx + EMBEDDING_WEIGHT * errors, 0.0, 1.0)
+            lower[positions == row] = upper[positions == row] = -np.inf
+        k = min(limit, int(np.count_nonzero(lower > -np.inf)))
+        if k <= 0:
+            return positions[:0]
+        kth = -np.partition(-lower, k - 1)[k - 1]
+        # Rows that round to the k-th best score may still win the tie on id order
+        return positions[upper >= kth - 10.0 ** -RANK_DECIMALS]
+
+    @staticmethod
+    def _best(scores, positions, limit, exclude=None):
+        """Indexes into scores of the limit best, best first; ties keep position (id) order."""
+        # Rank on rounded scores so float32 noise does not reorder exact ties
+        ranked = np.round(scores, RANK_DECIMALS)
+        if exclude is not None:
+            ranked[positions == exclude] = -np.inf
+        k = min(limit, int(np.count_nonzero(ranked > -np.inf)))
+        if k <= 0:
+            return []
+        kth = -np.partition(-ranked, k - 1)[k - 1]
+        # Everything scoring at least the k-th best, so ties at the cut keep id order
+        best = np.flatnonzero(ranked >= kth)
+        return best[np.lexsort((positions[best], -ranked[best]))][:k]
+
+    def top_k(self, pr_id, limit, nprobe=None, ids=None):
+        """[(pr_id, score)] of the limit most similar other complaints, best first.
+
+        Ties keep id order, like the stable sort this replaces. nprobe is
+        passed to the ANN index, if one is in use; ids (sorted complaint ids)
+        limits the search to those complaints.
+        """
+        with self._lock:
+            row = self.row_of.get(pr_id)
+            if row is None or len(self) < 2:
+                return []
+            query = self.vector(row)
+            rows = self.shortlist(query, self.candidates(query, nprobe, ids), limit, row)
+            positions = np.arange(len(self)) if rows is None else rows
+            scores = self.scores(row, rows)
+            return [(self.pr_ids[positions[i]], float(scores[i]))
+                    for i in self._best(scores, positions, limit, exclude=row)]
+
+    def nearest(self, query, limit, nprobe=None, ids=None):
+        """[(complaint id, cosine)] of the limit complaints closest to a normalized query vector."""
+        with self._lock:
+            if not (self.store_rows >= 0).any():
+                return []
+            rows = self.shortlist(query, self.candidates(query, nprobe, ids), limit)
+            positions = np.arange(len(self)) if rows is None else rows
+            cosines = self.cosines(query, rows).astype(np.float64)
+            return [(int(self.ids[positions[i]]), float(cosines[i]))
+                    for i in self._best(cosines, positions, limit)]
+
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,342 @@
+# stats_cube.py
+"""Incrementally maintained count cube behind the statistics endpoints.
+
+Every distinct combination of the classification dimensions, country,
+product, PR state and initiate month is one row of complaint_stats_cube
+holding the number of complaints in it. Write paths (uploads, PATCH,
+classification) apply +/- deltas in the same transaction as the complaint
+change, and the stats functions read cells instead of complaints.
+
+Rebuild the cube from scratch (e.g. after writing to the database by hand):
+
+    python stats_cube.py          # rebuild
+    python stats_cube.py --check  # compare the cube with a fresh count
+"""
+import os
+import sys
+import json
+import datetime
+import logging
+from collections import Counter
+
+import pandas as pd
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models import Complaint, ComplaintStatsCell
+from result_cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+# Set STATS_CUBE=0 to answer the stats endpoints from the complaints table instead
+STATS_CUBE_ENABLED = os.environ.get("STATS_CUBE", "1") == "1"
+
+# Cube dimensions, in cell tuple order; the month is always the last element
+CUBE_DIMENSIONS = [
+    "system_component",
+    "failure_mode",
+    "severity",
+    "priority",
+    "level2",
+    "event_country",
+    "catalog_item_identifier",
+    "catalog_item_name",
+    "pr_state",
+]
+CUBE_COLUMNS = CUBE_DIMENSIONS + ["initiate_month"]
+
+# Filter parameter -> cube dimension
+FILTER_DIMENSIONS = {
+    "system_component": "system_component",
+    "failure_mode": "failure_mode",
+    "severity": "severity",
+    "priority": "priority",
+    "country": "event_country",
+    "catalog_item_identifier": "catalog_item_identifier",
+    "pr_state": "pr_state",
+    "level2": "level2",
+}
+
+LOOKUP_CHUNK_SIZE = 500
+
+
+def month_key(value):
+    """'YYYY-MM' of a date, or None."""
+    return value.strftime("%Y-%m") if value else None
+
+
+def complaint_cell(complaint):
+    """Cube cell of a Complaint object or a dict of Complaint fields."""
+    get = complaint.get if isinstance(complaint, dict) else lambda name: getattr(complaint, name)
+    return tuple(get(name) for name in CUBE_DIMENSIONS) + (month_key(get("initiate_date")),)
+
+
+def cells_of(complaints) -> Counter:
+    """Count complaints (objects or dicts) per cube cell."""
+    return Counter(complaint_cell(complaint) for complaint in complaints)
+
+
+def cell_key(cell) -> str:
+    return json.dumps(list(cell), ensure_ascii=False)
+
+
+def apply_cube_delta(db: Session, delta):
+    """Add a {cell: count change} delta to the cube without committing.
+
+    Call it in the same transaction as the complaint writes it describes.
+    Cells gaining complaints are upserted, so writers in other transactions
+    (ingest jobs, PATCH and classify requests) can create the same new cell.
+    """
+    changes = {cell: n for cell, n in delta.items() if n}
+    if not changes:
+        return
+    cells = ComplaintStatsCell.__table__
+
+    gains = [dict(zip(CUBE_COLUMNS, cell), cell_key=cell_key(cell), count=n) for cell, n in changes.items() if n > 0]
+    if gains:
+        # One executemany for all cells gaining complaints, new or existing
+        upsert = sqlite_insert(cells)
+        db.execute(
+            upsert.on_conflict_do_update(index_elements=["cell_key"], set_={"count": cells.c.count + upsert.excluded.count}),
+            gains,
+        )
+
+    # A missing cell cannot lose complaints; the cube was out of step, so the update skips it
+    losses = [{"key": cell_key(cell), "delta": n} for cell, n in changes.items() if n < 0]
+    if losses:
+        db.execute(
+            update(cells).where(cells.c.cell_key == bindparam("key")).values(count=cells.c.count + bindparam("delta")),
+            losses,
+        )
+    # Only cells that lost complaints can have emptied
+    emptied = [loss["key"] for loss in losses]
+    for start in range(0, len(emptied), LOOKUP_CHUNK_SIZE):
+        db.execute(delete(ComplaintStatsCell).where(
+            ComplaintStatsCell.cell_key.in_(emptied[start:start + LOOKUP_CHUNK_SIZE]),
+            ComplaintStatsCell.count <= 0,
+        ))
+
+
+def record_cell_change(db: Session, old_cell, complaint):
+    """Move one complaint from old_cell to its current cell (no commit)."""
+    new_cell = complaint_cell(complaint)
+    if new_cell != old_cell:
+        apply_cube_delta(db, {old_cell: -1, new_cell: 1})
+
+
+def snapshot_cells(db: Session, ids) -> Counter:
+    """Current cube cells of the complaints with the given primary keys."""
+    ids = list(ids)
+    columns = [getattr(Complaint, name) for name in CUBE_DIMENSIONS] + [Complaint.initiate_date]
+    cells = Counter()
+    for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+        rows = db.execute(select(*columns).where(Complaint.id.in_(ids[start:start + LOOKUP_CHUNK_SIZE])))
+        for row in rows:
+            cells[tuple(row[:-1]) + (month_key(row[-1]),)] += 1
+    return cells
+
+
+def count_cells(db: Session, filters=None, date_range=None) -> Counter:
+    """Count complaints per cube cell straight from the complaints table."""
+    columns = [getattr(Complaint, name) for name in CUBE_DIMENSIONS] + [Complaint.initiate_date]
+    query = _filter_dimensions(db.query(*columns, Complaint.id), Complaint, filters)
+    if date_range:
+        query = query.filter(Complaint.initiate_date >= date_range[0], Complaint.initiate_date <= date_range[1])
+    cells = Counter()
+    for row in query.with_entities(*columns).execution_options(yield_per=10000):
+        cells[tuple(row[:-1]) + (month_key(row[-1]),)] += 1
+    return cells
+
+
+def rebuild_cube(db: Session):
+    """Recount every cell from the complaints table and replace the cube."""
+    cells = count_cells(db)
+    db.execute(delete(ComplaintStatsCell))
+    rows = [dict(zip(CUBE_COLUMNS, cell), cell_key=cell_key(cell), count=n) for cell, n in cells.items()]
+    for start in range(0, len(rows), 5000):
+        db.execute(insert(ComplaintStatsCell), rows[start:start + 5000])
+    bump_data_version(db)
+    db.commit()
+    logger.info(f"Rebuilt statistics cube: {len(rows)} cells, {sum(cells.values())} complaints")
+    return len(rows)
+
+
+def _parse_date(value, name):
+    try:
+        return pd.to_datetime(value).date()
+    except Exception as e:
+        print(f"Error parsing {name}: {str(e)}")
+        return None
+
+
+def _filter_dimensions(query, model, filters):
+    """Apply the multi-value filters to a query on Complaint or the cube."""
+    for name, dimension in FILTER_DIMENSIONS.items():
+        values = [value for value in ((filters or {}).get(name) or []) if value != ""]
+        if values:
+            query = query.filter(getattr(model, dimension).in_(values))
+    return query
+
+
+def _first_of_next_month(day):
+    return datetime.date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def _split_date_range(start, end):
+    """Split [start, end] into whole months and partial-month edges.
+
+    Returns ((first_month, last_month) or None, [(from, to), ...]); open ends
+    are None. Whole months are answered by the cube, edges by the table.
+    """
+    edges = []
+    first_month = month_key(start) if start else None
+    last_month = month_key(end) if end else None
+
+    if start and end and month_key(start) == month_key(end):
+        if start.day != 1 or _first_of_next_month(end) != end + datetime.timedelta(days=1):
+            return None, [(start, end)]
+        return (first_month, last_month), []
+
+    if start and start.day != 1:
+        edges.append((start, _first_of_next_month(start) - datetime.timedelta(days=1)))
+        first_month = month_key(_first_of_next_month(start))
+    if end and _first_of_next_month(end) != end + datetime.timedelta(days=1):
+        edges.append((end.replace(day=1), end))
+        last_month = month_key(end.replace(day=1) - datetime.timedelta(days=1))
+
+    if first_month and last_month and first_month > last_month:
+        return None, edges
+    return (first_month, last_month), edges
+
+
+def cube_cells(db: Session, filters=None) -> Counter:
+    """Complaint counts per cell matching filters (the /complaints filter dict).
+
+    Whole months come from the cube; when start_date/end_date cut a month,
+    that partial month is counted from the complaints table.
+    """
+    filters = filters or {}
+    start = _parse_date(filters["start_date"], "start_date") if filters.get("start_date") else None
+    end = _parse_date(filters["end_date"], "end_date") if filters.get("end_date") else None
+    if start and end and start > end:
+        return Counter()
+
+    months, edges = _split_date_range(start, end)
+    cells = Counter()
+    if months:
+        columns = [getattr(ComplaintStatsCell, name) for name in CUBE_COLUMNS]
+        query = _filter_dimensions(db.query(*columns, ComplaintStatsCell.count), ComplaintStatsCell, filters)
+        if months[0]:
+            query = query.filter(ComplaintStatsCell.initiate_month >= months[0])
+        if months[1]:
+            query = query.filter(ComplaintStatsCell.initiate_month <= months[1])
+        for row in query:
+            cells[tuple(row[:-1])] += row[-1]
+
+    for date_range in edges:
+        cells.update(count_cells(db, filters, date_range))
+    return cells
+
+
+def rollup(cells, dimension, skip_blank=False):
+    """{value: count} of one cube column over the given cells.
+
+    Keys are ordered like a SQL GROUP BY on that column (NULL first).
+    """
+    index = CUBE_COLUMNS.index(dimension)
+    totals = {}
+    for cell, n in cells.items():
+        value = cell[index]
+        if skip_blank and not (value and value.strip()):
+            continue
+        totals[value] = totals.get(value, 0) + n
+    return dict(sorted(totals.items(), key=lambda item: (item[0] is not None, item[0] or "")))
+
+
+def facet_counts(cells, options_cells, filters=None):
+    """Per filter facet, every option with its count under all *other* active filters.
+
+    cells must already be restricted to the date range and nothing else;
+    options_cells (usually the whole cube) supply the options to list, so
+    options that match nothing under the other filters are returned with 0.
+    Returns {filter name: [{"value", "count"}, ...]}, most frequent first;
+    catalog_item_identifier options also carry the catalog item "name".
+    """
+    filters = filters or {}
+    facets = list(FILTER_DIMENSIONS)
+    indexes = [CUBE_COLUMNS.index(FILTER_DIMENSIONS[name]) for name in facets]
+    wanted = [{value for value in (filters.get(name) or []) if value != ""} for name in facets]
+
+    counts = [{} for _ in facets]
+    for cell, n in cells.items():
+        failing = [i for i, index in enumerate(indexes) if wanted[i] and cell[index] not in wanted[i]]
+        if len(failing) > 1:
+            continue
+        # A cell failing exactly one facet still counts towards that facet's options
+        for i in (failing or range(len(facets))):
+            value = cell[indexes[i]]
+            counts[i][value] = counts[i].get(value, 0) + n
+
+    names = {}
+    catalog_index = CUBE_COLUMNS.index("catalog_item_identifier")
+    name_index = CUBE_COLUMNS.index("catalog_item_name")
+    options = [set() for _ in facets]
+    for cell in options_cells:
+        for i, index in enumerate(indexes):
+            options[i].add(cell[index])
+        identifier, product = cell[catalog_index], cell[name_index]
+        if identifier and product and (identifier not in names or product < names[identifier]):
+            names[identifier] = product
+
+    result = {}
+    for i, name in enumerate(facets):
+        entries = [
+            {"value": value, "count": counts[i].get(value, 0)}
+            for value in options[i] | set(counts[i]) if value
+        ]
+        if name == "catalog_item_identifier":
+            for entry in entries:
+                entry["name"] = names.get(entry["value"])
+        result[name] = sorted(entries, key=lambda entry: (-entry["count"], entry["value"]))
+    return result
+
+
+def get_facet_counts(db: Session, filters=None, use_cube=True):
+    """facet_counts for a /complaints style filter dict, from the cube or the complaints table."""
+    filters = filters or {}
+    dates = {name: filters[name] for name in ("start_date", "end_date") if filters.get(name)}
+    if use_cube:
+        options_cells = cube_cells(db)
+        cells = cube_cells(db, dates) if dates else options_cells
+    else:
+        options_cells = count_cells(db)
+        start = _parse_date(dates["start_date"], "start_date") if dates.get("start_date") else None
+        end = _parse_date(dates["end_date"], "end_date") if dates.get("end_date") else None
+        if start or end:
+            cells = count_cells(db, date_range=(start or datetime.date.min, end or datetime.date.max))
+        else:
+            cells = options_cells
+    return facet_counts(cells, options_cells, filters)
+
+
+def main(argv):
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        if "--check" in argv:
+            expected = count_cells(db)
+            actual = cube_cells(db)
+            mismatched = {cell for cell in set(expected) | set(actual) if expected[cell] != actual[cell]}
+            print(f"{len(mismatched)} of {len(expected)} cells differ from the complaints table")
+            return 1 if mismatched else 0
+        rebuild_cube(db)
+        return 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,73 @@
+# conftest.py
+"""Shared test fixtures.
+
+Tests run against a fresh SQLite database (migrated with Alembic) in a
+temporary directory; the embedding store is kept there too. The
+environment is set before any backend module is imported, because
+database.py and services.py read it at import time.
+"""
+import os
+import sys
+import atexit
+import shutil
+import random
+import datetime
+import tempfile
+
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="complaint_tests_")
+atexit.register(shutil.rmtree, WORK_DIR, True)
+
+sys.path.insert(0, BACKEND_DIR)
+# database.SQLALCHEMY_DATABASE_URL is relative to the working directory
+os.chdir(WORK_DIR)
+os.environ["AUTO_MIGRATE"] = "0"
+os.environ.setdefault("EMBEDDING_STORE_DIR", os.path.join(WORK_DIR, "embedding_store"))
+
+from database import SessionLocal, engine, upgrade_database  # noqa: E402
+from result_cache import result_cache  # noqa: E402
+
+DATABASE_PATH = os.path.join(WORK_DIR, "ct_complaints.db")
+
+
+@pytest.fixture
+def db():
+    """Session on an empty, fully migrated database."""
+    engine.dispose()
+    if os.path.exists(DATABASE_PATH):
+        os.remove(DATABASE_PATH)
+    upgrade_database()
+    result_cache.clear()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def make_export(count, start=0, seed=0):
+    """Export-shaped DataFrame (string cells, as read from Excel) of `count` complaints.
+
+    PR IDs are PR000000, PR000001, ... from `start`; dates, countries,
+    products and states vary with seed.
+    """
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(start, start + count):
+        day = datetime.date(2022, 1, 1) + datetime.timedelta(days=rnd.randint(0, 900))
+        rows.append({
+            "PR ID": f"PR{i:06d}",
+            "Short Description": f"gantry noise {i % 7}",
+            "Description": f"description {i % 13}",
+            "Source Notes": "",
+            "Initiate Date": day.strftime("%Y-%m-%d %H:%M:%S") if i % 5 else day.strftime("%m/%d/%Y"),
+            "Become Aware Date": "",
+            "Event Country": rnd.choice(["CN", "US", "DE"]),
+            "Catalog Item Identifier": rnd.choice(["P1", "P2"]),
+            "Catalog Item Name": "",
+            "PR State": rnd.choice(["Open", "Closed"]),
+        })
+    return pd.DataFrame(rows)
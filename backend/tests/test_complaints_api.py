@@ -0,0 +1,75 @@
+# test_complaints_api.py
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from conftest import make_export
+from ingestion import ingest_frame
+from models import Complaint
+from services import LARGE_TEXT_FIELDS, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def client(db):
+    ingest_frame(db, make_export(95))
+    return TestClient(main.app)
+
+
+def walk_pages(client, query):
+    """Items of every page of /complaints?{query}, following next_cursor."""
+    items, cursor, pages = [], None, 0
+    while True:
+        response = client.get(f"/complaints?{query}" + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        page = response.json()
+        items += page["items"]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items, pages
+
+
+def test_cursor_round_trip():
+    for last_id in (0, 1, 12345, 2 ** 40):
+        assert decode_cursor(encode_cursor(last_id)) == last_id
+
+
+def test_pages_cover_every_complaint_once_in_id_order(client, db):
+    items, pages = walk_pages(client, "limit=10")
+
+    assert pages == 10
+    assert [item["id"] for item in items] == [row[0] for row in db.query(Complaint.id).order_by(Complaint.id)]
+
+
+def test_last_page_has_no_cursor_when_it_is_full(db):
+    ingest_frame(db, make_export(20))
+    _, pages = walk_pages(TestClient(main.app), "limit=10")
+
+    assert pages == 2
+
+
+def test_pages_apply_the_filters(client, db):
+    items, _ = walk_pages(client, "limit=7&country=CN&pr_state=Open")
+    expected = db.query(Complaint.pr_id).filter(
+        Complaint.event_country == "CN", Complaint.pr_state == "Open"
+    ).order_by(Complaint.id)
+
+    assert [item["pr_id"] for item in items] == [row[0] for row in expected]
+    assert client.get("/complaints/count?country=CN&pr_state=Open").json() == {"total": len(items)}
+
+
+def test_fields_select_the_returned_columns(client):
+    page = client.get("/complaints?limit=5&fields=short_description,pr_state").json()
+    assert set(page["items"][0]) == {"id", "pr_id", "short_description", "pr_state"}
+
+    default = client.get("/complaints?limit=5").json()
+    assert not set(LARGE_TEXT_FIELDS) & set(default["items"][0])
+
+    details = client.get("/complaints/PR000003").json()
+    assert set(details) == {"pr_id"} | set(LARGE_TEXT_FIELDS)
+    assert details["description"] == "description 3"
+
+
+def test_bad_cursor_and_unknown_field_are_rejected(client):
+    assert client.get("/complaints?limit=5&cursor=not-a-cursor").status_code == 400
+    assert client.get("/complaints?limit=5&fields=no_such_column").status_code == 400
@@ -0,0 +1,91 @@
+# test_ingestion.py
+import openpyxl
+import pandas as pd
+import pytest
+
+from conftest import make_export
+from ingestion import (
+    MODE_INSERT,
+    MODE_UPSERT,
+    IngestionError,
+    ingest_chunks,
+    ingest_frame,
+    iter_excel_chunks,
+    read_excel_chunks
+)
+from models import Complaint
+
+
+def test_upsert_rewrites_only_changed_complaints(db):
+    ingest_frame(db, make_export(100))
+    complaint = db.query(Complaint).filter(Complaint.pr_id == "PR000003").one()
+    complaint.system_component = "Gantry"
+    db.commit()
+
+    export = make_export(120)
+    export.loc[3, "Short Description"] = "tube arcing"
+    export.loc[7, "PR State"] = "Closed" if export.loc[7, "PR State"] == "Open" else "Open"
+    result = ingest_frame(db, export, mode=MODE_UPSERT)
+
+    assert result["new_complaints"] == 20
+    assert result["updated_complaints"] == 2
+    assert result["unchanged_complaints"] == 98
+    db.expire_all()
+    complaint = db.query(Complaint).filter(Complaint.pr_id == "PR000003").one()
+    assert complaint.short_description == "tube arcing"
+    # Classification is never overwritten by an upload
+    assert complaint.system_component == "Gantry"
+    assert db.query(Complaint).filter(Complaint.pr_id == "PR000007").one().pr_state == export.loc[7, "PR State"]
+
+
+def test_upsert_of_an_identical_export_changes_nothing(db):
+    ingest_frame(db, make_export(50))
+    updated_at = dict(db.query(Complaint.pr_id, Complaint.updated_at))
+
+    result = ingest_frame(db, make_export(50), mode=MODE_UPSERT)
+
+    assert result["updated_complaints"] == 0
+    assert result["unchanged_complaints"] == 50
+    assert dict(db.query(Complaint.pr_id, Complaint.updated_at)) == updated_at
+
+
+def test_upsert_keeps_the_last_row_of_a_duplicated_pr_id(db):
+    ingest_frame(db, make_export(10))
+    export = make_export(10)
+    duplicate = export.iloc[[4]].copy()
+    duplicate["Short Description"] = "latest text"
+    result = ingest_frame(db, pd.concat([export, duplicate], ignore_index=True), mode=MODE_UPSERT)
+
+    assert result["updated_complaints"] == 1
+    assert db.query(Complaint.short_description).filter(Complaint.pr_id == "PR000004").scalar() == "latest text"
+
+
+def test_insert_mode_leaves_existing_complaints_alone(db):
+    ingest_frame(db, make_export(10))
+    export = make_export(10)
+    export["Short Description"] = "changed"
+    result = ingest_frame(db, export, mode=MODE_INSERT)
+
+    assert result["existing_complaints"] == 10
+    assert result["updated_complaints"] == 0
+    assert db.query(Complaint).filter(Complaint.short_description == "changed").count() == 0
+
+
+def test_streamed_and_whole_workbook_reads_agree(db, tmp_path):
+    path = tmp_path / "export.xlsx"
+    make_export(25).to_excel(path, index=False)
+
+    streamed = list(iter_excel_chunks(path, chunk_size=10))
+    whole = next(read_excel_chunks(path))
+
+    assert [len(chunk) for chunk in streamed] == [10, 10, 5]
+    assert pd.concat(streamed, ignore_index=True).equals(whole)
+
+
+def test_workbook_without_header_row_is_rejected(db, tmp_path):
+    path = tmp_path / "empty.xlsx"
+    openpyxl.Workbook().save(path)
+
+    for chunks in (iter_excel_chunks(path), read_excel_chunks(path)):
+        with pytest.raises(IngestionError, match="missing required columns"):
+            ingest_chunks(db, chunks)
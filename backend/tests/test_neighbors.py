@@ -0,0 +1,103 @@
+# test_neighbors.py
+import numpy as np
+import pytest
+from sqlalchemy import select, update
+
+from conftest import make_export
+from embedding_store import EmbeddingStore
+from ingestion import ingest_frame
+from models import Complaint, ComplaintNeighbor
+from neighbors import NEIGHBOR_K, drop_neighbors, rebuild_neighbors, update_neighbors
+from result_cache import bump_data_version
+from similarity_index import RANK_DECIMALS, SimilarityIndex
+
+DIMENSION = 16
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EmbeddingStore(str(tmp_path / "store"), "test-model")
+
+
+def embed(store, pr_ids, seed):
+    """Append random embeddings for pr_ids (replacing earlier ones)."""
+    vectors = np.random.default_rng(seed).normal(size=(len(pr_ids), DIMENSION))
+    store.append(pr_ids, vectors, ["key"] * len(pr_ids))
+
+
+def classify(db, count, seed):
+    """Give the first count complaints random values of the metadata the scores boost."""
+    rng = np.random.default_rng(seed)
+    db.execute(update(Complaint), [{
+        "id": id_,
+        "system_component": rng.choice(["Gantry", "Couch", None]),
+        "failure_mode": rng.choice(["FM1", "FM2"]),
+        "level2": rng.choice(["A", "B", None]),
+    } for id_ in range(1, count + 1)])
+    bump_data_version(db)
+    db.commit()
+
+
+def neighbor_table(db):
+    rows = db.execute(select(ComplaintNeighbor).order_by(ComplaintNeighbor.complaint_id, ComplaintNeighbor.rank))
+    return [(row.complaint_id, row.rank, row.neighbor_id, round(row.score, RANK_DECIMALS)) for row in rows.scalars()]
+
+
+def test_incremental_update_equals_a_rebuild(db, store):
+    ingest_frame(db, make_export(300))
+    classify(db, 300, seed=1)
+    embed(store, [f"PR{i:06d}" for i in range(250)], seed=2)
+    index = SimilarityIndex("exact", "float32")
+    index.refresh(db, store)
+    assert rebuild_neighbors(db, index) == 250
+
+    # New complaints (some not embedded yet), re-embedded ones and a reclassified one
+    ingest_frame(db, make_export(40, start=300, seed=3))
+    embed(store, [f"PR{i:06d}" for i in range(250, 330)], seed=4)
+    reembedded = [f"PR{i:06d}" for i in (5, 60, 200)]
+    embed(store, reembedded, seed=5)
+    changed_ids = [row[0] for row in db.query(Complaint.id).filter(Complaint.pr_id.in_(reembedded))]
+    db.query(Complaint).filter(Complaint.id == 17).update({"system_component": "Tube"})
+    changed_ids.append(17)
+    drop_neighbors(db, changed_ids)
+    bump_data_version(db, changed_ids)
+    db.commit()
+
+    index.refresh(db, store)
+    update_neighbors(db, index)
+    updated = neighbor_table(db)
+    rebuild_neighbors(db, index)
+    rebuilt = neighbor_table(db)
+
+    assert updated == rebuilt
+    # Embedded complaints only; the 10 new ones without an embedding are scored live
+    assert len({row[0] for row in rebuilt}) == 330
+    assert all(row[1] < NEIGHBOR_K for row in rebuilt)
+
+
+def test_update_before_the_first_build_does_nothing(db, store):
+    ingest_frame(db, make_export(30))
+    embed(store, [f"PR{i:06d}" for i in range(30)], seed=1)
+    index = SimilarityIndex("exact", "float32")
+    index.refresh(db, store)
+
+    assert update_neighbors(db, index) == 0
+    assert neighbor_table(db) == []
+
+
+def test_lists_match_the_live_search(db, store):
+    ingest_frame(db, make_export(80))
+    classify(db, 80, seed=7)
+    embed(store, [f"PR{i:06d}" for i in range(80)], seed=8)
+    index = SimilarityIndex("exact", "float32")
+    index.refresh(db, store)
+    rebuild_neighbors(db, index)
+
+    id_of = dict(db.query(Complaint.pr_id, Complaint.id))
+    table = neighbor_table(db)
+    for pr_id in ("PR000000", "PR000042", "PR000079"):
+        stored = [(neighbor_id, score) for complaint_id, _, neighbor_id, score in table
+                  if complaint_id == id_of[pr_id]]
+        live = [(id_of[other], round(score, RANK_DECIMALS)) for other, score in index.top_k(pr_id, NEIGHBOR_K)]
+        assert [neighbor_id for neighbor_id, _ in stored] == [neighbor_id for neighbor_id, _ in live]
+        assert np.allclose([score for _, score in stored], [score for _, score in live], atol=1e-6)
@@ -0,0 +1,104 @@
+# test_stats_cube.py
+import random
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import services
+import stats_cube
+from conftest import make_export
+from database import SessionLocal
+from ingestion import MODE_UPSERT, ingest_chunks, ingest_frame
+from models import ComplaintStatsCell
+from result_cache import result_cache
+
+ENDPOINTS = ["/statistics", "/monthly-trend", "/country-statistics", "/product-statistics", "/dashboard"]
+QUERIES = [
+    "",
+    "?country=CN&catalog_item_identifier=P1&start_date=2023-01-15",
+    "?system_component=Gantry&end_date=2023-06-17&pr_state=Open&country=",
+    # Whole month, partial month, and ranges with partial months at both edges
+    "?start_date=2023-03-01&end_date=2023-03-31",
+    "?start_date=2023-03-05&end_date=2023-03-20",
+    "?start_date=2023-02-01&end_date=2024-01-31&level2=A",
+    "?start_date=2023-12-20&end_date=2024-01-10",
+    "?start_date=2022-01-31&end_date=2022-02-01",
+    "?start_date=2024-01-10&end_date=2023-01-10",
+]
+
+
+@pytest.fixture
+def complaints(db):
+    """Complaints from two uploads and an upsert, some reclassified through PATCH."""
+    export = make_export(1500)
+    export["Catalog Item Name"] = export["Catalog Item Identifier"] + " name"
+    ingest_chunks(db, [export[:600], export[600:]])
+    ingest_frame(db, make_export(300, start=1400, seed=5), mode=MODE_UPSERT)
+
+    client = TestClient(main.app)
+    rnd = random.Random(1)
+    for i in range(0, 1500, 7):
+        response = client.patch(f"/complaints/PR{i:06d}", json={
+            "system_component": rnd.choice(["Gantry", "Couch"]),
+            "level2": rnd.choice(["A", "B"]),
+        })
+        assert response.status_code == 200
+    return client
+
+
+def test_cube_matches_a_fresh_count(complaints):
+    assert stats_cube.main(["--check"]) == 0
+
+
+def test_cube_answers_like_the_complaints_table(complaints, monkeypatch):
+    for query in QUERIES:
+        for endpoint in ENDPOINTS:
+            monkeypatch.setattr(services, "STATS_CUBE_ENABLED", True)
+            result_cache.clear()
+            from_cube = complaints.get(endpoint + query).json()
+            monkeypatch.setattr(services, "STATS_CUBE_ENABLED", False)
+            result_cache.clear()
+            from_table = complaints.get(endpoint + query).json()
+
+            if endpoint == "/dashboard":
+                from_cube.pop("timings")
+                from_table.pop("timings")
+            assert from_cube == from_table, endpoint + query
+
+
+def test_concurrent_writers_can_create_the_same_cell(db):
+    cell = ("Gantry",) + (None,) * 8 + ("2024-01",)
+    barrier = threading.Barrier(2)
+    errors = []
+
+    def add_two():
+        session = SessionLocal()
+        try:
+            barrier.wait()
+            stats_cube.apply_cube_delta(session, {cell: 2})
+            session.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            session.close()
+
+    writers = [threading.Thread(target=add_two) for _ in range(2)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    assert errors == []
+    assert db.query(ComplaintStatsCell.count).filter_by(cell_key=stats_cube.cell_key(cell)).scalar() == 4
+
+
+def test_cells_are_deleted_when_they_empty(db):
+    cell = ("Couch",) + (None,) * 8 + ("2023-05",)
+    stats_cube.apply_cube_delta(db, {cell: 1})
+    # A cell the cube never had is skipped rather than going negative
+    stats_cube.apply_cube_delta(db, {cell: -1, ("missing",) + (None,) * 9: -1})
+    db.commit()
+
+    assert db.query(ComplaintStatsCell).count() == 0
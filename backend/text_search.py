@@ -0,0 +1,212 @@
+# text_search.py
+"""In-memory BM25 full-text index over the complaint text fields.
+
+Documents are the texts services.get_complaint_text builds (short and long
+description, customer description, start of the source notes). Text is
+tokenized with jieba's search mode.
+
+Postings are kept in immutable NumPy segments (term ids, offsets, document
+positions, term frequencies). Like the columnar store, the index refreshes
+lazily when the data version moves: complaints with a higher id than seen
+so far are tokenized into a new segment, and complaints the change log lists
+as updated (changed_since) are re-tokenized, their old document marked deleted.
+A new segment is merged with its predecessor while that one is not larger,
+so there are O(log n) segments and each posting is re-sorted O(log n)
+times; merges drop the postings of deleted documents. A query
+gathers the postings of its terms and accumulates BM25 scores in one dense
+array, so its cost follows the postings touched, not the corpus text.
+"""
+import re
+import math
+import logging
+import threading
+from collections import Counter
+
+import jieba
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import Complaint
+from result_cache import changed_since, data_version
+
+logger = logging.getLogger(__name__)
+jieba.setLogLevel(logging.WARNING)
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+READ_CHUNK_SIZE = 5000
+LOOKUP_CHUNK_SIZE = 500
+
+TEXT_COLUMNS = [
+    Complaint.short_description,
+    Complaint.description,
+    Complaint.source_customer_description,
+    Complaint.source_notes,
+]
+
+_WORD = re.compile(r"\w")
+
+
+def tokenize(text):
+    """Lowercased search tokens of text (jieba search mode, punctuation dropped)."""
+    text = (text or "").lower()
+    return [token for token in jieba.cut_for_search(text) if _WORD.search(token)]
+
+
+class _Segment:
+    """Postings of a batch of documents, sorted by term id."""
+
+    def __init__(self, terms, docs, freqs):
+        order = np.argsort(terms, kind="stable")
+        terms, self.docs, self.freqs = terms[order], docs[order], freqs[order]
+        self.terms, starts = np.unique(terms, return_index=True)
+        self.offsets = np.append(starts, len(terms))
+
+    def __len__(self):
+        return len(self.docs)
+
+    def postings(self, term):
+        i = np.searchsorted(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.docs[start:end], self.freqs[start:end]
+
+
+class TextIndex:
+    """BM25 inverted index of the complaint texts, keyed by document position."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self.max_id = 0
+        self.vocabulary = {}
+        self.segments = []
+        # Per document position: complaint id, token count, not superseded
+        self.ids = np.empty(0, dtype=np.int64)
+        self.lengths = np.empty(0, dtype=np.int32)
+        self.alive = np.empty(0, dtype=bool)
+        # Complaint id -> position of its current document
+        self.position_of = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.position_of)
+
+    def refresh(self, db: Session, text_of):
+        """Index new and changed complaints; text_of(row) builds a complaint's document text."""
+        version = data_version()
+        if self.version == version:
+            return
+        with self._lock:
+            if self.version == version:
+                return
+            changed = set() if self.version is None else changed_since(db, self.version)
+            if changed is None:
+                # Too far behind the change log: re-index every known complaint
+                changed = set(self.position_of)
+            self._refresh(db, text_of, changed)
+            self.version = version
+
+    def _read(self, db: Session, condition, limit=None):
+        query = select(Complaint.id, *TEXT_COLUMNS).where(condition).order_by(Complaint.id)
+        return db.execute(query if limit is None else query.limit(limit)).all()
+
+    def _refresh(self, db: Session, text_of, changed):
+        added = 0
+        while True:
+            rows = self._read(db, Complaint.id > self.max_id, READ_CHUNK_SIZE)
+            if not rows:
+                break
+            self._add(rows, text_of)
+            self.max_id = rows[-1].id
+            added += len(rows)
+
+        changed = sorted(id_ for id_ in changed if id_ <= self.max_id)
+        for start in range(0, len(changed), LOOKUP_CHUNK_SIZE):
+            rows = self._read(db, Complaint.id.in_(changed[start:start + LOOKUP_CHUNK_SIZE]))
+            if rows:
+                self._add(rows, text_of)
+
+        if added or changed:
+            logger.info(f"Text index refreshed: {added} new, {len(changed)} changed, {len(self)} documents")
+
+    def _add(self, rows, text_of):
+        first = len(self.ids)
+        terms, docs, freqs, lengths = [], [], [], []
+        for offset, row in enumerate(rows):
+            old = self.position_of.get(row.id)
+            if old is not None:
+                self.alive[old] = False
+                self.total_length -= int(self.lengths[old])
+            self.position_of[row.id] = first + offset
+            tokens = tokenize(text_of(row))
+            lengths.append(len(tokens))
+            for token, count in Counter(tokens).items():
+                terms.append(self.vocabulary.setdefault(token, len(self.vocabulary)))
+                docs.append(first + offset)
+                freqs.append(count)
+
+        self.ids = np.concatenate([self.ids, np.array([row.id for row in rows], dtype=np.int64)])
+        self.lengths = np.concatenate([self.lengths, np.array(lengths, dtype=np.int32)])
+        self.alive = np.concatenate([self.alive, np.ones(len(rows), dtype=bool)])
+        self.total_length += sum(lengths)
+        if terms:
+            self.segments.append(_Segment(np.array(terms, dtype=np.int32), np.array(docs, dtype=np.int32),
+                                          np.array(freqs, dtype=np.int32)))
+        while len(self.segments) > 1 and len(self.segments[-2]) <= len(self.segments[-1]):
+            self._merge_last_two()
+
+    def _merge_last_two(self):
+        """Fold the two newest segments into one, dropping the postings of superseded documents."""
+        merged = self.segments[-2:]
+        docs = np.concatenate([segment.docs for segment in merged])
+        keep = self.alive[docs]
+        terms = np.concatenate([np.repeat(segment.terms, np.diff(segment.offsets)) for segment in merged])
+        freqs = np.concatenate([segment.freqs for segment in merged])
+        self.segments[-2:] = [_Segment(terms[keep], docs[keep], freqs[keep])]
+
+    def search(self, query, limit, ids=None):
+        """[(complaint id, BM25 score)] of the limit best matches of query, best first.
+
+        ids (sorted complaint ids) restricts the result to those complaints.
+        Ties keep id order.
+        """
+        with self._lock:
+            documents = len(self)
+            terms = {self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary}
+            if not documents or not terms:
+                return []
+            average_length = self.total_length / documents
+            scores = np.zeros(len(self.ids), dtype=np.float64)
+            for term in terms:
+                postings = [segment.postings(term) for segment in self.segments]
+                postings = [posting for posting in postings if posting is not None]
+                if not postings:
+                    continue
+                docs = np.concatenate([posting[0] for posting in postings])
+                freqs = np.concatenate([posting[1] for posting in postings]).astype(np.float64)
+                alive = self.alive[docs]
+                docs, freqs = docs[alive], freqs[alive]
+                frequency = len(docs)
+                idf = math.log(1 + (documents - frequency + 0.5) / (frequency + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[docs] / average_length)
+                # Each document appears at most once per term
+                scores[docs] += idf * freqs * (BM25_K1 + 1) / (freqs + norm)
+
+            matched = np.flatnonzero(scores)
+            if ids is not None:
+                matched = matched[np.isin(self.ids[matched], ids)]
+            if not len(matched):
+                return []
+            k = min(limit, len(matched))
+            kth = -np.partition(-scores[matched], k - 1)[k - 1]
+            best = matched[scores[matched] >= kth]
+            ordered = best[np.lexsort((self.ids[best], -scores[best]))][:k]
+            return [(int(self.ids[i]), float(scores[i])) for i in ordered]
+
+
+text_index = TextIndex()
+
@@ -0,0 +1,111 @@
+# time_buckets.py
+"""Calendar buckets for trend queries.
+
+Bucket keys are plain strings that sort chronologically:
+
+    day      2024-03-07
+    week     2024-W10   (ISO week)
+    month    2024-03
+    quarter  2024-Q1
+    year     2024
+
+The week, month, quarter and year keys of initiate_date are stored on each
+complaint at ingest (BUCKET_COLUMNS), so trends group by an indexed column
+instead of a dialect-specific date function.
+"""
+import datetime
+
+import pandas as pd
+
+GRANULARITIES = ("day", "week", "month", "quarter", "year")
+
+# Granularity -> Complaint column holding the precomputed key; days use initiate_date itself
+BUCKET_COLUMNS = {
+    "week": "initiate_week",
+    "month": "initiate_month",
+    "quarter": "initiate_quarter",
+    "year": "initiate_year",
+}
+
+
+def bucket_key(value, granularity):
+    """Bucket key of a date, or None."""
+    if value is None:
+        return None
+    if granularity == "day":
+        return value.isoformat()
+    if granularity == "week":
+        iso_year, iso_week, _ = value.isocalendar()
+        return f"{iso_year}-W{iso_week:02d}"
+    if granularity == "month":
+        return f"{value.year}-{value.month:02d}"
+    if granularity == "quarter":
+        return f"{value.year}-Q{(value.month - 1) // 3 + 1}"
+    if granularity == "year":
+        return str(value.year)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def bucket_keys(dates: pd.Series) -> dict:
+    """Vectorized week/month/quarter/year keys of a Series of dates (None stays None).
+
+    Returns {column name: Series} for the columns in BUCKET_COLUMNS.
+    """
+    parsed = pd.to_datetime(dates, errors="coerce")
+    valid = parsed.notna()
+    iso = parsed.dt.isocalendar()
+    year = parsed.dt.year.astype("Int64").astype(str)
+    keys = {
+        "initiate_week": iso["year"].astype(str) + "-W" + iso["week"].astype(str).str.zfill(2),
+        "initiate_month": parsed.dt.strftime("%Y-%m"),
+        "initiate_quarter": year + "-Q" + parsed.dt.quarter.astype("Int64").astype(str),
+        "initiate_year": year,
+    }
+    return {name: key.astype(object).where(valid, None) for name, key in keys.items()}
+
+
+def bucket_start(key, granularity):
+    """First day of the bucket with the given key."""
+    if granularity == "day":
+        return datetime.date.fromisoformat(key)
+    if granularity == "week":
+        year, week = key.split("-W")
+        return datetime.date.fromisocalendar(int(year), int(week), 1)
+    if granularity == "month":
+        year, month = key.split("-")
+        return datetime.date(int(year), int(month), 1)
+    if granularity == "quarter":
+        year, quarter = key.split("-Q")
+        return datetime.date(int(year), (int(quarter) - 1) * 3 + 1, 1)
+    if granularity == "year":
+        return datetime.date(int(key), 1, 1)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def _next_start(start, granularity):
+    if granularity == "day":
+        return start + datetime.timedelta(days=1)
+    if granularity == "week":
+        return start + datetime.timedelta(days=7)
+    months = {"month": 1, "quarter": 3, "year": 12}[granularity]
+    month_index = start.year * 12 + start.month - 1 + months
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def bucket_range(first, last, granularity):
+    """All bucket keys from first to last inclusive, in order."""
+    keys = []
+    start = bucket_start(first, granularity)
+    end = bucket_start(last, granularity)
+    while start <= end:
+        keys.append(bucket_key(start, granularity))
+        start = _next_start(start, granularity)
+    return keys
+
+
+def fill_gaps(counts, first, last, granularity):
+    """[(key, count)] for every bucket from first to last, 0 where counts has no entry.
+
+    Linear in the number of buckets: one dict lookup per generated key.
+    """
+    return [(key, counts.get(key, 0)) for key in bucket_range(first, last, granularity)]
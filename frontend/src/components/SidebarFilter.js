@@ -3,7 +3,7 @@ import { Filter, RefreshCw, X, Check, ChevronDown, ChevronUp } from "lucide-reac
 import { useFilters } from "../context/FilterContext";
 
 // MultiSelect component for dropdown with multiple selection in sidebar - made more compact
-function MultiSelect({ label, options, value = [], onChange, loading, error, displayTransform }) {
+function MultiSelect({ label, options, value = [], onChange, loading, error, displayTransform, counts }) {
   const [isOpen, setIsOpen] = React.useState(false);
   const dropdownRef = useRef(null);
   
@@ -128,10 +128,17 @@ function MultiSelect({ label, options, value = [], onChange, loading, error, dis
                     toggleOption(option);
                   }}
                 >
-                  <span className="truncate text-gray-300">{getDisplayText(option)}</span>
-                  {value.includes(option) && (
-                    <Check className="h-3 w-3 text-blue-400" />
-                  )}
+                  <span className={`truncate ${counts && option !== "" && !counts[option] ? "text-gray-500" : "text-gray-300"}`}>
+                    {getDisplayText(option)}
+                  </span>
+                  <span className="flex items-center ml-1">
+                    {counts && option !== "" && (
+                      <span className="text-gray-400 mr-1">{counts[option] || 0}</span>
+                    )}
+                    {value.includes(option) && (
+                      <Check className="h-3 w-3 text-blue-400" />
+                    )}
+                  </span>
                 </div>
               ))}
             </>
@@ -146,6 +153,7 @@ export default function SidebarFilter() {
   const { 
     filters, 
     filterOptions, 
+    facetCounts,
     loading, 
     error, 
     handleFilterChange, 
@@ -170,6 +178,7 @@ export default function SidebarFilter() {
           options={filterOptions.system_components || []}
           value={filters.system_component || []}
           onChange={(value) => handleFilterChange("system_component", value)}
+          counts={facetCounts["system_component"]}
           loading={loading}
           error={error}
         />
@@ -179,6 +188,7 @@ export default function SidebarFilter() {
           options={filterOptions.failure_modes || []}
           value={filters.failure_mode || []}
           onChange={(value) => handleFilterChange("failure_mode", value)}
+          counts={facetCounts["failure_mode"]}
           loading={loading}
           error={error}
         />
@@ -188,6 +198,7 @@ export default function SidebarFilter() {
           options={filterOptions.severities || []}
           value={filters.severity || []}
           onChange={(value) => handleFilterChange("severity", value)}
+          counts={facetCounts["severity"]}
           loading={loading}
           error={error}
         />
@@ -197,6 +208,7 @@ export default function SidebarFilter() {
           options={filterOptions.is_open || []}
           value={filters.pr_state || []}
           onChange={(value) => handleFilterChange("pr_state", value)}
+          counts={facetCounts["pr_state"]}
           loading={loading}
           error={error}
         />
@@ -206,6 +218,7 @@ export default function SidebarFilter() {
           options={filterOptions.priorities || []}
           value={filters.priority || []}
           onChange={(value) => handleFilterChange("priority", value)}
+          counts={facetCounts["priority"]}
           loading={loading}
           error={error}
         />
@@ -215,6 +228,7 @@ export default function SidebarFilter() {
           options={filterOptions.countries || []}
           value={filters.country || []}
           onChange={(value) => handleFilterChange("country", value)}
+          counts={facetCounts["country"]}
           loading={loading}
           error={error}
         />
@@ -224,6 +238,7 @@ export default function SidebarFilter() {
           options={filterOptions.product_identifiers || []}
           value={filters.catalog_item_identifier || []}
           onChange={(value) => handleFilterChange("catalog_item_identifier", value)}
+          counts={facetCounts["catalog_item_identifier"]}
           loading={loading}
           error={error}
           displayTransform={transformProductDisplay}
@@ -234,6 +249,7 @@ export default function SidebarFilter() {
           options={filterOptions.level2_categories || []}
           value={filters.level2 || []}
           onChange={(value) => handleFilterChange("level2", value)}
+          counts={facetCounts["level2"]}
           loading={loading}
           error={error}
         />
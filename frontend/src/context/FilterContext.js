@@ -1,5 +1,5 @@
 import React, { createContext, useState, useContext, useEffect } from 'react';
-import { fetchFilterOptions } from '../utils/api';
+import { fetchFilterFacets, fetchFilterOptions } from '../utils/api';
 
 // Create initial filter state
 const initialFilters = {
@@ -32,6 +32,8 @@ export function FilterProvider({ children }) {
     product_names: [],
     level2_categories: [],
   });
+  // filter name -> { option: count under the other selected filters }
+  const [facetCounts, setFacetCounts] = useState({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [filtersApplied, setFiltersApplied] = useState(false);
@@ -51,6 +53,29 @@ export function FilterProvider({ children }) {
     loadFilterOptions();
   }, []);
 
+  // Refresh option counts whenever the selection changes
+  useEffect(() => {
+    let cancelled = false;
+    async function loadFacetCounts() {
+      try {
+        const facets = await fetchFilterFacets(filters);
+        if (cancelled) return;
+        const counts = {};
+        Object.entries(facets).forEach(([name, entries]) => {
+          counts[name] = Object.fromEntries(entries.map(entry => [entry.value, entry.count]));
+        });
+        setFacetCounts(counts);
+      } catch (err) {
+        // Counts are only a hint; keep the plain option list on failure
+        console.error("Unable to load filter counts", err);
+      }
+    }
+    loadFacetCounts();
+    return () => {
+      cancelled = true;
+    };
+  }, [filters]);
+
   // Handle filter changes
   const handleFilterChange = (field, value) => {
     setFilters((prev) => ({
@@ -83,6 +108,7 @@ export function FilterProvider({ children }) {
     <FilterContext.Provider value={{
       filters,
       filterOptions,
+      facetCounts,
       loading,
       error,
       filtersApplied,
@@ -2,25 +2,17 @@ import React, { useState } from "react";
 import { ChevronLeft, ChevronRight, ChevronsLeft, ChevronsRight } from "lucide-react";
 import EditComplaintModal from "./EditComplaintModal";
 
-export default function ComplaintTable({ complaints, onUpdateComplaint }) {
-  const [currentPage, setCurrentPage] = useState(1);
+// complaints holds the current page only; the parent loads pages (onPageChange) from the server
+export default function ComplaintTable({ complaints, total, pageSize, currentPage, onPageChange, onUpdateComplaint }) {
   const [editingComplaint, setEditingComplaint] = useState(null);
-  const pageSize = 10; // Fixed page size, no longer configurable
   
   // Calculate total pages
-  const totalPages = Math.ceil(complaints.length / pageSize);
-  
-  // Get current page data
-  const getCurrentPageData = () => {
-    const startIndex = (currentPage - 1) * pageSize;
-    const endIndex = startIndex + pageSize;
-    return complaints.slice(startIndex, endIndex);
-  };
+  const totalPages = Math.max(1, Math.ceil(total / pageSize));
   
   // Handle page change
   const handlePageChange = (newPage) => {
-    if (newPage > 0 && newPage <= totalPages) {
-      setCurrentPage(newPage);
+    if (newPage > 0 && newPage <= totalPages && newPage !== currentPage) {
+      onPageChange(newPage);
       // Scroll to top of table when changing pages
       const tableTop = document.querySelector('table')?.getBoundingClientRect().top;
       if (tableTop) {
@@ -34,7 +26,7 @@ export default function ComplaintTable({ complaints, onUpdateComplaint }) {
     if (event.key === 'Enter') {
       const pageNumber = parseInt(event.target.value);
       if (!isNaN(pageNumber) && pageNumber > 0 && pageNumber <= totalPages) {
-        setCurrentPage(pageNumber);
+        onPageChange(pageNumber);
         event.target.value = '';
       }
     }
@@ -132,7 +124,7 @@ export default function ComplaintTable({ complaints, onUpdateComplaint }) {
             </tr>
           </thead>
           <tbody className="bg-white divide-y divide-gray-200">
-            {getCurrentPageData().map((complaint) => (
+            {complaints.map((complaint) => (
               <tr 
                 key={complaint.pr_id} 
                 className="hover:bg-gray-50 cursor-pointer transition-colors duration-150"
@@ -232,9 +224,9 @@ export default function ComplaintTable({ complaints, onUpdateComplaint }) {
         <div className="text-sm text-gray-700">
           Showing <span className="font-medium">{(currentPage - 1) * pageSize + 1}</span> to{" "}
           <span className="font-medium">
-            {Math.min(currentPage * pageSize, complaints.length)}
+            {(currentPage - 1) * pageSize + complaints.length}
           </span>{" "}
-          of <span className="font-medium">{complaints.length}</span> results
+          of <span className="font-medium">{total}</span> results
         </div>
 
         {/* Page controls */}
@@ -1,7 +1,8 @@
-import React, { useState } from "react";  
+import React, { useState, useEffect } from "react";  
 import { X, Save, AlertCircle, Cpu, Search } from "lucide-react";  
-import { updateComplaintClassification, aiClassifyComplaint, fetchSimilarComplaints } from "../../utils/api";  
+import { updateComplaintClassification, aiClassifyComplaint, fetchSimilarComplaints, fetchComplaintDetails } from "../../utils/api";  
 
+// complaint is a table row without the large text fields; they are loaded when the modal opens
 export default function EditComplaintModal({ complaint, onClose, onUpdate }) {  
   const [formData, setFormData] = useState({  
     system_component: complaint.system_component || "",  
@@ -17,6 +18,26 @@ export default function EditComplaintModal({ complaint, onClose, onUpdate }) {
   const [similarComplaints, setSimilarComplaints] = useState([]);
   const [showSimilar, setShowSimilar] = useState(false);
   const [error, setError] = useState(null);  
+  const [details, setDetails] = useState(null);
+
+  useEffect(() => {
+    let cancelled = false;
+    fetchComplaintDetails(complaint.pr_id)
+      .then((data) => {
+        if (cancelled) return;
+        setDetails(data);
+        // Keep a rational typed (or suggested) before the details arrived
+        setFormData((prev) => ({ ...prev, rational: prev.rational || data.rational || "" }));
+      })
+      .catch((err) => {
+        if (!cancelled) setError(err.message);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [complaint.pr_id]);
+
+  const loadingText = "Loading...";
 
   const handleChange = (field, value) => {  
     setFormData({  
@@ -127,15 +148,15 @@ export default function EditComplaintModal({ complaint, onClose, onUpdate }) {
               <p className="text-sm text-gray-600">{complaint.short_description}</p>  
               
               <p className="text-sm mt-3"><span className="font-bold">Description:</span></p>  
-              <p className="text-sm text-gray-600">{complaint.description || "Not Provided"}</p>  
+              <p className="text-sm text-gray-600">{details ? details.description || "Not Provided" : loadingText}</p>  
               
               <p className="text-sm mt-3"><span className="font-bold">Source Customer Description:</span></p>  
-              <p className="text-sm text-gray-600">{complaint.source_customer_description || "Not Provided"}</p>  
+              <p className="text-sm text-gray-600">{details ? details.source_customer_description || "Not Provided" : loadingText}</p>  
             </div>  
             
             <div className="flex flex-col flex-grow">  
               <p className="text-sm font-bold text-gray-700 mb-1">Source Notes:</p>      
-                <textarea className="w-full text-sm p-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500 flex-grow resize-none" style={{ whiteSpace: 'pre-wrap' }} readOnly>{complaint.source_notes || "Not Provided"}</textarea>  
+                <textarea className="w-full text-sm p-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500 flex-grow resize-none" style={{ whiteSpace: 'pre-wrap' }} readOnly value={details ? details.source_notes || "Not Provided" : loadingText} />  
             </div>  
           </div>  
 
@@ -368,10 +389,10 @@ export default function EditComplaintModal({ complaint, onClose, onUpdate }) {
 
           <button  
             onClick={handleSave}  
-            disabled={saving}  
+            disabled={saving || !details}  
             className={`  
               px-4 py-2 rounded-md text-sm text-white flex items-center  
-              ${saving ? "bg-gray-400 cursor-not-allowed" : "bg-gray-600 hover:bg-gray-700"}  
+              ${saving || !details ? "bg-gray-400 cursor-not-allowed" : "bg-gray-600 hover:bg-gray-700"}  
             `}  
           >  
             {saving ? (  
@@ -13,7 +13,8 @@ import { fetchCountryStatistics } from "../../utils/api";
 import { Loader2 } from "lucide-react";
 import { useFilters } from "../../context/FilterContext";
 
-export default function CountryStatisticsChart() {
+// data: optional pre-fetched payload (e.g. from /dashboard); fetched here when omitted
+export default function CountryStatisticsChart({ data: providedData }) {
   const [chartData, setChartData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -22,7 +23,7 @@ export default function CountryStatisticsChart() {
   const loadCountryStats = React.useCallback(async () => {
     try {
       setLoading(true);
-      const data = await fetchCountryStatistics(filters);
+      const data = providedData !== undefined ? providedData : await fetchCountryStatistics(filters);
       
       // Convert object to array for charting
       const formattedData = Object.entries(data || {})
@@ -39,7 +40,7 @@ export default function CountryStatisticsChart() {
     } finally {
       setLoading(false);
     }
-  }, [filters]);
+  }, [filters, providedData]);
 
   // Initial load
   useEffect(() => {
@@ -13,7 +13,8 @@ import { fetchMonthlyTrend } from "../../utils/api";
 import { Loader2 } from "lucide-react";
 import { useFilters } from "../../context/FilterContext";
 
-export default function MonthlyTrendChart() {
+// data: optional pre-fetched payload (e.g. from /dashboard); fetched here when omitted
+export default function MonthlyTrendChart({ data: providedData }) {
   const [chartData, setChartData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -22,7 +23,7 @@ export default function MonthlyTrendChart() {
   const loadMonthlyTrend = React.useCallback(async () => {
     try {
       setLoading(true);
-      const data = await fetchMonthlyTrend(filters);
+      const data = providedData !== undefined ? providedData : await fetchMonthlyTrend(filters);
       // Format data for the chart
       setChartData(data);
       setError(null);
@@ -31,7 +32,7 @@ export default function MonthlyTrendChart() {
     } finally {
       setLoading(false);
     }
-  }, [filters]);
+  }, [filters, providedData]);
 
   // Initial load
   useEffect(() => {
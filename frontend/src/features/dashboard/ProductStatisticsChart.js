@@ -13,7 +13,8 @@ import { fetchProductStatistics } from "../../utils/api";
 import { Loader2 } from "lucide-react";
 import { useFilters } from "../../context/FilterContext";
 
-export default function ProductStatisticsChart() {
+// data: optional pre-fetched payload (e.g. from /dashboard); fetched here when omitted
+export default function ProductStatisticsChart({ data: providedData }) {
   const [chartData, setChartData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -22,7 +23,7 @@ export default function ProductStatisticsChart() {
   const loadProductStats = React.useCallback(async () => {
     try {
       setLoading(true);
-      const data = await fetchProductStatistics(filters);
+      const data = providedData !== undefined ? providedData : await fetchProductStatistics(filters);
       
       // Convert object to array for charting
       const formattedData = Object.entries(data || {})
@@ -41,7 +42,7 @@ export default function ProductStatisticsChart() {
     } finally {
       setLoading(false);
     }
-  }, [filters]);
+  }, [filters, providedData]);
 
   // Initial load
   useEffect(() => {
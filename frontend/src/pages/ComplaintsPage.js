@@ -1,29 +1,88 @@
-import React, { useState, useEffect } from "react";
-import { fetchComplaints } from "../utils/api";
+import React, { useState, useEffect, useRef } from "react";
+import { fetchComplaints, fetchComplaintsCount, buildExportUrl } from "../utils/api";
 import ComplaintTable from "../features/complaints/ComplaintTable";
-import { Loader2, RefreshCw, AlertCircle } from "lucide-react";
+import { Loader2, RefreshCw, AlertCircle, Download } from "lucide-react";
 import { useFilters } from "../context/FilterContext";
 
+const PAGE_SIZE = 10;
+// Columns shown in the table; the large text fields are loaded by the edit modal on demand
+const LIST_FIELDS = [
+  "pr_id",
+  "catalog_item_name",
+  "catalog_item_identifier",
+  "system_component",
+  "failure_mode",
+  "level2",
+  "short_description",
+  "initiate_date",
+  "severity",
+  "priority",
+  "pr_state",
+];
+// Rows skipped per request when jumping ahead (the /complaints limit maximum)
+const MAX_SKIP = 1000;
+
 export default function ComplaintsPage() {
   const [complaints, setComplaints] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [currentPage, setCurrentPage] = useState(1);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const { filters, filtersApplied, setFiltersApplied } = useFilters();
+  // Page number -> cursor of its first row (keyset pagination); page 1 starts without one
+  const cursorsRef = useRef({ 1: null });
 
-  // Load complaints data
-  const loadComplaints = React.useCallback(async () => {
+  // Cursor of a page, walking forward from the closest known page with id-only requests
+  const findCursor = React.useCallback(async (page) => {
+    const cursors = cursorsRef.current;
+    let known = Math.max(...Object.keys(cursors).map(Number).filter((p) => p <= page));
+    while (known < page) {
+      const pages = Math.min(page - known, MAX_SKIP / PAGE_SIZE);
+      const data = await fetchComplaints(filters, {
+        limit: pages * PAGE_SIZE,
+        cursor: cursors[known],
+        fields: ["pr_id"],
+      });
+      if (!data.next_cursor) {
+        return null;
+      }
+      known += pages;
+      cursors[known] = data.next_cursor;
+    }
+    return cursors[page];
+  }, [filters]);
+
+  // Load one page of complaints
+  const loadPage = React.useCallback(async (page) => {
     setLoading(true);
     setError(null);
     
     try {
-      const data = await fetchComplaints(filters);
-      setComplaints(data);
+      const cursor = page === 1 ? null : await findCursor(page);
+      const data = await fetchComplaints(filters, { limit: PAGE_SIZE, cursor, fields: LIST_FIELDS });
+      if (data.next_cursor) {
+        cursorsRef.current[page + 1] = data.next_cursor;
+      }
+      setComplaints(data.items);
+      setCurrentPage(page);
     } catch (err) {
       setError(err.message);
     } finally {
       setLoading(false);
     }
-  }, [filters]);
+  }, [filters, findCursor]);
+
+  // Load the total and the first page (cursors depend on the filters, so start over)
+  const loadComplaints = React.useCallback(async () => {
+    cursorsRef.current = { 1: null };
+    try {
+      const data = await fetchComplaintsCount(filters);
+      setTotal(data.total);
+    } catch (err) {
+      setError(err.message);
+    }
+    await loadPage(1);
+  }, [filters, loadPage]);
 
   // Initial load
   useEffect(() => {
@@ -56,13 +115,22 @@ export default function ComplaintsPage() {
     <div>
       <div className="flex justify-between items-center mb-6">
         <h1 className="text-2xl font-bold">Complaint Records</h1>
-        <button
-          onClick={handleRefresh}
-          className="flex items-center px-3 py-1.5 bg-white border border-gray-300 rounded-md text-sm text-gray-700 hover:bg-gray-50"
-        >
-          <RefreshCw className="h-4 w-4 mr-1.5" />
-          刷新数据
-        </button>
+        <div className="flex items-center space-x-2">
+          <a
+            href={buildExportUrl(filters, "xlsx")}
+            className="flex items-center px-3 py-1.5 bg-white border border-gray-300 rounded-md text-sm text-gray-700 hover:bg-gray-50"
+          >
+            <Download className="h-4 w-4 mr-1.5" />
+            导出Excel
+          </a>
+          <button
+            onClick={handleRefresh}
+            className="flex items-center px-3 py-1.5 bg-white border border-gray-300 rounded-md text-sm text-gray-700 hover:bg-gray-50"
+          >
+            <RefreshCw className="h-4 w-4 mr-1.5" />
+            刷新数据
+          </button>
+        </div>
       </div>
 
       {/* Error Message */}
@@ -90,6 +158,10 @@ export default function ComplaintsPage() {
           ) : (
             <ComplaintTable
               complaints={complaints}
+              total={total}
+              pageSize={PAGE_SIZE}
+              currentPage={currentPage}
+              onPageChange={loadPage}
               onUpdateComplaint={handleUpdateComplaint}
             />
           )}
@@ -4,12 +4,13 @@ import ParetoChart from "../features/dashboard/ParetoChart";
 import MonthlyTrendChart from "../features/dashboard/MonthlyTrendChart";
 import CountryStatisticsChart from "../features/dashboard/CountryStatisticsChart";
 import ProductStatisticsChart from "../features/dashboard/ProductStatisticsChart";
-import { fetchStatistics } from "../utils/api";
+import { fetchDashboard } from "../utils/api";
 import { Loader2, RefreshCw } from "lucide-react";
 import { useFilters } from "../context/FilterContext";
 
 export default function Dashboard() {
   const [statistics, setStatistics] = useState(null);
+  const [dashboard, setDashboard] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const { filters, filtersApplied, setFiltersApplied } = useFilters();
@@ -18,9 +19,10 @@ export default function Dashboard() {
     try {
       setLoading(true);
       setError(null);
-      // Pass the filters to the statistics API
-      const data = await fetchStatistics(filters);
-      setStatistics(data);
+      // Fetch every dashboard aggregate with the current filters in one request
+      const data = await fetchDashboard(filters);
+      setDashboard(data);
+      setStatistics(data.statistics);
     } catch (err) {
       setError(err.message);
     } finally {
@@ -129,7 +131,7 @@ export default function Dashboard() {
       
       {/* Monthly trend chart */}
       <div className="mb-6">
-        <MonthlyTrendChart />
+        <MonthlyTrendChart data={dashboard?.monthly_trend} />
       </div>
       
       {/* Pareto charts for L1 and L2 categories */}
@@ -147,8 +149,8 @@ export default function Dashboard() {
       
       {/* Country and Product statistics */}
       <div className="grid grid-cols-1 md:grid-cols-2 gap-6 mb-6">
-        <CountryStatisticsChart />
-        <ProductStatisticsChart />
+        <CountryStatisticsChart data={dashboard?.country_statistics} />
+        <ProductStatisticsChart data={dashboard?.product_statistics} />
       </div>
       
       {/* Failure Mode, Severity and Priority charts */}
@@ -1,6 +1,6 @@
 import React, { useState } from "react";
 import { Upload, FileUp, CheckCircle, AlertCircle, Loader2 } from "lucide-react";
-import { uploadExcelFile } from "../utils/api";
+import { uploadExcelFile, fetchUploadJob } from "../utils/api";
 
 export default function UploadPage() {
   const [file, setFile] = useState(null);
@@ -8,18 +8,19 @@ export default function UploadPage() {
   const [uploadProgress, setUploadProgress] = useState(0);
   const [uploadStats, setUploadStats] = useState(null);
   const [error, setError] = useState(null);
+  const [updateExisting, setUpdateExisting] = useState(false);
 
   // File selection handler
   const handleFileChange = (e) => {
     const selectedFile = e.target.files[0];
     if (selectedFile) {
-      if (selectedFile.type === "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet" ||
-          selectedFile.type === "application/vnd.ms-excel") {
+      const extension = selectedFile.name.split(".").pop().toLowerCase();
+      if (["xlsx", "xls", "csv", "parquet"].includes(extension)) {
         setFile(selectedFile);
         setError(null);
       } else {
         setFile(null);
-        setError("Please select a valid Excel file (.xlsx or .xls)");
+        setError("Please select a valid Excel, CSV or Parquet file (.xlsx, .xls, .csv, .parquet)");
       }
     }
   };
@@ -44,10 +45,21 @@ export default function UploadPage() {
     }, 300);
 
     try {
-      const result = await uploadExcelFile(file);
+      const { job_id } = await uploadExcelFile(file, updateExisting ? "upsert" : "insert");
+
+      // Poll the background ingestion job until it finishes
+      let job = await fetchUploadJob(job_id);
+      while (job.status === "queued" || job.status === "running") {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        job = await fetchUploadJob(job_id);
+      }
       clearInterval(progressInterval);
+
+      if (job.status === "failed") {
+        throw new Error(job.error || "File processing failed");
+      }
       setUploadProgress(100);
-      setUploadStats(result);
+      setUploadStats(job);
     } catch (err) {
       clearInterval(progressInterval);
       setError(err.message);
@@ -86,7 +98,7 @@ export default function UploadPage() {
                     <p className="mb-2 text-sm text-gray-500">
                       <span className="font-semibold">Click to select a file</span> or drag and drop here
                     </p>
-                    <p className="text-xs text-gray-500">Only Excel files are supported (.xlsx, .xls)</p>
+                    <p className="text-xs text-gray-500">Supported formats: Excel (.xlsx, .xls), CSV (.csv), Parquet (.parquet)</p>
                   </>
                 )}
               </div>
@@ -94,7 +106,7 @@ export default function UploadPage() {
                 id="file-upload"
                 type="file"
                 className="hidden"
-                accept=".xlsx,.xls"
+                accept=".xlsx,.xls,.csv,.parquet"
                 onChange={handleFileChange}
                 disabled={uploading}
               />
@@ -130,13 +142,25 @@ export default function UploadPage() {
               <div className="flex items-center">
                 <CheckCircle className="h-5 w-5 text-green-400 mr-2" />
                 <span>
-                  File uploaded successfully! {uploadStats.new_complaints} new complaints added,
-                  {uploadStats.existing_complaints} existing complaints.
+                  File uploaded successfully! {uploadStats.rows_inserted} new complaints added,
+                  {uploadStats.rows_updated} updated, {uploadStats.rows_skipped} existing complaints unchanged
+                  ({uploadStats.rows_per_second} rows/s).
                 </span>
               </div>
             </div>
           )}
 
+          <label className="flex items-center text-sm text-gray-700">
+            <input
+              type="checkbox"
+              className="mr-2"
+              checked={updateExisting}
+              onChange={(e) => setUpdateExisting(e.target.checked)}
+              disabled={uploading}
+            />
+            Update existing complaints whose exported fields changed
+          </label>
+
           <div className="flex justify-center mt-4">
             <button
               onClick={handleUpload}
@@ -27,8 +27,32 @@ export async function fetchStatistics(filters = {}) {
   return response.json();
 }
 
-// 获取投诉列表
-export async function fetchComplaints(filters = {}) {
+// 一次请求获取仪表盘全部统计数据
+export async function fetchDashboard(filters = {}) {
+  const url = new URL(`${API_URL}/dashboard`);
+  
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value && Array.isArray(value) && value.length > 0) {
+      value.forEach(item => {
+        if (item) {
+          url.searchParams.append(key, item);
+        }
+      });
+    } else if (value && !Array.isArray(value)) {
+      url.searchParams.append(key, value);
+    }
+  });
+  
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error("Failed to fetch dashboard data");
+  }
+  return response.json();
+}
+
+// 获取投诉列表（按id的游标分页）
+// 返回 {items, next_cursor, limit}；fields 指定返回的列，默认不含大文本列
+export async function fetchComplaints(filters = {}, { limit = 10, cursor = null, fields = null } = {}) {
   const url = new URL(`${API_URL}/complaints`);
   
   // FastAPI expects array parameters in format: ?param=value1&param=value2
@@ -46,7 +70,13 @@ export async function fetchComplaints(filters = {}) {
     }
   });
   
-  console.log("Request URL:", url.toString()); // Debug log
+  url.searchParams.append("limit", limit);
+  if (cursor) {
+    url.searchParams.append("cursor", cursor);
+  }
+  if (fields && fields.length > 0) {
+    url.searchParams.append("fields", fields.join(","));
+  }
   
   const response = await fetch(url);
   if (!response.ok) {
@@ -55,12 +85,67 @@ export async function fetchComplaints(filters = {}) {
   return response.json();
 }
 
+// 获取筛选后的投诉总数
+export async function fetchComplaintsCount(filters = {}) {
+  const url = new URL(`${API_URL}/complaints/count`);
+  
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value && Array.isArray(value) && value.length > 0) {
+      value.forEach(item => {
+        if (item) {
+          url.searchParams.append(key, item);
+        }
+      });
+    } else if (value && !Array.isArray(value)) {
+      url.searchParams.append(key, value);
+    }
+  });
+  
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error("Failed to fetch complaints count");
+  }
+  return response.json();
+}
+
+// 按需获取单条投诉的大文本列（描述、备注、rational等）
+export async function fetchComplaintDetails(prId) {
+  const response = await fetch(`${API_URL}/complaints/${encodeURIComponent(prId)}`);
+  if (!response.ok) {
+    throw new Error("Failed to fetch complaint details");
+  }
+  return response.json();
+}
+
+// 生成筛选后投诉导出的下载链接 (ndjson / csv / xlsx)
+export function buildExportUrl(filters = {}, format = "csv") {
+  const url = new URL(`${API_URL}/complaints/export`);
+  url.searchParams.append("format", format);
+  
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value && Array.isArray(value) && value.length > 0) {
+      value.forEach(item => {
+        if (item) {
+          url.searchParams.append(key, item);
+        }
+      });
+    } else if (value && !Array.isArray(value)) {
+      url.searchParams.append(key, value);
+    }
+  });
+  
+  return url.toString();
+}
+
 // 上传Excel文件
-export async function uploadExcelFile(file) {
+export async function uploadExcelFile(file, mode = "insert") {
   const formData = new FormData();
   formData.append("file", file);
   
-  const response = await fetch(`${API_URL}/upload`, {
+  const url = new URL(`${API_URL}/upload`);
+  url.searchParams.append("mode", mode);
+  
+  const response = await fetch(url, {
     method: "POST",
     body: formData,
   });
@@ -71,6 +156,15 @@ export async function uploadExcelFile(file) {
   return response.json();
 }
 
+// 获取上传导入任务状态
+export async function fetchUploadJob(jobId) {
+  const response = await fetch(`${API_URL}/upload/jobs/${jobId}`);
+  if (!response.ok) {
+    throw new Error("Failed to fetch upload job status");
+  }
+  return response.json();
+}
+
 // 更新投诉分类
 export async function updateComplaintClassification(prId, classificationData) {
   const response = await fetch(`${API_URL}/complaints/${prId}`, {
@@ -139,6 +233,29 @@ export async function fetchFilterOptions() {
   return response.json();
 }
 
+// 获取带计数的筛选选项（每个筛选项的计数应用其他已选筛选条件）
+export async function fetchFilterFacets(filters = {}) {
+  const url = new URL(`${API_URL}/filter-options/facets`);
+
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value && Array.isArray(value) && value.length > 0) {
+      value.forEach(item => {
+        if (item) {
+          url.searchParams.append(key, item);
+        }
+      });
+    } else if (value && !Array.isArray(value)) {
+      url.searchParams.append(key, value);
+    }
+  });
+
+  const response = await fetch(url);
+  if (!response.ok) {
+    throw new Error("Failed to fetch filter facets");
+  }
+  return response.json();
+}
+
 // 获取投诉月度趋势数据
 export async function fetchMonthlyTrend(filters = {}) {
   const url = new URL(`${API_URL}/monthly-trend`);